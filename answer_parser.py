@@ -0,0 +1,183 @@
+"""
+Answer Parser Module
+Extracts the answer option from Gemini's response text
+
+StreamingAnswerParser can be fed incremental response snapshots while
+polling. It reports a confidence state and commits once the same answer
+has been seen in enough consecutive snapshots, so answer selection can
+start without waiting for the full poll cycle
+EASY TO MODIFY: Adjust option set and stability in config.py
+"""
+
+import re
+
+import config
+
+
+# Confidence states
+NONE = 'none'            # No answer seen yet
+TENTATIVE = 'tentative'  # Answer seen, not yet stable
+STABLE = 'stable'        # Same answer seen in enough snapshots - committed
+
+# Compiled patterns per option set, shared by all parsers
+_PATTERN_CACHE = {}
+
+
+def option_labels(answer_format='letter', option_count=4):
+    """Return the option labels for a format, e.g. ['A', 'B', 'C', 'D'] or ['1', '2', '3', '4']"""
+    if answer_format == 'number':
+        return [str(i + 1) for i in range(option_count)]
+    return [chr(ord('A') + i) for i in range(option_count)]
+
+
+def describe_options(answer_format=None, option_count=None):
+    """Configured options as named in prompts, e.g. 'letter (A, B, C, or D)'"""
+    answer_format = answer_format or config.EXPECTED_ANSWER_FORMAT
+    labels = option_labels(answer_format, option_count or config.ANSWER_OPTION_COUNT)
+    listed = ', '.join(labels[:-1]) + ', or ' + labels[-1] if len(labels) > 1 else labels[0]
+    return f"{'number' if answer_format == 'number' else 'letter'} ({listed})"
+
+
+def _get_patterns(labels):
+    """
+    Get the precompiled patterns for an option set
+    Returns (token pattern, numbered-answer pattern such as "2: B")
+    """
+    key = ''.join(labels)
+    patterns = _PATTERN_CACHE.get(key)
+    if patterns is None:
+        option = '[' + re.escape(key) + ']'
+        patterns = (
+            re.compile(r'\b(' + option + r')\b'),
+            re.compile(r'(?m)^\W*(?:Q(?:UESTION)?\s*)?(\d+)\s*[:.)\-]\s*\(?(' + option + r')\b'),
+        )
+        _PATTERN_CACHE[key] = patterns
+    return patterns
+
+
+class StreamingAnswerParser:
+    def __init__(self, answer_format=None, option_count=None, stable_snapshots=None):
+        self.answer_format = answer_format or config.EXPECTED_ANSWER_FORMAT
+        self.option_count = option_count or config.ANSWER_OPTION_COUNT
+        self.stable_snapshots = stable_snapshots or config.ANSWER_STABLE_SNAPSHOTS
+
+        self.labels = option_labels(self.answer_format, self.option_count)
+        self.letters = option_labels('letter', self.option_count)
+        self._pattern, self._numbered_pattern = _get_patterns(self.labels)
+        self.expected_answers = 1  # > 1 in batch mode (several questions per response)
+        self.reset()
+
+    def reset(self):
+        """Start a new response"""
+        self.state = NONE
+        self.answer = None
+        self.streak = 0
+        self.snapshots = 0
+        self.last_text = None
+
+    @property
+    def committed(self):
+        return self.state == STABLE
+
+    def _to_letter(self, label):
+        """Convert an option label to its answer letter (1->A, 2->B, etc.)"""
+        return self.letters[self.labels.index(label)]
+
+    def extract(self, text):
+        """
+        Extract the LAST standalone option label from text
+        Returns the answer letter, or None if no option is found
+        """
+        if not text:
+            return None
+        matches = self._pattern.findall(text.upper())
+        if matches:
+            return self._to_letter(matches[-1])
+        return None
+
+    def extract_batch(self, text, count=None):
+        """
+        Extract an ordered list of answers for several numbered questions
+        Prefers "N: X" lines; for letters, falls back to the last count standalone letters
+        Returns a tuple of answer letters, or None if not all answers are present
+        """
+        count = count or self.expected_answers
+        if not text:
+            return None
+        text = text.upper()
+
+        # Later lines win, in case Gemini appends answers
+        numbered = {}
+        for number, label in self._numbered_pattern.findall(text):
+            numbered[int(number)] = self._to_letter(label)
+        if all(number in numbered for number in range(1, count + 1)):
+            return tuple(numbered[number] for number in range(1, count + 1))
+
+        if self.answer_format == 'letter' and not numbered:
+            matches = self._pattern.findall(text)
+            if len(matches) >= count:
+                return tuple(matches[-count:])
+        return None
+
+    def feed(self, snapshot):
+        """
+        Feed one response snapshot (full text so far)
+        Returns the confidence state: NONE, TENTATIVE or STABLE
+        """
+        self.snapshots += 1
+        if self.committed:
+            return self.state
+
+        if self.expected_answers > 1:
+            answer = self.extract_batch(snapshot)
+        else:
+            answer = self.extract(snapshot)
+        if answer is None:
+            self.state = NONE
+            self.answer = None
+            self.streak = 0
+            return self.state
+
+        if answer == self.answer:
+            self.streak += 1
+        else:
+            self.answer = answer
+            self.streak = 1
+        self.last_text = snapshot
+
+        self.state = STABLE if self.streak >= self.stable_snapshots else TENTATIVE
+        return self.state
+
+    def parse(self, response):
+        """
+        Parse a final response
+        Selects the LAST valid option to handle cases where Gemini appends answers
+        Returns (answer, method) - method is 'token', 'fallback' or 'default'
+        """
+        answer = self.extract(response)
+        if answer is not None:
+            return answer, 'token'
+
+        # Fallback: any option letter anywhere in the response
+        if self.answer_format == 'letter' and response:
+            valid_letters = [char for char in response.upper() if char in self.letters]
+            if valid_letters:
+                return valid_letters[-1], 'fallback'
+
+        return self.letters[0], 'default'
+
+    def parse_batch(self, response, count):
+        """
+        Parse a final multi-question response
+        Returns a list of (answer, method) per question - method is 'token' or 'default'
+        """
+        answers = self.extract_batch(response, count)
+        if answers is not None:
+            return [(answer, 'token') for answer in answers]
+
+        # Partial response: keep the numbered answers that are there
+        numbered = {}
+        for number, label in self._numbered_pattern.findall((response or '').upper()):
+            numbered[int(number)] = self._to_letter(label)
+        return [(numbered[number], 'token') if number in numbered else (self.letters[0], 'default')
+                for number in range(1, count + 1)]
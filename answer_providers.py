@@ -0,0 +1,340 @@
+"""
+Answer Provider Module
+Pluggable answer sources for quiz questions
+- GeminiGUIProvider: automates the Gemini chat pane in the browser (default)
+- HTTPAnswerProvider: posts the screenshot to an answer API over pooled connections
+- StubAnswerProvider: local stub server with canned answers for offline tests
+
+Every provider records how long was spent on overhead (UI automation or
+upload) versus waiting for the model, so the two can be compared
+"""
+
+import base64
+import http.client
+import json
+import queue
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import config
+from answer_parser import STABLE, describe_options, option_labels
+
+
+# System prompt text (sent with each question)
+SYSTEM_PROMPT_TEMPLATE = (
+    "TASK: Read the question from attached image. "
+    "Answer with ONLY the {options}. "
+    "Do NOT explain. Do NOT append to previous answers. "
+    "Only answer the current question:\n\n"
+)
+
+
+def system_prompt():
+    """Prompt for one question, naming the configured options (ANSWER_OPTION_COUNT, EXPECTED_ANSWER_FORMAT)"""
+    return SYSTEM_PROMPT_TEMPLATE.format(options=describe_options())
+
+
+SYSTEM_PROMPT = system_prompt()
+
+
+class AnswerProvider:
+    """Base class for answer sources"""
+    name = 'base'
+
+    def __init__(self, automation):
+        self.automation = automation
+        self.last_timings = {}
+        self.total_overhead = 0.0
+        self.total_model = 0.0
+        self.answered = 0
+
+    def get_answer(self, screenshot_path, prompt=SYSTEM_PROMPT):
+        """
+        Get the raw response text for a question screenshot
+
+        Args:
+            screenshot_path: Path of the question screenshot (PNG)
+            prompt: Instruction text sent along with the image
+        """
+        raise NotImplementedError
+
+    def record_timings(self, overhead, model):
+        """Record overhead vs model time for the last answer"""
+        self.last_timings = {'overhead': overhead, 'model': model, 'total': overhead + model}
+        self.total_overhead += overhead
+        self.total_model += model
+        self.answered += 1
+        self.automation.log(f"Provider '{self.name}' timing: overhead {overhead:.2f}s, "
+                            f"model {model:.2f}s, total {overhead + model:.2f}s")
+
+    def log_timing_summary(self):
+        """Log average overhead vs model time across the run"""
+        if not self.answered:
+            return
+        total = self.total_overhead + self.total_model
+        share = self.total_overhead / total if total else 0.0
+        self.automation.log(f"Provider '{self.name}' summary: {self.answered} answers, "
+                            f"avg overhead {self.total_overhead / self.answered:.2f}s, "
+                            f"avg model {self.total_model / self.answered:.2f}s "
+                            f"({share:.0%} overhead)")
+
+    def close(self):
+        """Release provider resources"""
+        pass
+
+
+class GeminiGUIProvider(AnswerProvider):
+    """
+    Answers via GUI automation of the Gemini chat pane
+    Overhead = paste, upload and send; model = waiting for the response
+    """
+    name = 'gui'
+
+    def get_answer(self, screenshot_path, prompt=SYSTEM_PROMPT):
+        automation = self.automation
+
+        # Start a fresh Gemini conversation if this one has grown too long
+        if automation.should_rotate_conversation():
+            automation.rotate_conversation()
+
+        start_time = automation.clock.time()
+        automation.paste_screenshot_to_gemini(screenshot_path, prompt)
+        sent_time = automation.clock.time()
+
+        response = automation.get_gemini_response()
+        self.record_timings(sent_time - start_time, automation.clock.time() - sent_time)
+        return response
+
+
+class HTTPAnswerProvider(AnswerProvider):
+    """
+    Answers via an HTTP answer API
+    Keeps a small pool of persistent connections and parses streamed responses
+
+    Request: POST JSON {"prompt", "image" (base64 PNG), "mime_type", "stream": true}
+    Response: text/event-stream ("data: {"text": ...}" deltas, "data: [DONE]"),
+              application/x-ndjson ({"text": ...} per line) or a single JSON/text body
+    """
+    name = 'http'
+
+    def __init__(self, automation, url=None, timeout=None, pool_size=None):
+        super().__init__(automation)
+        self.url = url or config.ANSWER_API_URL
+        self.timeout = timeout or config.ANSWER_API_TIMEOUT
+        parts = urlsplit(self.url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path or '/'
+        if parts.query:
+            self.path += '?' + parts.query
+        self._pool = queue.LifoQueue(maxsize=pool_size or config.ANSWER_API_POOL_SIZE)
+
+    def _acquire_connection(self):
+        """Reuse a pooled connection or open a new one; returns (connection, reused)"""
+        try:
+            return self._pool.get_nowait(), True
+        except queue.Empty:
+            if self.scheme == 'https':
+                connection = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+            else:
+                connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            return connection, False
+
+    def _release_connection(self, connection, reusable):
+        """Return a connection to the pool, or close it"""
+        if reusable:
+            try:
+                self._pool.put_nowait(connection)
+                return
+            except queue.Full:
+                pass
+        connection.close()
+
+    def get_answer(self, screenshot_path, prompt=SYSTEM_PROMPT):
+        start_time = self.automation.clock.time()
+        self.automation.enter_stage('upload')
+
+        with open(screenshot_path, 'rb') as f:
+            image_data = base64.b64encode(f.read()).decode('ascii')
+        body = json.dumps({
+            'prompt': prompt,
+            'image': image_data,
+            'mime_type': 'image/png',
+            'stream': True,
+        }).encode('utf-8')
+        headers = {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream, application/x-ndjson, application/json',
+        }
+        if config.ANSWER_API_KEY:
+            headers['Authorization'] = f"Bearer {config.ANSWER_API_KEY}"
+
+        self.automation.answer_parser.reset()
+        while True:
+            connection, reused = self._acquire_connection()
+            try:
+                connection.request('POST', self.path, body=body, headers=headers)
+                sent_time = self.automation.clock.time()
+                self.automation.enter_stage('generate')
+                http_response = connection.getresponse()
+                response, complete = self._read_response(http_response)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                # Pooled connection went stale while idle - retry on a fresh one
+                connection.close()
+                if not reused:
+                    raise
+                self.automation.log(f"Pooled connection dropped ({e}), reconnecting...")
+                continue
+            except Exception:
+                connection.close()
+                raise
+            self._release_connection(connection, complete and not http_response.will_close)
+            break
+
+        self.record_timings(sent_time - start_time, self.automation.clock.time() - sent_time)
+        self.automation.log(f"Answer API response: '{response}'")
+        return response
+
+    def _read_response(self, http_response):
+        """
+        Read a (possibly streamed) response body
+        Streams are fed to the answer parser and cut short once the answer is stable
+        Returns (text, complete) - complete is False if the stream was cut short
+        """
+        if http_response.status != 200:
+            detail = http_response.read().decode('utf-8', errors='replace')[:200]
+            raise RuntimeError(f"Answer API returned HTTP {http_response.status}: {detail}")
+
+        content_type = http_response.getheader('Content-Type', '')
+        if 'text/event-stream' in content_type or 'ndjson' in content_type:
+            chunks = []
+            while True:
+                line = http_response.readline()
+                if not line:
+                    break
+                line = line.decode('utf-8').strip()
+                if line.startswith('data:'):
+                    line = line[5:].strip()
+                if not line:
+                    continue
+                if line == '[DONE]':
+                    # Drain the rest so the connection can be reused
+                    http_response.read()
+                    break
+                chunks.append(json.loads(line).get('text', ''))
+                if chunks[-1] and self.automation.current_stage == 'generate':
+                    self.automation.enter_stage('read')
+                if self.automation.answer_parser.feed(''.join(chunks)) == STABLE:
+                    self.automation.log("Answer stable mid-stream, not waiting for the rest")
+                    return ''.join(chunks).strip(), False
+            return ''.join(chunks).strip(), True
+
+        data = http_response.read().decode('utf-8')
+        if 'json' in content_type:
+            return json.loads(data).get('text', '').strip(), True
+        return data.strip(), True
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class StubAnswerServer:
+    """
+    Local HTTP server that streams canned answers
+    Speaks the same protocol as HTTPAnswerProvider, for offline tests
+    Random answers are drawn from `options` (default: the configured option labels)
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, delay=None, answer=None, options=None):
+        self.delay = config.STUB_ANSWER_DELAY if delay is None else delay
+        self.answer = answer if answer is not None else config.STUB_ANSWER
+        self.options = options or option_labels(config.EXPECTED_ANSWER_FORMAT, config.ANSWER_OPTION_COUNT)
+        self.requests_served = 0
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/answer"
+
+    def _make_handler(self):
+        stub = self
+
+        class StubHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                json.loads(self.rfile.read(length) or b'{}')
+                stub.requests_served += 1
+
+                time.sleep(stub.delay)
+                answer = stub.answer or random.choice(stub.options)
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for text in ('', answer):
+                    self._write_chunk(f"data: {json.dumps({'text': text})}\n\n")
+                self._write_chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, text):
+                data = text.encode('utf-8')
+                self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return StubHandler
+
+    def start(self):
+        """Serve requests on a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class StubAnswerProvider(HTTPAnswerProvider):
+    """HTTP provider backed by a local stub server (no network, no browser)"""
+    name = 'stub'
+
+    def __init__(self, automation, delay=None, answer=None):
+        # Answer with the labels the parser accepts
+        self.server = StubAnswerServer(delay=delay, answer=answer, options=automation.answer_parser.labels).start()
+        super().__init__(automation, url=self.server.url)
+
+    def close(self):
+        super().close()
+        self.server.stop()
+
+
+PROVIDERS = {
+    'gui': GeminiGUIProvider,
+    'http': HTTPAnswerProvider,
+    'stub': StubAnswerProvider,
+}
+
+
+def create_answer_provider(automation, name=None):
+    """Create the answer provider selected in config.ANSWER_PROVIDER"""
+    name = name or config.ANSWER_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown answer provider '{name}' (options: {', '.join(PROVIDERS)})")
+    return PROVIDERS[name](automation)
@@ -0,0 +1,126 @@
+"""
+Automation Backend Module
+Everything QuizAutomation does to the desktop goes through a backend:
+screen grabs, mouse/keyboard input and clipboard access
+- PyAutoGUIBackend: the real desktop (default)
+Recording and replay backends live in session_replay.py
+"""
+
+import config
+from clipboard_backends import create_clipboard
+
+
+class AutomationBackend:
+    """Base class for desktop backends"""
+
+    def screenshot(self, region=None):
+        """Grab the screen (or a region tuple (x, y, width, height)) as a PIL Image"""
+        raise NotImplementedError
+
+    def click(self, x, y, clicks=1):
+        raise NotImplementedError
+
+    def move_to(self, x, y):
+        raise NotImplementedError
+
+    def hotkey(self, *keys):
+        raise NotImplementedError
+
+    def copy_text(self, text):
+        """Put text on the clipboard"""
+        raise NotImplementedError
+
+    def paste_text(self):
+        """Read text from the clipboard"""
+        raise NotImplementedError
+
+    def copy_image(self, dib_data):
+        """Put a DIB (BMP without file header) image on the clipboard"""
+        raise NotImplementedError
+
+    def copy_formats(self, text=None, dib_data=None, html=None):
+        """
+        Put several formats on the clipboard at once; returns the formats written
+        Backends without multi-format support write only the image (or the text)
+        """
+        if dib_data is not None:
+            self.copy_image(dib_data)
+            return {'image'}
+        self.copy_text(text)
+        return {'text'}
+
+    def mark(self, kind, **data):
+        """Note a decision (e.g. the chosen answer); recorded by RecordingBackend"""
+        pass
+
+    def sampling_backend(self):
+        """Backend for background frame grabs (see frame_sampler.py); wrappers return the one they wrap"""
+        return self
+
+    def record_frame(self, image, region=None):
+        """Note a frame used without calling screenshot() (a frame sampler frame); recorded by RecordingBackend"""
+        pass
+
+    def warm_up(self):
+        """Load anything the first real call would otherwise load (see preflight.py)"""
+        pass
+
+    def get_screen_size(self):
+        """(width, height) of the screen"""
+        return self.screenshot().size
+
+    def clipboard_summary(self):
+        """Clipboard timing lines for the end-of-run log (empty if not measured)"""
+        return []
+
+    def close(self):
+        pass
+
+
+class PyAutoGUIBackend(AutomationBackend):
+    """The real desktop via pyautogui and a platform clipboard backend (see clipboard_backends.py)"""
+
+    def __init__(self, clipboard=None):
+        import pyautogui
+
+        # Configure PyAutoGUI
+        pyautogui.PAUSE = config.PYAUTOGUI_PAUSE
+        pyautogui.FAILSAFE = config.PYAUTOGUI_FAILSAFE
+        self.pyautogui = pyautogui
+        self.clipboard = clipboard or create_clipboard()
+
+    def screenshot(self, region=None):
+        if region:
+            return self.pyautogui.screenshot(region=region)
+        return self.pyautogui.screenshot()
+
+    def click(self, x, y, clicks=1):
+        self.pyautogui.click(x, y, clicks=clicks)
+
+    def move_to(self, x, y):
+        self.pyautogui.moveTo(x, y)
+
+    def hotkey(self, *keys):
+        self.pyautogui.hotkey(*keys)
+
+    def copy_text(self, text):
+        self.clipboard.set_text(text)
+
+    def paste_text(self):
+        return self.clipboard.get_text()
+
+    def get_screen_size(self):
+        return tuple(self.pyautogui.size())
+
+    def warm_up(self):
+        self.pyautogui.size()
+        self.clipboard.warm_up()
+
+    def copy_image(self, dib_data):
+        self.clipboard.set_image(dib_data)
+
+    def copy_formats(self, text=None, dib_data=None, html=None):
+        return self.clipboard.set_formats(text=text, image=dib_data, html=html)
+
+    def clipboard_summary(self):
+        return self.clipboard.summary()
@@ -0,0 +1,142 @@
+"""
+Batch Mode Module
+Helpers for answering every question on a multi-question page in one round-trip
+- split_question_tiles: split a page capture into per-question tiles (whitespace projection)
+- compose_batch_image: stack the tiles into one numbered image for a single prompt
+- build_tile_coordinate_map: per-tile answer option coordinates
+EASY TO MODIFY: Adjust tile settings in config.py
+"""
+
+import config
+from answer_parser import describe_options, option_labels
+
+
+BATCH_PROMPT = (
+    "TASK: The attached image contains {count} numbered questions. "
+    "Answer EVERY question with ONLY its {options}, "
+    "one per line, in order, formatted like '1: {example}'. "
+    "Do NOT explain. Do NOT include previous answers:\n\n"
+)
+
+LABEL_HEIGHT = 28  # Height of the "Question N" bar above each tile
+
+
+def batch_prompt(count):
+    """Prompt asking for one answer per numbered question, naming the configured options"""
+    labels = option_labels(config.EXPECTED_ANSWER_FORMAT, config.ANSWER_OPTION_COUNT)
+    example = labels[min(1, len(labels) - 1)]
+    return BATCH_PROMPT.format(count=count, options=describe_options(), example=example)
+
+
+def _ink_profile(image, tolerance=40):
+    """
+    Count non-background ("ink") pixels per row
+    Background is the most common grey level of the image
+    """
+    import numpy as np
+
+    gray = np.asarray(image.convert('L'), dtype=np.int16)
+    background = np.bincount(gray.ravel(), minlength=256).argmax()
+    ink = np.abs(gray - background) > tolerance
+    return ink.sum(axis=1)
+
+
+def _split_rows(profile, min_gap, min_height, start=0, end=None):
+    """
+    Split rows into segments separated by at least min_gap blank rows
+    Returns list of (top, bottom) row ranges, bottom exclusive
+    """
+    end = len(profile) if end is None else end
+    segments = []
+    top = None
+    last_ink = None
+
+    for row in range(start, end):
+        if profile[row] == 0:
+            continue
+        if top is None:
+            top = row
+        elif row - last_ink > min_gap:
+            segments.append((top, last_ink + 1))
+            top = row
+        last_ink = row
+
+    if top is not None:
+        segments.append((top, last_ink + 1))
+
+    return [(t, b) for t, b in segments if b - t >= min_height]
+
+
+def split_question_tiles(image, min_gap=None, min_height=None):
+    """
+    Split a page capture into per-question tiles using a horizontal whitespace projection
+    Returns list of (top, bottom) pixel rows within the image, in page order
+    """
+    min_gap = min_gap or config.TILE_MIN_GAP
+    min_height = min_height or config.TILE_MIN_HEIGHT
+    return _split_rows(_ink_profile(image), min_gap, min_height)
+
+
+def find_option_rows(profile, tile, option_count, min_gap=None):
+    """
+    Locate option lines inside a tile (the last option_count text blocks)
+    Returns list of row centers within the page, or None if the layout is unclear
+    """
+    min_gap = min_gap or config.OPTION_MIN_GAP
+    blocks = _split_rows(profile, min_gap, 1, start=tile[0], end=tile[1])
+
+    # Expect the question text followed by one block per option
+    if len(blocks) < option_count + 1:
+        return None
+    return [(top + bottom) // 2 for top, bottom in blocks[-option_count:]]
+
+
+def build_tile_coordinate_map(image, page_region, tiles, answer_coords, question_area):
+    """
+    Build answer option screen coordinates for each tile
+
+    Args:
+        image: Page capture (PIL Image)
+        page_region: (x, y, width, height) of the page capture on screen
+        tiles: Tiles from split_question_tiles
+        answer_coords: Calibrated option coordinates for a single question
+        question_area: Calibrated single question area (gives option offsets)
+
+    Option x comes from calibration. Option y comes from the option lines found
+    in the tile, or from the calibrated offsets when they cannot be found
+    """
+    letters = list(answer_coords)
+    profile = _ink_profile(image)
+    coordinate_map = []
+
+    for tile in tiles:
+        rows = find_option_rows(profile, tile, len(letters))
+        if rows is None:
+            rows = [tile[0] + answer_coords[letter]['y'] - question_area['y'] for letter in letters]
+
+        coordinate_map.append({
+            letter: {'x': answer_coords[letter]['x'], 'y': page_region[1] + row}
+            for letter, row in zip(letters, rows)
+        })
+
+    return coordinate_map
+
+
+def compose_batch_image(image, tiles):
+    """Stack the tiles into one image with a "Question N" bar above each"""
+    from PIL import Image, ImageDraw
+
+    width = image.width
+    height = sum(bottom - top + LABEL_HEIGHT for top, bottom in tiles)
+    batch = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(batch)
+
+    y = 0
+    for number, (top, bottom) in enumerate(tiles, start=1):
+        draw.rectangle([0, y, width, y + LABEL_HEIGHT - 1], fill=(40, 40, 40))
+        draw.text((8, y + 8), f"Question {number}", fill='white')
+        y += LABEL_HEIGHT
+        batch.paste(image.crop((0, top, width, bottom)), (0, y))
+        y += bottom - top
+
+    return batch
@@ -1,19 +1,31 @@
 """
 Interactive Calibration Tool for MCQ Quiz Automation
 Run this script to easily capture screen coordinates for your quiz layout
+Coordinates are saved as a layout profile (layouts/<name>.json), one per screen/quiz site
+
+Usage:
+    python calibration.py                      # Saves the default profile (config.LAYOUT_PROFILE)
+    python calibration.py --profile NAME       # Saves layouts/NAME.json
 """
 
+import argparse
 import pyautogui
 import time
 import sys
 from pynput import mouse, keyboard as kb
 from pynput.keyboard import Key, KeyCode
+import config
+from answer_parser import option_labels
+from layout_profiles import LayoutError, load_layout, save_layout
 
 class CalibrationTool:
-    def __init__(self):
+    def __init__(self, profile_name=None):
+        self.profile_name = profile_name or config.LAYOUT_PROFILE
         self.coordinates = {}
         self.current_step = 0
         self.running = True
+        # One click point per option the parser can return (ANSWER_OPTION_COUNT)
+        self.options = option_labels('letter', config.ANSWER_OPTION_COUNT)
         
         # Calibration steps
         self.steps = [
@@ -26,43 +38,19 @@ class CalibrationTool:
                 'instruction': 'Move mouse to BOTTOM-RIGHT corner of question area and press SPACE'
             },
             # Question 1 coordinates
-            {
-                'name': 'ANSWER_A_Q1',
-                'instruction': '[QUESTION 1] Click on answer option A and press SPACE'
-            },
-            {
-                'name': 'ANSWER_B_Q1',
-                'instruction': '[QUESTION 1] Click on answer option B and press SPACE'
-            },
-            {
-                'name': 'ANSWER_C_Q1',
-                'instruction': '[QUESTION 1] Click on answer option C and press SPACE'
-            },
-            {
-                'name': 'ANSWER_D_Q1',
-                'instruction': '[QUESTION 1] Click on answer option D and press SPACE'
-            },
+            *({
+                'name': f'ANSWER_{option}_Q1',
+                'instruction': f'[QUESTION 1] Click on answer option {option} and press SPACE'
+            } for option in self.options),
             {
                 'name': 'NEXT_BUTTON_Q1',
                 'instruction': '[QUESTION 1] Move mouse to NEXT button and press SPACE'
             },
             # Question 2+ coordinates (after screen shift)
-            {
-                'name': 'ANSWER_A_Q2',
-                'instruction': '[QUESTION 2+] Click on answer option A (after screen shift) and press SPACE'
-            },
-            {
-                'name': 'ANSWER_B_Q2',
-                'instruction': '[QUESTION 2+] Click on answer option B (after screen shift) and press SPACE'
-            },
-            {
-                'name': 'ANSWER_C_Q2',
-                'instruction': '[QUESTION 2+] Click on answer option C (after screen shift) and press SPACE'
-            },
-            {
-                'name': 'ANSWER_D_Q2',
-                'instruction': '[QUESTION 2+] Click on answer option D (after screen shift) and press SPACE'
-            },
+            *({
+                'name': f'ANSWER_{option}_Q2',
+                'instruction': f'[QUESTION 2+] Click on answer option {option} (after screen shift) and press SPACE'
+            } for option in self.options),
             {
                 'name': 'NEXT_BUTTON_Q2',
                 'instruction': '[QUESTION 2+] Move mouse to NEXT button (after screen shift) and press SPACE'
@@ -84,6 +72,10 @@ class CalibrationTool:
                 'name': 'GEMINI_RESPONSE_BOTTOM_RIGHT',
                 'instruction': 'Move mouse to BOTTOM-RIGHT of Gemini response area and press SPACE'
             },
+            {
+                'name': 'GEMINI_NEW_CHAT_BUTTON',
+                'instruction': 'Move mouse to Gemini "New chat" button and press SPACE'
+            },
         ]
         
     def on_press(self, key):
@@ -101,9 +93,9 @@ class CalibrationTool:
                 
                 if self.current_step >= len(self.steps):
                     print("\n" + "="*60)
-                    print("Calibration complete! Generating config.py...")
+                    print("Calibration complete! Saving layout profile...")
                     print("="*60)
-                    self.save_config()
+                    self.save_profile()
                     self.running = False
                     return False
                 else:
@@ -119,8 +111,8 @@ class CalibrationTool:
         except AttributeError:
             pass
     
-    def save_config(self):
-        """Generate config.py with captured coordinates"""
+    def save_profile(self):
+        """Save captured coordinates as a layout profile (see layout_profiles.py)"""
         
         # Calculate areas from corner coordinates
         quiz_area = {
@@ -141,98 +133,32 @@ class CalibrationTool:
                       self.coordinates['GEMINI_RESPONSE_TOP_LEFT']['y']
         }
         
-        config_content = f'''"""
-Configuration file for MCQ Quiz Automation
-Auto-generated by calibration.py
-"""
-
-# ============================================================================
-# SCREEN COORDINATES - Auto-calibrated
-# ============================================================================
-
-# Quiz Screen Coordinates
-QUIZ_QUESTION_AREA = {{
-    'x': {quiz_area['x']},
-    'y': {quiz_area['y']},
-    'width': {quiz_area['width']},
-    'height': {quiz_area['height']}
-}}
-
-# Individual answer option buttons - QUESTION 1
-ANSWER_OPTIONS_Q1 = {{
-    'A': {{'x': {self.coordinates['ANSWER_A_Q1']['x']}, 'y': {self.coordinates['ANSWER_A_Q1']['y']}}},
-    'B': {{'x': {self.coordinates['ANSWER_B_Q1']['x']}, 'y': {self.coordinates['ANSWER_B_Q1']['y']}}},
-    'C': {{'x': {self.coordinates['ANSWER_C_Q1']['x']}, 'y': {self.coordinates['ANSWER_C_Q1']['y']}}},
-    'D': {{'x': {self.coordinates['ANSWER_D_Q1']['x']}, 'y': {self.coordinates['ANSWER_D_Q1']['y']}}},
-}}
-
-# Individual answer option buttons - QUESTION 2+ (after screen shift)
-ANSWER_OPTIONS_Q2 = {{
-    'A': {{'x': {self.coordinates['ANSWER_A_Q2']['x']}, 'y': {self.coordinates['ANSWER_A_Q2']['y']}}},
-    'B': {{'x': {self.coordinates['ANSWER_B_Q2']['x']}, 'y': {self.coordinates['ANSWER_B_Q2']['y']}}},
-    'C': {{'x': {self.coordinates['ANSWER_C_Q2']['x']}, 'y': {self.coordinates['ANSWER_C_Q2']['y']}}},
-    'D': {{'x': {self.coordinates['ANSWER_D_Q2']['x']}, 'y': {self.coordinates['ANSWER_D_Q2']['y']}}},
-}}
-
-# Next question button - QUESTION 1
-NEXT_BUTTON_Q1 = {{'x': {self.coordinates['NEXT_BUTTON_Q1']['x']}, 'y': {self.coordinates['NEXT_BUTTON_Q1']['y']}}}
-
-# Next question button - QUESTION 2+ (after screen shift)
-NEXT_BUTTON_Q2 = {{'x': {self.coordinates['NEXT_BUTTON_Q2']['x']}, 'y': {self.coordinates['NEXT_BUTTON_Q2']['y']}}}
-
-# Gemini Screen Coordinates
-GEMINI_INPUT_FIELD = {{'x': {self.coordinates['GEMINI_INPUT_FIELD']['x']}, 'y': {self.coordinates['GEMINI_INPUT_FIELD']['y']}}}
-GEMINI_SEND_BUTTON = {{'x': {self.coordinates['GEMINI_SEND_BUTTON']['x']}, 'y': {self.coordinates['GEMINI_SEND_BUTTON']['y']}}}
-GEMINI_RESPONSE_AREA = {{
-    'x': {gemini_area['x']},
-    'y': {gemini_area['y']},
-    'width': {gemini_area['width']},
-    'height': {gemini_area['height']}
-}}
-
-# ============================================================================
-# TIMING SETTINGS - Adjust based on your system speed and internet
-# ============================================================================
-
-DELAY_AFTER_CLICK = 0.5
-DELAY_AFTER_PASTE = 0.3
-DELAY_FOR_GEMINI_RESPONSE = 3.0
-DELAY_BETWEEN_QUESTIONS = 1.0
-
-PYAUTOGUI_PAUSE = 0.25
-PYAUTOGUI_FAILSAFE = True
-
-# ============================================================================
-# AUTOMATION BEHAVIOR
-# ============================================================================
-
-QUESTION_SELECTION_METHOD = 'triple_click'
-COPY_METHOD = 'ctrl_c'
-USE_OCR = False
-EXPECTED_ANSWER_FORMAT = 'letter'
-
-# ============================================================================
-# KEYBOARD SHORTCUTS
-# ============================================================================
-
-EMERGENCY_STOP_KEY = 'esc'
-START_KEY = 'f9'
-
-# ============================================================================
-# LOGGING AND DEBUG
-# ============================================================================
-
-DEBUG_MODE = True
-SAVE_SCREENSHOTS = True
-SCREENSHOT_DIR = 'debug_screenshots'
-LOG_FILE = 'quiz_automation.log'
-'''
+        layout = {
+            'QUIZ_QUESTION_AREA': quiz_area,
+            'ANSWER_OPTIONS_Q1': {option: self.coordinates[f'ANSWER_{option}_Q1'] for option in self.options},
+            'NEXT_BUTTON_Q1': self.coordinates['NEXT_BUTTON_Q1'],
+            'ANSWER_OPTIONS_Q2': {option: self.coordinates[f'ANSWER_{option}_Q2'] for option in self.options},
+            'NEXT_BUTTON_Q2': self.coordinates['NEXT_BUTTON_Q2'],
+            'GEMINI_INPUT_FIELD': self.coordinates['GEMINI_INPUT_FIELD'],
+            'GEMINI_SEND_BUTTON': self.coordinates['GEMINI_SEND_BUTTON'],
+            'GEMINI_RESPONSE_AREA': gemini_area,
+            'GEMINI_NEW_CHAT_BUTTON': self.coordinates['GEMINI_NEW_CHAT_BUTTON'],
+        }
         
-        with open('config.py', 'w') as f:
-            f.write(config_content)
+        # Keep thresholds tuned by threshold_calibration.py, the way save_thresholds keeps the layout
+        try:
+            thresholds = load_layout(self.profile_name).get('thresholds')
+        except LayoutError:
+            thresholds = None
+        path = save_layout(self.profile_name, layout, tuple(pyautogui.size()), thresholds)
         
-        print("\n✓ config.py has been updated with your calibrated coordinates!")
-        print("\nYou can now run main.py to start the automation.")
+        print(f"\n✓ Layout profile '{self.profile_name}' saved to {path}")
+        if thresholds:
+            print(f"  Kept calibrated thresholds: {', '.join(f'{k} {v}' for k, v in thresholds.items())}")
+        if self.profile_name == config.LAYOUT_PROFILE:
+            print("\nYou can now run main.py to start the automation.")
+        else:
+            print(f"\nYou can now run: python main.py --profile {self.profile_name}")
     
     def run(self):
         """Start the calibration process"""
@@ -257,8 +183,11 @@ LOG_FILE = 'quiz_automation.log'
             listener.join()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate screen coordinates into a layout profile")
+    parser.add_argument('--profile', help=f"profile name (default: {config.LAYOUT_PROFILE})")
+    args = parser.parse_args()
     try:
-        calibrator = CalibrationTool()
+        calibrator = CalibrationTool(args.profile)
         calibrator.run()
     except KeyboardInterrupt:
         print("\n\nCalibration cancelled by user.")
@@ -1,21 +1,59 @@
 """
 Send Button Reference Image Capture Tool
-Captures reference images of the send button in different states
+Captures several samples of the send button in each state and builds
+the state classifier used to detect upload and send progress
+
+Usage:
+    python capture_send_button_refs.py                  # Default layout profile
+    python capture_send_button_refs.py --profile NAME   # Send button position from layouts/NAME.json
+    python capture_send_button_refs.py --samples 8      # Samples per state (default: STATE_SAMPLES_PER_STATE)
+    python capture_send_button_refs.py --rebuild        # Rebuild the classifier from saved samples
 """
 
+import argparse
 import pyautogui
 import keyboard
 import os
 import config
 from datetime import datetime
+from layout_profiles import LayoutError, layout_path, use_layout
+from ui_state_classifier import ClassifierError, StateClassifier, load_samples, sample_path
+
+
+# Instructions per state, in capture order
+STATE_INSTRUCTIONS = {
+    'ready': [
+        "Paste an image into Gemini chat",
+        "Wait for the image to finish uploading",
+        "The send button should be READY to click (enabled)",
+    ],
+    'uploading': [
+        "Paste an image into Gemini chat",
+        "Capture while the image is still UPLOADING (button greyed out)",
+        "Paste again for each sample if the upload is too quick",
+    ],
+    'sent': [
+        "Click the send button to send the message",
+        "Wait for the blue STOP square to appear",
+        "The button should show the stop symbol",
+    ],
+    'disabled': [
+        "Clear the input box (nothing typed or pasted)",
+        "The send button should be DISABLED / idle",
+    ],
+}
 
 
-def capture_send_button_state(state_name):
+def capture_send_button_state(state_name, index=None):
     """
     Capture the send button in a specific state
-    
+
     Args:
         state_name: Name of the state (e.g., 'ready', 'sent')
+        index: Sample number, or None for the single reference image
+
+    Returns:
+        The captured image
     """
     # Define send button region (same as used in automation)
     send_region = (
@@ -24,77 +62,125 @@ def capture_send_button_state(state_name):
         60,
         60
     )
-    
-    print(f"\n{'='*60}")
-    print(f"Capturing Send Button State: {state_name.upper()}")
-    print(f"{'='*60}")
+
+    label = state_name.upper() if index is None else f"{state_name.upper()} sample {index}"
     print(f"\nRegion: x={send_region[0]}, y={send_region[1]}, "
           f"width={send_region[2]}, height={send_region[3]}")
-    print(f"\nPosition the send button in the '{state_name}' state")
-    print("Press SPACEBAR when ready to capture...")
-    
+    print(f"Position the send button in the '{state_name}' state")
+    print(f"Press SPACEBAR to capture {label}...")
+
     # Wait for spacebar
     keyboard.wait('space')
-    
+
     # Capture the region
     screenshot = pyautogui.screenshot(region=send_region)
-    
-    # Create reference_images directory if it doesn't exist
-    ref_dir = 'reference_images'
-    if not os.path.exists(ref_dir):
-        os.makedirs(ref_dir)
-    
+
     # Save the image
-    filename = f"{ref_dir}/send_button_{state_name}.png"
+    if index is None:
+        filename = f"reference_images/send_button_{state_name}.png"
+    else:
+        filename = sample_path(state_name, index)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
     screenshot.save(filename)
-    
-    print(f"\n✓ Captured and saved to: {filename}")
-    print(f"  Image size: {screenshot.size}")
-    
-    return filename
+
+    print(f"✓ Captured and saved to: {filename}")
+
+    return screenshot
+
+
+def capture_state_samples(state_name, step, count):
+    """Capture `count` samples of one state; the first also becomes the single reference image"""
+    print("\n\n" + "="*60)
+    print(f"STATE {step}: SEND BUTTON {state_name.upper()} ({count} samples)")
+    print("="*60)
+    print("\nInstructions:")
+    for number, line in enumerate(STATE_INSTRUCTIONS[state_name], 1):
+        print(f"{number}. {line}")
+    print(f"{len(STATE_INSTRUCTIONS[state_name]) + 1}. Press SPACEBAR for each sample")
+    print("   (move the mouse / hover / resize between samples to cover variations)")
+
+    # Drop samples from an earlier capture so --rebuild only sees this one
+    if os.path.isdir(config.STATE_SAMPLE_DIR):
+        for name in os.listdir(config.STATE_SAMPLE_DIR):
+            if name.rpartition('_')[0] == state_name:
+                os.remove(os.path.join(config.STATE_SAMPLE_DIR, name))
+
+    images = []
+    for index in range(1, count + 1):
+        images.append(capture_send_button_state(state_name, index))
+
+    # Older single-image matching still reads send_button_ready.png / send_button_sent.png
+    if state_name in ('ready', 'sent'):
+        images[0].save(f"reference_images/send_button_{state_name}.png")
+    return images
+
+
+def build_classifier(samples):
+    """Build, check and save the state classifier; returns True if every sample classifies correctly"""
+    try:
+        classifier = StateClassifier.build(samples)
+    except ClassifierError as e:
+        print(f"ERROR: {e}")
+        return False
+
+    lines, misclassified, microseconds = classifier.check(samples)
+    path = classifier.save()
+    print(f"\nState classifier saved to: {path}")
+    for line in lines:
+        print(f"  {line}")
+    print(f"  Classification time: {microseconds:.0f}µs per grab")
+    if misclassified:
+        print(f"\nWARNING: {misclassified} samples were misclassified - states look too similar.")
+        print("Re-capture them, making sure the button is clearly in each state.")
+    return not misclassified
 
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Capture send button reference images")
+    parser.add_argument('--profile', help=f"layout profile (default: {config.LAYOUT_PROFILE})")
+    parser.add_argument('--samples', type=int, default=config.STATE_SAMPLES_PER_STATE,
+                        help="samples captured per state")
+    parser.add_argument('--rebuild', action='store_true',
+                        help=f"rebuild the classifier from the samples in {config.STATE_SAMPLE_DIR}")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        build_classifier(load_samples())
+        return
+
+    profile_name = args.profile or config.LAYOUT_PROFILE
+    if args.profile or os.path.exists(layout_path(profile_name)):
+        try:
+            use_layout(profile_name, tuple(pyautogui.size()))
+        except LayoutError as e:
+            print(f"ERROR: {e}")
+            return
+
     print("\n" + "="*60)
     print("Send Button Reference Image Capture Tool")
     print("="*60)
     print("\nThis tool will help you capture reference images of the")
     print("send button in different states for accurate detection.")
+    print(f"\n{args.samples} samples are captured for each state:")
+    print("  ready, uploading, sent, disabled")
     print("\nMake sure Gemini is open and visible on your screen!")
     print("="*60)
-    
+
     input("\nPress ENTER to continue...")
-    
-    # Capture state 1: Send button ready (after image upload)
-    print("\n\n" + "="*60)
-    print("STATE 1: SEND BUTTON READY")
-    print("="*60)
-    print("\nInstructions:")
-    print("1. Paste an image into Gemini chat")
-    print("2. Wait for the image to finish uploading")
-    print("3. The send button should be READY to click (enabled)")
-    print("4. Press SPACEBAR to capture")
-    
-    capture_send_button_state('ready')
-    
-    # Capture state 2: Message sent (blue stop square visible)
-    print("\n\n" + "="*60)
-    print("STATE 2: MESSAGE SENT")
-    print("="*60)
-    print("\nInstructions:")
-    print("1. Click the send button to send the message")
-    print("2. Wait for the blue STOP square to appear")
-    print("3. The button should show the stop symbol")
-    print("4. Press SPACEBAR to capture")
-    
-    capture_send_button_state('sent')
-    
+
+    started = datetime.now()
+    samples = {}
+    for step, state_name in enumerate(STATE_INSTRUCTIONS, 1):
+        samples[state_name] = capture_state_samples(state_name, step, args.samples)
+
     # Summary
     print("\n\n" + "="*60)
-    print("✓ CAPTURE COMPLETE!")
+    print(f"✓ CAPTURE COMPLETE! ({(datetime.now() - started).seconds}s)")
     print("="*60)
+    build_classifier(samples)
     print("\nReference images saved:")
+    print(f"  • {config.STATE_SAMPLE_DIR}/ ({sum(len(images) for images in samples.values())} samples)")
     print("  • reference_images/send_button_ready.png")
     print("  • reference_images/send_button_sent.png")
     print("\nThese images will be used for send button detection.")
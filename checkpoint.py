@@ -0,0 +1,87 @@
+"""
+Checkpoint Module
+Saves run state after each completed question so a crashed or stopped run
+can resume from the next question without recalibration
+EASY TO MODIFY: Adjust CHECKPOINT_FILE in config.py
+"""
+
+import base64
+import io
+import json
+import os
+import tempfile
+
+
+CHECKPOINT_VERSION = 2
+CHECKPOINT_KEYS = ('saved_at', 'question_count', 'page_count', 'screen_has_shifted', 'initial_screen_state',
+                   'page_layout', 'conversation_number', 'conversation_stats', 'timing_stats', 'parse_fallbacks')
+
+
+def save_checkpoint(path, state):
+    """
+    Write checkpoint atomically
+    Writes a temp file in the same folder and renames it over the old checkpoint,
+    so a crash mid-write never leaves a half-written file behind
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix='.checkpoint_', suffix='.tmp', dir=folder)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(dict(state, version=CHECKPOINT_VERSION), f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def load_checkpoint(path, log=print):
+    """
+    Load a checkpoint, or return None if it is missing, from another version,
+    truncated or corrupt (the problem is logged)
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        # Truncated or corrupt JSON (or not UTF-8)
+        log(f"WARNING: Checkpoint {path} is unreadable: {e}")
+        return None
+    if not isinstance(state, dict) or state.get('version') != CHECKPOINT_VERSION:
+        log(f"WARNING: Checkpoint {path} is not a version {CHECKPOINT_VERSION} checkpoint")
+        return None
+    missing = [key for key in CHECKPOINT_KEYS if key not in state]
+    if missing:
+        log(f"WARNING: Checkpoint {path} is missing {', '.join(missing)}")
+        return None
+    try:
+        state['initial_screen_state'] = decode_image(state['initial_screen_state'])
+    except (ValueError, TypeError, OSError) as e:
+        log(f"WARNING: Checkpoint {path} has an unreadable screen shift image: {e}")
+        return None
+    return state
+
+
+def encode_image(image):
+    """Encode a small PIL image as base64 PNG (None stays None)"""
+    if image is None:
+        return None
+    output = io.BytesIO()
+    image.save(output, 'PNG')
+    return base64.b64encode(output.getvalue()).decode('ascii')
+
+
+def decode_image(data):
+    """Decode a base64 PNG back into a PIL image (None stays None)"""
+    if data is None:
+        return None
+    from PIL import Image
+    image = Image.open(io.BytesIO(base64.b64decode(data)))
+    image.load()
+    return image
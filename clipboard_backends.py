@@ -0,0 +1,309 @@
+"""
+Clipboard Backends
+Clipboard access for PyAutoGUIBackend, one implementation per platform
+- WindowsClipboard: win32clipboard (text, DIB images and HTML)
+- X11Clipboard: the xclip command line tool (Linux desktops)
+- MemoryClipboard: in-process only, for benchmarks and offline runs
+
+Every write puts all of its formats on the clipboard in one transaction
+(open, empty, set each format, close). An operation that finds the clipboard
+locked by another program is retried with exponential backoff. Each operation
+is timed; summary() reports count, average and worst time per operation
+
+Benchmark a backend with:
+    python clipboard_backends.py --backend memory --count 200
+EASY TO MODIFY: Adjust CLIPBOARD_* settings in config.py
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+import config
+
+
+CLIPBOARD_BACKENDS = ('auto', 'windows', 'x11', 'memory')
+
+
+class ClipboardError(Exception):
+    """The clipboard could not be used"""
+
+
+class ClipboardBusy(ClipboardError):
+    """Another program holds the clipboard; the operation can be retried"""
+
+
+def dib_to_image(dib_data):
+    """PIL Image from DIB data (a BMP file without its 14-byte file header)"""
+    import io
+    import struct
+    from PIL import Image
+    header_size, = struct.unpack_from('<I', dib_data, 0)
+    bits, = struct.unpack_from('<H', dib_data, 14)
+    colors, = struct.unpack_from('<I', dib_data, 32)
+    palette = (colors or (1 << bits if bits <= 8 else 0)) * 4
+    file_header = b'BM' + struct.pack('<IHHI', 14 + len(dib_data), 0, 0, 14 + header_size + palette)
+    with Image.open(io.BytesIO(file_header + dib_data)) as image:
+        return image.convert('RGB')
+
+
+def combined_paste_html(prompt, png_data):
+    """HTML fragment with the prompt followed by the image inline (as a data: URI)"""
+    import base64
+    import html
+    text = html.escape(prompt).replace('\n', '<br>')
+    image = base64.b64encode(png_data).decode('ascii')
+    return f'<p>{text}</p><img src="data:image/png;base64,{image}">'
+
+
+class ClipboardBackend:
+    """Base class: retries, timing and the public operations"""
+    name = 'base'
+
+    def __init__(self, retries=None, retry_delay=None):
+        self.retries = config.CLIPBOARD_RETRIES if retries is None else retries
+        self.retry_delay = config.CLIPBOARD_RETRY_DELAY if retry_delay is None else retry_delay
+        self.stats = {}  # operation -> {'count', 'total', 'max', 'retries'}
+
+    # Public operations
+    def set_text(self, text):
+        self._timed('set_text', self._write, {'text': text})
+
+    def set_image(self, dib_data):
+        self._timed('set_image', self._write, {'image': dib_data})
+
+    def set_formats(self, **formats):
+        """
+        Put several formats on the clipboard in one transaction
+        Formats: text (str), image (DIB bytes), html (HTML fragment str)
+        Returns the formats actually written (a backend may not support all of them together)
+        """
+        return self._timed('set_formats', self._write, formats)
+
+    def get_text(self):
+        return self._timed('get_text', self._read_text)
+
+    # Implemented per platform
+    def _write(self, formats):
+        """Replace the clipboard contents with `formats`; returns the formats written"""
+        raise NotImplementedError
+
+    def _read_text(self):
+        raise NotImplementedError
+
+    def _timed(self, operation, function, *args):
+        stats = self.stats.setdefault(operation, {'count': 0, 'total': 0.0, 'max': 0.0, 'retries': 0})
+        start_time = time.perf_counter()
+        delay = self.retry_delay
+        attempt = 0
+        while True:
+            try:
+                result = function(*args)
+                break
+            except ClipboardBusy:
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                stats['retries'] += 1
+                time.sleep(delay)
+                delay *= 2
+        elapsed = time.perf_counter() - start_time
+        stats['count'] += 1
+        stats['total'] += elapsed
+        stats['max'] = max(stats['max'], elapsed)
+        return result
+
+    def summary(self):
+        """One line per operation for the end-of-run log"""
+        lines = []
+        for operation, stats in self.stats.items():
+            if not stats['count']:
+                continue
+            lines.append(f"Clipboard ({self.name}) {operation}: {stats['count']}x, "
+                         f"avg {stats['total'] / stats['count'] * 1000:.2f}ms, "
+                         f"max {stats['max'] * 1000:.2f}ms, {stats['retries']} retries")
+        return lines
+
+    def warm_up(self):
+        self._read_text()
+
+
+class MemoryClipboard(ClipboardBackend):
+    """Clipboard held in this process; nothing outside it can paste from it"""
+    name = 'memory'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.formats = {}
+
+    def _write(self, formats):
+        self.formats = {name: value for name, value in formats.items() if value is not None}
+        return set(self.formats)
+
+    def _read_text(self):
+        return self.formats.get('text', '')
+
+
+class WindowsClipboard(ClipboardBackend):
+    name = 'windows'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        import win32clipboard
+        self.win32clipboard = win32clipboard
+        self.html_format = win32clipboard.RegisterClipboardFormat('HTML Format')
+
+    @contextmanager
+    def _open(self):
+        try:
+            self.win32clipboard.OpenClipboard()
+        except Exception as e:
+            # Access denied while another program has the clipboard open
+            raise ClipboardBusy(str(e))
+        try:
+            yield
+        finally:
+            self.win32clipboard.CloseClipboard()
+
+    def _write(self, formats):
+        win32clipboard = self.win32clipboard
+        written = set()
+        with self._open():
+            win32clipboard.EmptyClipboard()
+            if formats.get('text') is not None:
+                win32clipboard.SetClipboardData(win32clipboard.CF_UNICODETEXT, formats['text'])
+                written.add('text')
+            if formats.get('image') is not None:
+                win32clipboard.SetClipboardData(win32clipboard.CF_DIB, formats['image'])
+                written.add('image')
+            if formats.get('html') is not None:
+                win32clipboard.SetClipboardData(self.html_format, cf_html(formats['html']))
+                written.add('html')
+        return written
+
+    def _read_text(self):
+        win32clipboard = self.win32clipboard
+        with self._open():
+            if not win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_UNICODETEXT):
+                return ''
+            return win32clipboard.GetClipboardData(win32clipboard.CF_UNICODETEXT)
+
+
+def cf_html(fragment):
+    """Wrap an HTML fragment in the Windows 'HTML Format' header (byte offsets into the UTF-8 data)"""
+    header = ("Version:0.9\r\nStartHTML:{0:010d}\r\nEndHTML:{1:010d}\r\n"
+              "StartFragment:{2:010d}\r\nEndFragment:{3:010d}\r\n")
+    prefix = "<html><body><!--StartFragment-->"
+    suffix = "<!--EndFragment--></body></html>"
+    header_length = len(header.format(0, 0, 0, 0))
+    fragment_bytes = fragment.encode('utf-8')
+    start_fragment = header_length + len(prefix)
+    end_fragment = start_fragment + len(fragment_bytes)
+    end_html = end_fragment + len(suffix)
+    return (header.format(header_length, end_html, start_fragment, end_fragment).encode('ascii') +
+            prefix.encode('ascii') + fragment_bytes + suffix.encode('ascii'))
+
+
+class X11Clipboard(ClipboardBackend):
+    """
+    X11 CLIPBOARD selection via xclip
+    xclip serves one format per write, so set_formats writes the richest one
+    given (html, then image, then text) and reports which it wrote
+    """
+    name = 'x11'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.tool = shutil.which('xclip')
+        if not self.tool:
+            raise ClipboardError("xclip not found (install it, e.g. apt install xclip)")
+
+    def _write(self, formats):
+        if formats.get('html') is not None:
+            name, target, data = 'html', 'text/html', formats['html'].encode('utf-8')
+        elif formats.get('image') is not None:
+            import io
+            output = io.BytesIO()
+            dib_to_image(formats['image']).save(output, 'PNG')
+            name, target, data = 'image', 'image/png', output.getvalue()
+        else:
+            name, target, data = 'text', 'UTF8_STRING', (formats.get('text') or '').encode('utf-8')
+
+        # xclip keeps running in the background to serve the selection, so its output is not captured
+        try:
+            result = subprocess.run([self.tool, '-selection', 'clipboard', '-t', target, '-i'], input=data,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
+        except subprocess.TimeoutExpired:
+            raise ClipboardBusy("xclip timed out")
+        if result.returncode != 0:
+            raise ClipboardBusy(f"xclip exited with {result.returncode}")
+        return {name}
+
+    def _read_text(self):
+        try:
+            result = subprocess.run([self.tool, '-selection', 'clipboard', '-o'],
+                                    capture_output=True, timeout=5)
+        except subprocess.TimeoutExpired:
+            raise ClipboardBusy("xclip timed out")
+        if result.returncode != 0:
+            return ''  # Clipboard empty or holds no text
+        return result.stdout.decode('utf-8', errors='replace')
+
+
+def create_clipboard(kind=None):
+    """Clipboard backend for config.CLIPBOARD_BACKEND ('auto' picks one for this platform)"""
+    kind = kind or config.CLIPBOARD_BACKEND
+    if kind not in CLIPBOARD_BACKENDS:
+        raise ValueError(f"CLIPBOARD_BACKEND must be one of {CLIPBOARD_BACKENDS}, got {kind!r}")
+    if kind == 'auto':
+        if os.name == 'nt':
+            kind = 'windows'
+        elif os.environ.get('DISPLAY'):
+            kind = 'x11'
+        else:
+            kind = 'memory'
+    if kind == 'windows':
+        return WindowsClipboard()
+    if kind == 'x11':
+        return X11Clipboard()
+    return MemoryClipboard()
+
+
+def benchmark(clipboard, count):
+    """Time each operation `count` times with a question-sized image"""
+    import io
+    from PIL import Image
+    output = io.BytesIO()
+    Image.new('RGB', (940, 350), (250, 250, 250)).save(output, 'BMP')
+    dib_data = output.getvalue()[14:]
+    text = "TASK: Read the question from attached image." * 4
+
+    for _ in range(count):
+        clipboard.set_text(text)
+        clipboard.get_text()
+        clipboard.set_image(dib_data)
+        clipboard.set_formats(text=text, image=dib_data)
+    return clipboard.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a clipboard backend")
+    parser.add_argument('--backend', choices=CLIPBOARD_BACKENDS, default=config.CLIPBOARD_BACKEND)
+    parser.add_argument('--count', type=int, default=100, help="iterations of each operation")
+    args = parser.parse_args()
+    try:
+        clipboard = create_clipboard(args.backend)
+    except ClipboardError as e:
+        print(f"ERROR: {e}")
+        return 1
+    for line in benchmark(clipboard, args.count):
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Clock
+Where QuizAutomation gets the time from, so simulated runs need not wait
+- RealClock: the time module (production)
+- VirtualClock: discrete-event simulated time for runs against the simulated desktop
+
+With a VirtualClock a sleep returns immediately and moves simulated time
+forward, firing any timers due on the way (the stage watchdog and frame
+sampler run as timers instead of threads). Stage times, latencies and log
+timestamps are all in simulated time, so a 1000-question soak test (about 1.7
+simulated hours) finishes in about 4-5 minutes but still reports how long the
+questions would have taken. Only sleeps
+and waits move simulated time: real blocking work (HTTP requests, disk writes)
+counts as zero
+
+Usage:
+    clock = VirtualClock()
+    automation = QuizAutomation(backend=SimulatedDesktopBackend(clock=clock), clock=clock)
+"""
+
+import heapq
+import itertools
+import queue
+import threading
+import time
+from datetime import datetime
+
+
+class RealTimer:
+    """Calls callback() every `interval` seconds on its own thread"""
+
+    def __init__(self, interval, callback, name):
+        self.interval = interval
+        self.callback = callback
+        self.late = 0  # Ticks that started behind schedule
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while True:
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # The callback took longer than the interval: skip ahead instead of bursting
+                self.late += 1
+                next_tick = time.monotonic()
+                delay = 0
+            if self._stop.wait(delay):
+                return
+            self.callback()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=2)
+
+
+class RealClock:
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def now(self):
+        return datetime.now()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def get(self, events, timeout):
+        """Next item of a queue, waiting up to `timeout` seconds (raises queue.Empty)"""
+        return events.get(timeout=timeout)
+
+    def repeat(self, interval, callback, name):
+        """Call callback() every `interval` seconds until the returned timer is closed"""
+        return RealTimer(interval, callback, name)
+
+
+class VirtualTimer:
+    """Repeating event on a VirtualClock"""
+
+    def __init__(self, clock, interval, callback):
+        self.clock = clock
+        self.interval = interval
+        self.callback = callback
+        self.late = 0  # Always 0: simulated callbacks take no time
+        self.closed = False
+        clock.call_later(interval, self._tick)
+
+    def _tick(self):
+        if self.closed:
+            return
+        self.callback()
+        self.clock.call_later(self.interval, self._tick)
+
+    def close(self):
+        self.closed = True
+
+
+class VirtualClock:
+    """
+    Simulated time that only moves when something sleeps or waits
+    Scheduled events fire in time order on the thread that moves the clock
+    """
+
+    def __init__(self, start=None):
+        """
+        Args:
+            start: Simulated wall-clock time to start at (default: now)
+        """
+        self._now = time.time() if start is None else start
+        self._events = []  # Heap of (when, order, callback)
+        self._order = itertools.count()  # Keeps events due at the same time in scheduling order
+        self._lock = threading.Lock()
+
+    def time(self):
+        return self._now
+
+    def monotonic(self):
+        return self._now
+
+    def now(self):
+        return datetime.fromtimestamp(self._now)
+
+    def call_later(self, delay, callback):
+        """Run callback() once simulated time has moved `delay` seconds on"""
+        with self._lock:
+            heapq.heappush(self._events, (self._now + max(delay, 0), next(self._order), callback))
+
+    def _step(self, until):
+        """
+        Fire the next event due by `until`, or move straight to `until` if there is none
+        Returns True if an event fired
+        """
+        with self._lock:
+            if not self._events or self._events[0][0] > until:
+                self._now = max(self._now, until)
+                return False
+            when, _, callback = heapq.heappop(self._events)
+            self._now = max(self._now, when)
+        callback()  # Outside the lock: callbacks schedule events of their own
+        return True
+
+    def sleep(self, seconds):
+        until = self._now + max(seconds, 0)
+        while self._step(until):
+            pass
+
+    def advance(self, seconds):
+        """Move simulated time forward (same as sleep, for tests driving the clock)"""
+        self.sleep(seconds)
+
+    def get(self, events, timeout):
+        """Next item of a queue, moving simulated time through events until one arrives (raises queue.Empty)"""
+        until = self._now + max(timeout, 0)
+        while True:
+            try:
+                return events.get_nowait()
+            except queue.Empty:
+                pass
+            if not self._step(until):
+                raise queue.Empty
+
+    def repeat(self, interval, callback, name):
+        """Call callback() every `interval` simulated seconds until the returned timer is closed"""
+        return VirtualTimer(self, interval, callback)
@@ -1,10 +1,11 @@
 """
 Configuration file for MCQ Quiz Automation
-Auto-generated by calibration.py
+Screen coordinates below are defaults; calibration.py saves layout profiles
+(layouts/<name>.json) that override them (see layout_profiles.py)
 """
 
 # ============================================================================
-# SCREEN COORDINATES - Auto-calibrated
+# SCREEN COORDINATES - Defaults, overridden by the loaded layout profile
 # ============================================================================
 
 # Quiz Screen Coordinates
@@ -58,6 +59,29 @@ GEMINI_RESPONSE_AREA = {
     'width': 849,
     'height': 100
 }
+GEMINI_NEW_CHAT_BUTTON = {'x': 1010, 'y': 175}
+
+# ============================================================================
+# LAYOUT PROFILES - python calibration.py --profile NAME, python main.py --profile NAME
+# ============================================================================
+
+LAYOUT_DIR = 'layouts'
+LAYOUT_PROFILE = 'default'  # Loaded when no --profile is given (if it exists)
+
+# ============================================================================
+# SIMILARITY THRESHOLDS - tune with python threshold_calibration.py --profile NAME
+# ============================================================================
+
+# Fraction of identical pixels needed for each check (a calibrated layout profile overrides these)
+SIMILARITY_THRESHOLDS = {
+    'ready': 0.85,         # Send button matches the "ready" reference
+    'sent': 0.85,          # Send button matches the "sent" reference (blue stop square)
+    'change': 0.95,        # Below this a region has changed (fallback send check, new chat, page advance)
+    'screen_shift': 0.95,  # Below this the quiz page has shifted after question 1
+    'stability': 0.98,     # At or above this a region has stopped changing
+    'duplicate': 0.98,     # At or above this a new question capture repeats a recent question
+}
+CALIBRATION_FRAMES = 10    # Frames recorded per labelled state by threshold_calibration.py
 
 # ============================================================================
 # TIMING SETTINGS - Adjust based on your system speed and internet
@@ -71,6 +95,176 @@ DELAY_BETWEEN_QUESTIONS = 1.0
 PYAUTOGUI_PAUSE = 0.25
 PYAUTOGUI_FAILSAFE = True
 
+# ============================================================================
+# CLIPBOARD - see clipboard_backends.py
+# ============================================================================
+
+CLIPBOARD_BACKEND = 'auto'        # 'auto', 'windows', 'x11' (needs xclip), 'memory' (in-process only)
+CLIPBOARD_RETRIES = 5             # Retries while another program holds the clipboard
+CLIPBOARD_RETRY_DELAY = 0.01      # Seconds before the first retry (doubles each time)
+COMBINED_PASTE = True             # Prompt and image in one clipboard write and one paste
+COMBINED_PASTE_VERIFY = 3         # Check the first N combined pastes kept the prompt (0 = never check)
+
+# ============================================================================
+# CONVERSATION ROTATION - Start a fresh Gemini chat to keep latency flat
+# ============================================================================
+
+ROTATE_CONVERSATION_EVERY = 10    # Start a new chat every N questions (0 = never)
+ROTATE_ON_LATENCY_DRIFT = 1.5     # Rotate when latency > baseline x this (0 = off)
+ROTATION_BASELINE_QUESTIONS = 3   # Responses used to measure a chat's baseline latency (0 = no drift check)
+NEW_CHAT_READY_TIMEOUT = 10       # Max seconds to wait for the fresh chat pane
+
+# ============================================================================
+# ANSWER PROVIDER - Where answers come from
+# ============================================================================
+
+ANSWER_PROVIDER = 'gui'           # 'gui' (Gemini chat pane), 'http' (answer API), 'stub' (offline)
+ANSWER_API_URL = 'http://127.0.0.1:8765/answer'
+ANSWER_API_KEY = ''
+ANSWER_API_TIMEOUT = 30           # Seconds per request
+ANSWER_API_POOL_SIZE = 2          # Persistent connections kept open
+STUB_ANSWER_DELAY = 0.5           # Simulated model time for the stub provider
+STUB_ANSWER = None                # Fixed stub answer ('A'-'D'), or None for random
+
+# ============================================================================
+# BATCH MODE - Several questions per page, answered in one round-trip
+# ============================================================================
+
+BATCH_MODE = False                # True = answer every question on a page at once
+QUIZ_PAGE_AREA = None             # Full quiz pane {'x', 'y', 'width', 'height'} (None = question area)
+TILE_MIN_GAP = 24                 # Blank rows (px) separating two questions
+TILE_MIN_HEIGHT = 60              # Ignore tiles shorter than this (px)
+OPTION_MIN_GAP = 6                # Blank rows (px) separating option lines in a tile
+
+# ============================================================================
+# CHECKPOINTS - Resume a crashed or stopped run (python main.py --resume)
+# ============================================================================
+
+SAVE_CHECKPOINTS = True           # Save run state after each completed question
+CHECKPOINT_FILE = 'quiz_checkpoint.json'
+
+# ============================================================================
+# SESSION RECORDING - python main.py --record, replay with session_replay.py
+# ============================================================================
+
+SESSION_DIR = 'sessions'
+
+# ============================================================================
+# PROFILING - per-question profiles written to PROFILE_DIR (see profiling.py)
+# ============================================================================
+
+# Profile the first PROFILE_QUESTIONS questions: 'off', 'cprofile', 'tracemalloc' or 'both'
+PROFILE_MODE = 'off'
+PROFILE_QUESTIONS = 3
+PROFILE_KEY = 'f10'  # Press during a run to profile the next PROFILE_QUESTIONS questions
+PROFILE_DIR = 'profiles'
+PROFILE_TOP_N = 25  # Lines in allocation and sample summaries
+PROFILE_TRACEMALLOC_FRAMES = 1
+
+# Low-overhead stack sampling, safe to leave on
+PROFILE_SAMPLING = False
+PROFILE_SAMPLE_INTERVAL = 0.01  # Seconds between samples
+PROFILE_SAMPLE_SLOWER_THAN = 15  # Only write samples for questions slower than this (seconds)
+
+# ============================================================================
+# LIVE METRICS - http://127.0.0.1:METRICS_PORT/metrics (see metrics.py)
+# ============================================================================
+
+METRICS_ENABLED = True
+METRICS_PORT = 9464  # Prometheus text at /metrics, JSON at /metrics.json (None = no HTTP endpoint)
+METRICS_SNAPSHOT_FILE = 'metrics.json'
+METRICS_SNAPSHOT_INTERVAL = 10  # Seconds between snapshot writes (0 = off)
+
+# ============================================================================
+# STAGE WATCHDOG - diagnostics and recovery when a stage hangs (see stage_watchdog.py)
+# ============================================================================
+
+WATCHDOG_ENABLED = True
+
+# Seconds each question stage may take before the watchdog fires
+WATCHDOG_STAGE_BUDGETS = {
+    'capture': 10,
+    'rotate': 30,
+    'upload': 30,
+    'send': 30,
+    'generate': 45,
+    'read': 30,
+    'select': 10,
+    'next': 15,
+}
+
+# What to do when a stage goes over budget:
+# 'log' (diagnostics only), 'cancel' (stop the run), 'retry' (redo the question),
+# 'new_chat' (redo it in a fresh Gemini conversation)
+WATCHDOG_ACTION = 'retry'
+WATCHDOG_MAX_RETRIES = 1
+WATCHDOG_FORCE_AFTER = 10  # Extra seconds before StageTimeout is raised inside a blocked call
+WATCHDOG_CHECK_INTERVAL = 0.5
+WATCHDOG_LOG_EVENTS = 200  # Log lines kept for the diagnostic bundle
+WATCHDOG_DIR = 'diagnostics'
+
+# ============================================================================
+# LATENCY BUDGET - target time per question split into stage budgets (see latency_budget.py)
+# ============================================================================
+
+LATENCY_BUDGET_ENABLED = True  # False: budgets are still reported but never change behavior
+QUESTION_TARGET_SECONDS = 12
+
+# Share of the target each stage gets; unused time is passed on to the next stage
+STAGE_BUDGET_SHARES = {
+    'capture': 0.05,
+    'upload': 0.15,
+    'send': 0.10,
+    'generate': 0.35,
+    'read': 0.10,
+    'select': 0.05,
+    'next': 0.20,
+}
+
+# Polling interval once a stage is over budget (a tentative answer is also used right away)
+BUDGET_FAST_POLL_INTERVAL = 0.2
+
+# ============================================================================
+# PREFLIGHT - warm-up and setup checks while waiting for START_KEY (see preflight.py)
+# ============================================================================
+
+PREFLIGHT_ENABLED = True
+PREFLIGHT_TIMEOUT = 10  # Seconds to wait after START_KEY for checks still running; then they count as failed
+
+# ============================================================================
+# SEND BUTTON STATE CLASSIFIER - built by capture_send_button_refs.py (see ui_state_classifier.py)
+# ============================================================================
+
+STATE_SAMPLES_PER_STATE = 5       # Samples captured per send button state
+STATE_SAMPLE_DIR = 'reference_images/send_button_samples'
+STATE_CLASSIFIER_FILE = 'reference_images/send_button_states.json'
+STATE_CLASSIFIER_MARGIN = 1.5     # Accept grabs up to 1.5x farther from a state than its farthest sample
+STATE_CLASSIFIER_MIN_RADIUS = 0.03  # Smallest accepted distance (RMS, 0-1 colour scale)
+
+# ============================================================================
+# UI STATE MACHINE - drives GUI questions by visual states (see ui_state_machine.py)
+# ============================================================================
+
+UI_STATE_MACHINE = True           # False = linear flow (also used without the state classifier)
+UI_STATE_POLL_INTERVAL = 0.25     # Seconds between ticks (one frame per tick)
+UI_SEND_RETRY_DELAY = 0.5         # Seconds after a send click before clicking again (if still 'ready')
+UI_STATE_TIMEOUTS = {             # Seconds before moving on from a state
+    'upload_pending': 10,         # -> try sending anyway
+    'ready': 15,                  # -> assume it was sent
+    'generating': 20,             # -> read whatever response is there
+    'answered': 5,                # -> default answer
+    'page_advanced': 3,           # -> continue even if the question looks unchanged
+}
+
+# ============================================================================
+# FRAME SAMPLER - background grabs of the watched regions (see frame_sampler.py)
+# ============================================================================
+
+FRAME_SAMPLER_ENABLED = True      # False = each wait sleeps and grabs on its own
+FRAME_SAMPLE_RATE = 10            # Samples per second (a change is seen within 1/rate seconds)
+FRAME_RING_SIZE = 32              # Recent frames kept per region
+FRAME_SAMPLER_REGIONS = ('send_button', 'question')  # Add 'response' to watch the chat pane too (costs CPU)
+
 # ============================================================================
 # AUTOMATION BEHAVIOR
 # ============================================================================
@@ -79,6 +273,11 @@ QUESTION_SELECTION_METHOD = 'triple_click'
 COPY_METHOD = 'ctrl_c'
 USE_OCR = False
 EXPECTED_ANSWER_FORMAT = 'letter'
+ANSWER_OPTION_COUNT = 4           # Options per question (4 = A-D / 1-4, 5 = A-E / 1-5)
+ANSWER_STABLE_SNAPSHOTS = 2       # Commit once the same answer is seen in N polls in a row
+ANSWER_CONFIRM_INTERVAL = 0.2     # Poll interval while confirming a tentative answer
+DUPLICATE_QUESTION_HISTORY = 3    # Recent questions a new capture is compared with (0 = off)
+DUPLICATE_NEXT_RETRIES = 2        # Next clicks retried when the page did not advance
 
 # ============================================================================
 # KEYBOARD SHORTCUTS
@@ -86,6 +285,9 @@ EXPECTED_ANSWER_FORMAT = 'letter'
 
 EMERGENCY_STOP_KEY = 'esc'
 START_KEY = 'f9'
+PAUSE_KEY = 'f8'                  # Pause/resume between questions (async orchestrator)
+SKIP_KEY = 'f7'                   # Abandon the current question and click next (async orchestrator)
+ASYNC_ORCHESTRATOR = True         # Run the loop on asyncio (see orchestrator.py); False = plain loop
 
 # ============================================================================
 # LOGGING AND DEBUG
@@ -94,4 +296,23 @@ START_KEY = 'f9'
 DEBUG_MODE = True
 SAVE_SCREENSHOTS = True
 SCREENSHOT_DIR = 'debug_screenshots'
+DEBUG_CAPTURE_FORMAT = 'archive'      # 'archive' (one delta-compressed file per session) or 'png'
+DEBUG_ARCHIVE_KEYFRAME_INTERVAL = 50  # Store a full frame every N frames of the same size
+DEBUG_ARCHIVE_TILE_SIZE = 64          # Delta tile size (px)
+DEBUG_ARCHIVE_COMPRESSION = 6         # zlib level (1 = fastest, 9 = smallest)
+DEBUG_ARCHIVE_MAX_MB = 200            # Roll over to a new archive part after this size
+RETENTION_ENABLED = True              # Prune debug_screenshots/ in the background
+RETENTION_BUDGET_MB = {               # Byte budget per category ('default' for others)
+    'questions': 200,
+    'gemini_input': 300,
+    'gemini_response': 100,
+    'answers': 300,
+    'screen_shift': 20,
+    'errors': 300,
+    'archives': 2000,
+    'default': 100,
+}
+RETENTION_KEEP_LAST_QUESTIONS = 0     # Ring-buffer mode: keep only the last N questions (0 = off)
+RETENTION_ERROR_WINDOW = 2            # Always keep N questions either side of an error
+# Dedup and ring-buffer mode apply to PNG files only; in 'archive' mode only the 'archives' budget applies
 LOG_FILE = 'quiz_automation.log'
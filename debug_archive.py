@@ -0,0 +1,239 @@
+"""
+Debug Capture Archive
+Stores debug screenshots of a session in one rolling archive file instead of a PNG per step
+
+Frames of the same size form a stream. The first frame of a stream (and every
+DEBUG_ARCHIVE_KEYFRAME_INTERVAL-th after it) is stored whole as a keyframe; the
+others only store the tiles that changed, XOR-encoded against the previous frame.
+Everything goes through one streaming zlib compressor, flushed after each frame
+so the archive stays readable even if the run crashes
+
+Usage:
+    python debug_archive.py list ARCHIVE                      # List frames
+    python debug_archive.py extract ARCHIVE 12 40 -o out/     # Render frames to PNG
+    python debug_archive.py extract ARCHIVE --all -o out/     # Render every frame
+
+Record layout (inside the zlib stream):
+    <meta length: uint32><payload length: uint32><meta JSON><payload bytes>
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+
+import config
+from clock import RealClock
+
+
+RECORD_HEADER = struct.Struct('<II')
+READ_CHUNK_SIZE = 1 << 16
+
+
+def _tile_boxes(width, height, tile_size):
+    """Yield (tile x, tile y, x0, y0, x1, y1) covering the frame"""
+    for y0 in range(0, height, tile_size):
+        for x0 in range(0, width, tile_size):
+            yield (x0 // tile_size, y0 // tile_size, x0, y0,
+                   min(x0 + tile_size, width), min(y0 + tile_size, height))
+
+
+class DebugArchiveWriter:
+    """Appends debug frames to a delta-compressed archive, rolling to a new part when full"""
+
+    def __init__(self, folder, session_name=None, keyframe_interval=None, tile_size=None, max_bytes=None,
+                 clock=None):
+        self.folder = folder
+        self.clock = clock or RealClock()  # Frame timestamps (see clock.py)
+        self.session_name = session_name or f"session_{self.clock.now():%Y%m%d_%H%M%S}"
+        self.keyframe_interval = keyframe_interval or config.DEBUG_ARCHIVE_KEYFRAME_INTERVAL
+        self.tile_size = tile_size or config.DEBUG_ARCHIVE_TILE_SIZE
+        self.max_bytes = max_bytes or config.DEBUG_ARCHIVE_MAX_MB * 1024 * 1024
+        self.part = 0
+        self.frame_count = 0
+        self.bytes_written = 0
+        self._file = None
+        os.makedirs(folder, exist_ok=True)
+        self._open_part()
+
+    def _open_part(self):
+        """Start a new archive file; every stream restarts with a keyframe and a fresh compressor"""
+        if self._file:
+            self._file.write(self._compressor.flush())  # End the part's zlib stream
+            self._file.close()
+        self.part += 1
+        suffix = '' if self.part == 1 else f"_part{self.part}"
+        self.path = os.path.join(self.folder, f"{self.session_name}{suffix}.dbgz")
+        self._file = open(self.path, 'wb')
+        self._compressor = zlib.compressobj(config.DEBUG_ARCHIVE_COMPRESSION)
+        self._streams = {}  # (mode, width, height) -> (previous pixels, frames since keyframe)
+        self.bytes_written = 0
+
+    def add_frame(self, image, name, category=None):
+        """
+        Append a frame
+        Returns (frame index, compressed bytes written)
+        """
+        import numpy as np
+
+        if self.bytes_written >= self.max_bytes:
+            self._open_part()
+
+        pixels = np.asarray(image)
+        if pixels.ndim == 2:
+            pixels = pixels[:, :, None]
+        height, width = pixels.shape[:2]
+        key = (image.mode, width, height)
+        previous, since_keyframe = self._streams.get(key, (None, 0))
+
+        meta = {
+            'index': self.frame_count,
+            'name': name,
+            'category': category,
+            'time': self.clock.now().isoformat(timespec='milliseconds'),
+            'mode': image.mode,
+            'size': [width, height],
+        }
+
+        if previous is None or since_keyframe + 1 >= self.keyframe_interval:
+            meta['type'] = 'key'
+            payload = pixels.tobytes()
+            since_keyframe = 0
+        else:
+            meta['type'] = 'delta'
+            changed = []
+            parts = []
+            for tx, ty, x0, y0, x1, y1 in _tile_boxes(width, height, self.tile_size):
+                tile = pixels[y0:y1, x0:x1]
+                previous_tile = previous[y0:y1, x0:x1]
+                if not np.array_equal(tile, previous_tile):
+                    changed.append([tx, ty])
+                    parts.append(np.bitwise_xor(tile, previous_tile).tobytes())
+            meta['tiles'] = changed
+            meta['tile_size'] = self.tile_size
+            payload = b''.join(parts)
+            since_keyframe += 1
+
+        self._streams[key] = (pixels.copy(), since_keyframe)
+
+        meta_data = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+        record = RECORD_HEADER.pack(len(meta_data), len(payload)) + meta_data + payload
+        compressed = self._compressor.compress(record) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self._file.write(compressed)
+        self._file.flush()
+
+        self.bytes_written += len(compressed)
+        self.frame_count += 1
+        return meta['index'], len(compressed)
+
+    def close(self):
+        if self._file:
+            self._file.write(self._compressor.flush())
+            self._file.close()
+            self._file = None
+
+
+def read_debug_archive(path):
+    """Yield (meta, payload) records from an archive file, tolerating a truncated tail"""
+    decompressor = zlib.decompressobj()
+    buffer = b''
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            if chunk:
+                buffer += decompressor.decompress(chunk)
+            while len(buffer) >= RECORD_HEADER.size:
+                meta_length, payload_length = RECORD_HEADER.unpack_from(buffer)
+                end = RECORD_HEADER.size + meta_length + payload_length
+                if len(buffer) < end:
+                    break
+                meta = json.loads(buffer[RECORD_HEADER.size:RECORD_HEADER.size + meta_length])
+                yield meta, buffer[RECORD_HEADER.size + meta_length:end]
+                buffer = buffer[end:]
+            if not chunk:
+                return
+
+
+def iter_frames(path):
+    """Yield (meta, PIL Image) for every frame, rebuilding delta frames from their stream"""
+    import numpy as np
+    from PIL import Image
+
+    streams = {}
+    for meta, payload in read_debug_archive(path):
+        width, height = meta['size']
+        channels = len(Image.new(meta['mode'], (1, 1)).getbands())
+        key = (meta['mode'], width, height)
+
+        if meta['type'] == 'key':
+            pixels = np.frombuffer(payload, dtype=np.uint8).reshape(height, width, channels).copy()
+        else:
+            pixels = streams[key].copy()
+            tile_size = meta['tile_size']
+            offset = 0
+            for tx, ty in meta['tiles']:
+                x0, y0 = tx * tile_size, ty * tile_size
+                x1, y1 = min(x0 + tile_size, width), min(y0 + tile_size, height)
+                size = (y1 - y0) * (x1 - x0) * channels
+                delta = np.frombuffer(payload[offset:offset + size], dtype=np.uint8)
+                pixels[y0:y1, x0:x1] ^= delta.reshape(y1 - y0, x1 - x0, channels)
+                offset += size
+        streams[key] = pixels
+
+        image_pixels = pixels[:, :, 0] if channels == 1 else pixels
+        yield meta, Image.fromarray(image_pixels)
+
+
+def list_frames(path):
+    """Print one line per frame"""
+    for meta, payload in read_debug_archive(path):
+        tiles = f"{len(meta['tiles'])} tiles" if meta['type'] == 'delta' else 'keyframe'
+        print(f"{meta['index']:6d}  {meta['time']}  {meta['category'] or '-':16s} "
+              f"{meta['name']:30s} {meta['size'][0]}x{meta['size'][1]}  {tiles}")
+
+
+def extract_frames(path, indices, output_dir):
+    """Render selected frames (or all if indices is None) back to PNG"""
+    os.makedirs(output_dir, exist_ok=True)
+    wanted = None if indices is None else set(indices)
+    for meta, image in iter_frames(path):
+        if wanted is not None and meta['index'] not in wanted:
+            continue
+        category = meta['category'] or 'uncategorized'
+        filename = os.path.join(output_dir, f"{meta['index']:06d}_{category}_{meta['name']}.png")
+        image.save(filename)
+        print(f"Extracted: {filename}")
+        if wanted is not None:
+            wanted.discard(meta['index'])
+            if not wanted:
+                break
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List or extract frames from a debug capture archive")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    list_parser = subparsers.add_parser('list', help="list frames")
+    list_parser.add_argument('archive')
+    extract_parser = subparsers.add_parser('extract', help="render frames to PNG")
+    extract_parser.add_argument('archive')
+    extract_parser.add_argument('indices', nargs='*', type=int, help="frame indices to extract")
+    extract_parser.add_argument('--all', action='store_true', help="extract every frame")
+    extract_parser.add_argument('-o', '--output', default='extracted_frames', help="output folder")
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        list_frames(args.archive)
+    else:
+        if not args.indices and not args.all:
+            parser.error("give frame indices or --all")
+        start_time = time.time()
+        extract_frames(args.archive, None if args.all else args.indices, args.output)
+        print(f"Done in {time.time() - start_time:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
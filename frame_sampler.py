@@ -0,0 +1,184 @@
+"""
+Frame Sampler
+A background timer that grabs the watched screen regions at a fixed rate,
+so waits read recent frames instead of each sleeping and capturing on its own
+
+Each region has a ring buffer of the last FRAME_RING_SIZE frames (numpy arrays
+with clock.monotonic() timestamps). Only the sampler thread writes to a ring and
+readers never block it: a slot is filled before the frame count is advanced,
+and both are single assignments (atomic under the GIL), so a reader sees
+either the old or the new frame, never a torn one.
+
+When a region changes between two samples (similarity below
+SIMILARITY_THRESHOLDS['stability']) a change event is published to every
+subscriber. Waits block on these events, so a change is noticed within one
+sample period instead of at the next fixed sleep
+
+Sampling runs on clock.repeat (see clock.py): a thread with the real clock,
+simulated-time events with a VirtualClock
+
+Regions: 'send_button', 'question', 'response' (positions from config.py)
+EASY TO MODIFY: Adjust FRAME_SAMPLER_* settings in config.py
+"""
+
+import queue
+
+import config
+from clock import RealClock
+
+
+def watch_region(name):
+    """Screen region (x, y, width, height) for a watched region name"""
+    if name == 'send_button':
+        return (config.GEMINI_SEND_BUTTON['x'] - 30, config.GEMINI_SEND_BUTTON['y'] - 30, 60, 60)
+    areas = {'question': config.QUIZ_QUESTION_AREA, 'response': config.GEMINI_RESPONSE_AREA}
+    area = areas[name]
+    return (area['x'], area['y'], area['width'], area['height'])
+
+
+class FrameRing:
+    """Fixed-size ring of (sequence, timestamp, frame); one writer, any number of readers"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        self.count = 0  # Frames written so far (published after the slot is filled)
+
+    def push(self, timestamp, frame):
+        sequence = self.count
+        self.slots[sequence % self.capacity] = (sequence, timestamp, frame)
+        self.count = sequence + 1
+
+    def latest(self):
+        """(sequence, timestamp, frame) of the newest frame, or None"""
+        count = self.count
+        if not count:
+            return None
+        return self.slots[(count - 1) % self.capacity]
+
+    def recent(self, n):
+        """Up to n newest frames, oldest first (frames overwritten while reading are left out)"""
+        count = self.count
+        frames = []
+        for sequence in range(max(0, count - min(n, self.capacity)), count):
+            entry = self.slots[sequence % self.capacity]
+            if entry is not None and entry[0] == sequence:
+                frames.append(entry)
+        return frames
+
+
+class ChangeQueue:
+    """Subscriber that queues change events for a waiting thread"""
+
+    def __init__(self, clock=None):
+        self.clock = clock or RealClock()
+        self.events = queue.SimpleQueue()
+
+    def __call__(self, name, timestamp):
+        self.events.put((name, timestamp))
+
+    def wait(self, timeout, since=None, names=None):
+        """
+        Block until a change newer than `since` (monotonic) in one of `names`, or the timeout
+        Returns the region name that changed, or None on timeout
+        """
+        deadline = self.clock.monotonic() + timeout
+        while True:
+            remaining = deadline - self.clock.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                name, timestamp = self.clock.get(self.events, remaining)
+            except queue.Empty:
+                return None
+            if (since is None or timestamp >= since) and (names is None or name in names):
+                return name
+
+
+class FrameSampler:
+    def __init__(self, backend, names=None, rate=None, capacity=None, log=print, clock=None):
+        """
+        Args:
+            backend: AutomationBackend to grab from (grabs happen on the sampler thread)
+            names: Region names to watch (default: FRAME_SAMPLER_REGIONS)
+            rate: Samples per second (default: FRAME_SAMPLE_RATE)
+            capacity: Frames kept per region (default: FRAME_RING_SIZE)
+            clock: RealClock or VirtualClock (see clock.py)
+        """
+        self.backend = backend
+        self.log = log
+        self.clock = clock or RealClock()
+        self.period = 1.0 / (rate or config.FRAME_SAMPLE_RATE)
+        capacity = capacity or config.FRAME_RING_SIZE
+        self.regions = {name: watch_region(name) for name in (names or config.FRAME_SAMPLER_REGIONS)}
+        self.rings = {name: FrameRing(capacity) for name in self.regions}
+        self.subscribers = []
+        self.stats = {'samples': 0, 'changes': 0, 'late': 0, 'grab_time': 0.0, 'errors': 0}
+        self._timer = None
+
+    def subscribe(self, callback):
+        """Call callback(name, timestamp) on the sampler thread whenever a region changes"""
+        self.subscribers = self.subscribers + [callback]  # Replaced, not mutated, while the thread reads it
+        return callback
+
+    def unsubscribe(self, callback):
+        self.subscribers = [subscriber for subscriber in self.subscribers if subscriber is not callback]
+
+    def start(self):
+        self._timer = self.clock.repeat(self.period, self._sample, name='frame-sampler')
+        self.log(f"Frame sampler watching {', '.join(self.regions)} every {self.period * 1000:.0f}ms")
+
+    def close(self):
+        if self._timer:
+            self._timer.close()
+
+    def latest(self, name, max_age=None):
+        """Newest frame of a region as (timestamp, array), or None if there is none younger than max_age"""
+        entry = self.rings[name].latest()
+        if entry is None or (max_age is not None and self.clock.monotonic() - entry[1] > max_age):
+            return None
+        return entry[1], entry[2]
+
+    def latest_image(self, name, max_age=None):
+        """Newest frame of a region as a PIL image (see latest)"""
+        from PIL import Image
+        entry = self.latest(name, max_age)
+        return None if entry is None else Image.fromarray(entry[1])
+
+    def recent(self, name, n):
+        """Up to n newest frames of a region as [(timestamp, array)], oldest first"""
+        return [(timestamp, frame) for _, timestamp, frame in self.rings[name].recent(n)]
+
+    def _sample(self):
+        """One tick: grab every region and publish the ones that changed"""
+        import numpy as np
+        threshold = config.SIMILARITY_THRESHOLDS['stability']
+        for name, region in self.regions.items():
+            started = self.clock.monotonic()
+            try:
+                frame = np.asarray(self.backend.screenshot(region=region).convert('RGB'))
+            except Exception as e:
+                self.stats['errors'] += 1
+                if self.stats['errors'] == 1:
+                    self.log(f"WARNING: Frame sampler could not grab '{name}': {e}")
+                continue
+            timestamp = self.clock.monotonic()
+            self.stats['grab_time'] += timestamp - started
+
+            ring = self.rings[name]
+            previous = ring.latest()
+            ring.push(timestamp, frame)
+            self.stats['samples'] += 1
+            if previous is not None and (previous[2].shape != frame.shape or
+                                         np.mean(previous[2] == frame) < threshold):
+                self.stats['changes'] += 1
+                for subscriber in self.subscribers:
+                    subscriber(name, timestamp)
+
+    def summary(self):
+        stats = self.stats
+        if self._timer:
+            stats['late'] = self._timer.late
+        average = stats['grab_time'] / stats['samples'] * 1000 if stats['samples'] else 0.0
+        return (f"Frame sampler: {stats['samples']} grabs (avg {average:.1f}ms), {stats['changes']} changes, "
+                f"{stats['late']} late ticks, {stats['errors']} errors")
@@ -0,0 +1,96 @@
+"""
+Per-Question Latency Budget
+Splits a target time per question into stage budgets and tracks overruns
+
+Each stage gets its share of QUESTION_TARGET_SECONDS. A stage that finishes
+early donates its slack to the stages after it in the same question. While a
+stage is over budget, the polling loops switch to faster polling and take early
+fallbacks (e.g. a tentative answer is used without waiting for it to be stable).
+At the end of the run, report() lists which stages overran and how often
+EASY TO MODIFY: Adjust QUESTION_TARGET_SECONDS and STAGE_BUDGET_SHARES in config.py
+"""
+
+import config
+
+
+class LatencyBudget:
+    def __init__(self, target=None, shares=None):
+        self.target = target or config.QUESTION_TARGET_SECONDS
+        shares = shares or config.STAGE_BUDGET_SHARES
+        total_share = sum(shares.values())
+        self.base_budgets = {stage: self.target * share / total_share for stage, share in shares.items()}
+
+        self.slack = 0.0      # Donated by earlier stages of the current question
+        self.budgets = {}     # Budgets given out in the current question
+        self.scale = 1        # Questions handled at once (batch mode pages)
+        self.questions = 0
+        self.questions_over_target = 0
+        # stage -> {'count', 'overruns', 'total_elapsed', 'total_budget', 'total_overrun', 'max_overrun'}
+        self.stage_stats = {}
+
+    def start_question(self, questions=1):
+        """Start budgeting a question (or a batch page of several questions)"""
+        self.slack = 0.0
+        self.budgets = {}
+        self.scale = questions
+
+    def budget_for(self, stage):
+        """Budget of a stage in the current question (None for unbudgeted stages like 'rotate')"""
+        if stage not in self.base_budgets:
+            return None
+        if stage not in self.budgets:
+            self.budgets[stage] = self.base_budgets[stage] * self.scale + self.slack
+            self.slack = 0.0
+        return self.budgets[stage]
+
+    def over_budget(self, stage, elapsed):
+        budget = self.budget_for(stage)
+        return budget is not None and elapsed > budget
+
+    def finish_stage(self, stage, elapsed):
+        """Record a finished stage; returns the overrun in seconds (0 if within budget)"""
+        budget = self.budget_for(stage)
+        if budget is None:
+            return 0.0
+        stats = self.stage_stats.setdefault(stage, {
+            'count': 0, 'overruns': 0, 'total_elapsed': 0.0, 'total_budget': 0.0,
+            'total_overrun': 0.0, 'max_overrun': 0.0,
+        })
+        stats['count'] += 1
+        stats['total_elapsed'] += elapsed
+        stats['total_budget'] += budget
+
+        if elapsed <= budget:
+            # Pass the unused time on to the next stage
+            self.slack = budget - elapsed
+            return 0.0
+
+        overrun = elapsed - budget
+        stats['overruns'] += 1
+        stats['total_overrun'] += overrun
+        stats['max_overrun'] = max(stats['max_overrun'], overrun)
+        return overrun
+
+    def finish_question(self, elapsed, questions=1):
+        self.questions += questions
+        if elapsed > self.target * questions:
+            self.questions_over_target += questions
+
+    def report(self):
+        """Overrun report lines for the end-of-run log"""
+        if not self.questions:
+            return []
+        lines = [f"Latency budget: target {self.target:.1f}s per question, "
+                 f"{self.questions_over_target}/{self.questions} questions over target"]
+        lines.append(f"  {'stage':10s} {'budget':>8s} {'avg':>8s} {'overruns':>12s} {'avg over':>9s} {'max over':>9s}")
+        for stage in self.base_budgets:
+            stats = self.stage_stats.get(stage)
+            if not stats:
+                continue
+            overruns = stats['overruns']
+            average_over = stats['total_overrun'] / overruns if overruns else 0.0
+            lines.append(f"  {stage:10s} {stats['total_budget'] / stats['count']:7.2f}s "
+                         f"{stats['total_elapsed'] / stats['count']:7.2f}s "
+                         f"{overruns:4d} ({overruns / stats['count']:4.0%}) "
+                         f"{average_over:8.2f}s {stats['max_overrun']:8.2f}s")
+        return lines
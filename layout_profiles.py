@@ -0,0 +1,220 @@
+"""
+Layout Profiles
+Screen coordinates per screen and quiz site, stored as small JSON files in LAYOUT_DIR
+instead of being written into config.py
+
+A profile holds the calibrated regions and click points plus the screen size
+they were captured on, and optionally similarity thresholds tuned by
+threshold_calibration.py. Loading one takes well under a millisecond and
+overrides the matching values in config for the rest of the run
+
+Usage:
+    python calibration.py --profile laptop_quizsite      # Calibrate into layouts/laptop_quizsite.json
+    python main.py --profile laptop_quizsite             # Run with it
+    python layout_profiles.py list                       # List saved profiles
+    python layout_profiles.py show laptop_quizsite       # Print one
+    python layout_profiles.py export NAME                # Save the coordinates in config.py as a profile
+EASY TO MODIFY: Adjust LAYOUT_DIR and LAYOUT_PROFILE in config.py
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import config
+
+
+LAYOUT_VERSION = 1
+
+# Config values that belong to a layout (everything else stays in config.py)
+LAYOUT_KEYS = (
+    'QUIZ_QUESTION_AREA',
+    'ANSWER_OPTIONS_Q1',
+    'NEXT_BUTTON_Q1',
+    'ANSWER_OPTIONS_Q2',
+    'NEXT_BUTTON_Q2',
+    'GEMINI_INPUT_FIELD',
+    'GEMINI_SEND_BUTTON',
+    'GEMINI_RESPONSE_AREA',
+    'GEMINI_NEW_CHAT_BUTTON',
+    'QUIZ_PAGE_AREA',
+)
+
+
+class LayoutError(Exception):
+    """A profile is missing, unreadable or does not fit the screen"""
+
+
+def layout_path(name):
+    return os.path.join(config.LAYOUT_DIR, f"{name}.json")
+
+
+def list_layouts():
+    try:
+        return sorted(entry[:-5] for entry in os.listdir(config.LAYOUT_DIR) if entry.endswith('.json'))
+    except FileNotFoundError:
+        return []
+
+
+def current_layout():
+    """Layout values currently in config"""
+    return {key: getattr(config, key) for key in LAYOUT_KEYS if getattr(config, key, None) is not None}
+
+
+def save_layout(name, layout, screen_size, thresholds=None):
+    """Write a profile atomically; returns its path"""
+    profile = {
+        'version': LAYOUT_VERSION,
+        'name': name,
+        'screen': list(screen_size),
+        'saved_at': datetime.now().isoformat(timespec='seconds'),
+        'layout': {key: layout[key] for key in LAYOUT_KEYS if key in layout},
+    }
+    if thresholds:
+        profile['thresholds'] = thresholds
+    return _write_profile(name, profile)
+
+
+def save_thresholds(name, thresholds, screen_size):
+    """
+    Store calibrated similarity thresholds in a profile, keeping its layout
+    Creates the profile from the coordinates in config if it does not exist yet
+    """
+    try:
+        profile = load_layout(name)
+    except LayoutError:
+        if os.path.exists(layout_path(name)):
+            raise
+        return save_layout(name, current_layout(), screen_size, thresholds)
+    profile['thresholds'] = dict(profile.get('thresholds', {}), **thresholds)
+    profile['saved_at'] = datetime.now().isoformat(timespec='seconds')
+    return _write_profile(name, profile)
+
+
+def _write_profile(name, profile):
+    os.makedirs(config.LAYOUT_DIR, exist_ok=True)
+    path = layout_path(name)
+    fd, temp_path = tempfile.mkstemp(prefix='.layout_', suffix='.tmp', dir=config.LAYOUT_DIR)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(profile, f, indent=1)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def load_layout(name):
+    """Read a profile"""
+    try:
+        with open(layout_path(name), 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+    except FileNotFoundError:
+        available = ', '.join(list_layouts()) or 'none'
+        raise LayoutError(f"No layout profile '{name}' in {config.LAYOUT_DIR}/ (available: {available})")
+    except ValueError as e:
+        raise LayoutError(f"Layout profile '{name}' is not valid JSON: {e}")
+    if profile.get('version') != LAYOUT_VERSION:
+        raise LayoutError(f"Layout profile '{name}' has version {profile.get('version')}, expected {LAYOUT_VERSION}")
+    return profile
+
+
+def _layout_regions(layout):
+    """(name, x, y, width, height) for every area and click point in a layout"""
+    for key, value in layout.items():
+        if value is None:
+            continue
+        if 'width' in value:
+            yield key, value['x'], value['y'], value['width'], value['height']
+        elif 'x' in value:
+            yield key, value['x'], value['y'], 1, 1
+        else:
+            for option, point in value.items():
+                yield f"{key}[{option}]", point['x'], point['y'], 1, 1
+
+
+def validate_layout(profile, screen_size):
+    """Problems with using a profile on a screen of this size (empty list = fine)"""
+    problems = []
+    width, height = screen_size
+    if list(profile['screen']) != [width, height]:
+        problems.append(f"calibrated on a {profile['screen'][0]}x{profile['screen'][1]} screen, "
+                        f"this screen is {width}x{height}")
+    for name, x, y, w, h in _layout_regions(profile['layout']):
+        if x < 0 or y < 0 or x + w > width or y + h > height:
+            problems.append(f"{name} is off screen")
+    for check, value in profile.get('thresholds', {}).items():
+        if check not in config.SIMILARITY_THRESHOLDS:
+            problems.append(f"unknown threshold '{check}'")
+        elif not 0 < value <= 1:
+            problems.append(f"threshold '{check}' must be between 0 and 1, got {value}")
+    return problems
+
+
+def apply_layout(profile):
+    """Override the layout values (and calibrated thresholds) in config"""
+    for key, value in profile['layout'].items():
+        if key in LAYOUT_KEYS:
+            setattr(config, key, value)
+    if profile.get('thresholds'):
+        config.SIMILARITY_THRESHOLDS = dict(config.SIMILARITY_THRESHOLDS, **profile['thresholds'])
+
+
+def use_layout(name, screen_size, log=print):
+    """
+    Load, validate and apply a profile
+    Raises LayoutError if it is missing or does not fit the screen
+    """
+    start_time = time.perf_counter()
+    profile = load_layout(name)
+    problems = validate_layout(profile, screen_size)
+    if problems:
+        raise LayoutError(f"Layout profile '{name}' does not fit this screen: " + '; '.join(problems))
+    apply_layout(profile)
+    log(f"Layout profile '{name}' loaded in {(time.perf_counter() - start_time) * 1000:.2f}ms "
+        f"({profile['screen'][0]}x{profile['screen'][1]}, saved {profile['saved_at']})")
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage layout profiles")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help="list saved profiles")
+    show_parser = subparsers.add_parser('show', help="print a profile")
+    show_parser.add_argument('name')
+    export_parser = subparsers.add_parser('export', help="save the coordinates in config.py as a profile")
+    export_parser.add_argument('name')
+    export_parser.add_argument('--screen', help="screen size WIDTHxHEIGHT (default: current screen)")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'list':
+            for name in list_layouts():
+                profile = load_layout(name)
+                tuned = ", thresholds calibrated" if profile.get('thresholds') else ""
+                print(f"{name:24s} {profile['screen'][0]}x{profile['screen'][1]}  saved {profile['saved_at']}{tuned}")
+        elif args.command == 'show':
+            print(json.dumps(load_layout(args.name), indent=2))
+        else:
+            if args.screen:
+                screen_size = tuple(int(part) for part in args.screen.lower().split('x'))
+            else:
+                import pyautogui
+                screen_size = tuple(pyautogui.size())
+            print(f"Saved {save_layout(args.name, current_layout(), screen_size)}")
+    except LayoutError as e:
+        print(f"ERROR: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
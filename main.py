@@ -8,13 +8,32 @@ Usage:
 3. Set up Gemini with system instructions (see README.md)
 4. Run this script
 5. Press F9 to start automation
-6. Press ESC to stop at any time
+6. Press ESC to stop at any time (F8 pauses/resumes, F7 skips the current question)
+7. Press F10 to profile the next few questions (see profiling.py)
+
+To continue a crashed or stopped run from the next question:
+    python main.py --resume
+
+To record the run for offline replay (see session_replay.py):
+    python main.py --record
+
+To use a saved layout profile (see layout_profiles.py):
+    python main.py --profile NAME
 """
 
-import time
+import argparse
+import asyncio
+import os
 import sys
+import threading
 import keyboard
+from automation_backend import PyAutoGUIBackend
+from clock import RealClock
+from layout_profiles import LayoutError, layout_path, use_layout
+from orchestrator import Orchestrator
+from preflight import report_preflight, run_preflight
 from quiz_automation import QuizAutomation
+from session_replay import RecordingBackend
 import config
 
 
@@ -37,6 +56,10 @@ def print_instructions():
     print("Controls:")
     print(f"  • Press {config.START_KEY.upper()} to START automation")
     print(f"  • Press {config.EMERGENCY_STOP_KEY.upper()} to STOP at any time")
+    if config.ASYNC_ORCHESTRATOR:
+        print(f"  • Press {config.PAUSE_KEY.upper()} to PAUSE/RESUME between questions")
+        print(f"  • Press {config.SKIP_KEY.upper()} to SKIP the current question")
+    print(f"  • Press {config.PROFILE_KEY.upper()} to PROFILE the next {config.PROFILE_QUESTIONS} questions")
     print()
     print("="*70)
     print()
@@ -76,28 +99,45 @@ Your response: B
     print()
 
 
-def wait_for_start():
+def wait_for_start(clock):
     """Wait for user to press start key"""
     print(f"Press {config.START_KEY.upper()} when ready to start...")
     keyboard.wait(config.START_KEY)
     print("\nStarting automation in 3 seconds...")
     print("Position your windows now!")
-    time.sleep(3)
+    clock.sleep(3)
     print("\n🚀 AUTOMATION STARTED!\n")
 
 
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="MCQ Quiz Automation")
+    parser.add_argument('--resume', action='store_true',
+                        help=f"continue from the last checkpoint ({config.CHECKPOINT_FILE})")
+    parser.add_argument('--record', action='store_true',
+                        help=f"record frames, input and clipboard reads to {config.SESSION_DIR}/")
+    parser.add_argument('--profile',
+                        help=f"layout profile from {config.LAYOUT_DIR}/ (default: {config.LAYOUT_PROFILE})")
+    return parser.parse_args()
+
+
 def main():
     """Main function"""
+    args = parse_args()
     print_banner()
     print_instructions()
-    setup_gemini_instructions()
     
-    # Ask user if they want to see instructions
-    response = input("Have you set up Gemini with system instructions? (y/n): ")
-    if response.lower() != 'y':
-        print("\nPlease set up Gemini first with the instructions shown above.")
-        print("You can paste them into Gemini's system instructions.")
-        return
+    if args.resume:
+        print(f"Resuming from checkpoint: {config.CHECKPOINT_FILE}\n")
+    else:
+        setup_gemini_instructions()
+        
+        # Ask user if they want to see instructions
+        response = input("Have you set up Gemini with system instructions? (y/n): ")
+        if response.lower() != 'y':
+            print("\nPlease set up Gemini first with the instructions shown above.")
+            print("You can paste them into Gemini's system instructions.")
+            return
     
     print()
     
@@ -114,11 +154,57 @@ def main():
     
     print()
     
-    # Wait for start signal
-    wait_for_start()
+    # Load the screen layout for this monitor/quiz site
+    clock = RealClock()
+    backend = PyAutoGUIBackend()
+    profile_name = args.profile or config.LAYOUT_PROFILE
+    if args.profile or os.path.exists(layout_path(profile_name)):
+        try:
+            use_layout(profile_name, backend.get_screen_size())
+        except LayoutError as e:
+            print(f"\n❌ {e}")
+            print(f"Calibrate this screen with: python calibration.py --profile {profile_name}")
+            return
+    else:
+        print("No layout profile found - using coordinates from config.py (run calibration.py to create one)\n")
     
     # Create automation instance
-    automation = QuizAutomation()
+    if args.record:
+        session_path = os.path.join(config.SESSION_DIR, f"session_{clock.now():%Y%m%d_%H%M%S}.qrec")
+        backend = RecordingBackend(backend, session_path)
+        print(f"Recording session to {session_path}")
+    automation = QuizAutomation(backend=backend, serve_metrics=not config.ASYNC_ORCHESTRATOR, clock=clock)
+    
+    # Warm up and check the setup while waiting for the start key
+    preflight = None
+    preflight_result = {}
+    preflight_checks = []
+    
+    def run_checks():
+        results = run_preflight(automation, preflight_checks)
+        if 'ok' not in preflight_result:  # Not already reported as timed out
+            preflight_result['ok'] = report_preflight(results, automation.log)
+    
+    if config.PREFLIGHT_ENABLED:
+        preflight = threading.Thread(target=run_checks, name='preflight', daemon=True)
+        preflight.start()
+    
+    # Wait for start signal
+    wait_for_start(clock)
+    if preflight:
+        preflight.join(timeout=config.PREFLIGHT_TIMEOUT)
+        if preflight.is_alive():
+            # A hung check (e.g. a slow provider probe) must not block the run: report it as failed
+            automation.log(f"Preflight did not finish within {config.PREFLIGHT_TIMEOUT}s of the start key")
+            preflight_result['ok'] = False
+            report_preflight(list(preflight_checks), automation.log)
+        if not preflight_result.get('ok', True):
+            print("⚠️  Preflight found problems (see above) - run calibration.py if regions are wrong\n")
+    
+    automation.start_frame_sampler()
+    
+    if args.resume and not automation.resume_from_checkpoint():
+        print("\nNo checkpoint to resume from - starting from question 1.")
     
     # Setup emergency stop
     stop_flag = {'stop': False}
@@ -129,24 +215,43 @@ def main():
         print("\n\n⚠️  EMERGENCY STOP ACTIVATED!")
         print("Automation stopped safely.")
     
-    keyboard.add_hotkey(config.EMERGENCY_STOP_KEY, emergency_stop)
+    keyboard.add_hotkey(config.PROFILE_KEY, automation.profiler.arm)
     
-    # Main automation loop
+    # Main automation loop (batch mode answers a whole page per iteration)
+    process = automation.process_page if config.BATCH_MODE else automation.process_question
     questions_processed = 0
     
+    def print_progress(questions_processed):
+        print(f"\n✓ Progress: {questions_processed} questions completed")
+        print(f"  Next question in {config.DELAY_BETWEEN_QUESTIONS}s...")
+    
     try:
-        while questions_processed < num_questions and not stop_flag['stop']:
-            success = automation.process_question()
-            
-            if not success:
+        if config.ASYNC_ORCHESTRATOR:
+            # Hotkeys, metrics and debug writes on an asyncio loop (see orchestrator.py)
+            orchestrator = Orchestrator(automation, process, num_questions, hotkeys=keyboard,
+                                        on_progress=print_progress)
+            success, questions_processed = asyncio.run(orchestrator.run())
+            stop_flag['stop'] = orchestrator.stopped
+            if orchestrator.stopped:
+                print("\n\n⚠️  EMERGENCY STOP ACTIVATED!")
+                print("Automation stopped safely.")
+            elif not success:
                 print("\n❌ Error occurred. Stopping automation.")
-                break
-            
-            questions_processed += 1
-            
-            if questions_processed < num_questions:
-                print(f"\n✓ Progress: {questions_processed} questions completed")
-                print(f"  Next question in {config.DELAY_BETWEEN_QUESTIONS}s...")
+                stop_flag['stop'] = True
+        else:
+            keyboard.add_hotkey(config.EMERGENCY_STOP_KEY, emergency_stop)
+            while questions_processed < num_questions and not stop_flag['stop']:
+                count_before = automation.question_count
+                success = process()
+                
+                if not success:
+                    print("\n❌ Error occurred. Stopping automation.")
+                    break
+                
+                questions_processed += automation.question_count - count_before
+                
+                if questions_processed < num_questions:
+                    print_progress(questions_processed)
         
         if not stop_flag['stop']:
             print("\n" + "="*70)
@@ -164,8 +269,16 @@ def main():
     finally:
         # Cleanup
         keyboard.unhook_all()
+        automation.log_conversation_stats()
+        automation.answer_provider.log_timing_summary()
+        automation.log_budget_report()
+        automation.log_clipboard_stats()
+        automation.log_duplicate_stats()
+        automation.close()
+        automation.backend.close()
         print("\nAutomation ended.")
         print(f"Check {config.LOG_FILE} for detailed logs.")
+        print("Summarize this run with: python run_report.py --last 1")
         if config.SAVE_SCREENSHOTS:
             print(f"Screenshots saved in {config.SCREENSHOT_DIR}/")
 
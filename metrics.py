@@ -0,0 +1,374 @@
+"""
+Live Metrics
+In-process counters, gauges and latency histograms for the running automation
+
+Exposed two ways while a run is going:
+- http://127.0.0.1:METRICS_PORT/metrics       Prometheus text format
+- http://127.0.0.1:METRICS_PORT/metrics.json  Same data as JSON
+- METRICS_SNAPSHOT_FILE, rewritten every METRICS_SNAPSHOT_INTERVAL seconds
+
+The server only listens on localhost. MetricsExporter serves from its own
+threads; AsyncMetricsExporter does the same on an asyncio loop (orchestrator.py)
+EASY TO MODIFY: Adjust METRICS_* settings in config.py
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+
+
+METRICS_HOST = '127.0.0.1'  # Local only - never bind this to a public interface
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """One named metric with a value per label set"""
+    kind = None
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}  # sorted (label, value) tuple -> value
+
+    @staticmethod
+    def key(labels):
+        return tuple(sorted(labels.items()))
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self.key(labels), 0)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        self.values[self.key(labels)] = value
+
+    def get(self, **labels):
+        return self.values.get(self.key(labels))
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry['counts'][i] += 1
+                break
+        entry['sum'] += value
+        entry['count'] += 1
+
+    def quantile(self, q, **labels):
+        """Estimate a quantile by interpolating inside the matching bucket"""
+        entry = self.values.get(self.key(labels))
+        if not entry or not entry['count']:
+            return None
+        rank = q * entry['count']
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, entry['counts']):
+            if count and seen + count >= rank:
+                if bound == float('inf'):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return lower
+
+
+class MetricsRegistry:
+    """Holds every metric; safe to read from the exporter threads while the run updates it"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def _register(self, metric):
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text):
+        return self._register(Counter(name, help_text))
+
+    def gauge(self, name, help_text):
+        return self._register(Gauge(name, help_text))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, buckets))
+
+    def inc(self, name, amount=1, **labels):
+        with self.lock:
+            self.metrics[name].inc(amount, **labels)
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.metrics[name].set(value, **labels)
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            self.metrics[name].observe(value, **labels)
+
+    def total(self, name):
+        """Sum of a counter over every label set"""
+        with self.lock:
+            return sum(self.metrics[name].values.values())
+
+    def render_prometheus(self):
+        """Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for metric in self.metrics.values():
+                lines.append(f"# HELP {metric.name} {metric.help_text}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                for key, value in metric.values.items():
+                    if metric.kind != 'histogram':
+                        lines.append(f"{metric.name}{_label_text(key)} {_format_value(value)}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets, value['counts']):
+                        cumulative += count
+                        bucket_key = key + (('le', _format_value(bound)),)
+                        lines.append(f"{metric.name}_bucket{_label_text(bucket_key)} {cumulative}")
+                    lines.append(f"{metric.name}_sum{_label_text(key)} {value['sum']!r}")
+                    lines.append(f"{metric.name}_count{_label_text(key)} {value['count']}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """Plain-dict view: counters/gauges per label set, histograms with count, mean and p50/p95/p99"""
+        data = {'time': time.time(), 'uptime': time.time() - self.started, 'metrics': {}}
+        with self.lock:
+            for metric in self.metrics.values():
+                series = []
+                for key, value in metric.values.items():
+                    entry = {'labels': dict(key)}
+                    if metric.kind == 'histogram':
+                        labels = dict(key)
+                        entry.update(count=value['count'], sum=value['sum'],
+                                     mean=value['sum'] / value['count'] if value['count'] else None,
+                                     p50=metric.quantile(0.5, **labels),
+                                     p95=metric.quantile(0.95, **labels),
+                                     p99=metric.quantile(0.99, **labels))
+                    else:
+                        entry['value'] = value
+                    series.append(entry)
+                data['metrics'][metric.name] = {'type': metric.kind, 'series': series}
+        return data
+
+
+def create_automation_metrics():
+    """Registry with the metrics QuizAutomation reports"""
+    registry = MetricsRegistry()
+    registry.counter('quiz_questions_total', "Questions answered").inc(0)
+    registry.counter('quiz_question_errors_total', "Questions that failed").inc(0)
+    registry.counter('quiz_send_retries_total', "Extra send button clicks before the message was sent").inc(0)
+    registry.counter('quiz_poll_ticks_total', "Screen/clipboard polls while waiting")
+    registry.counter('quiz_parse_fallbacks_total', "Responses with no answer found (defaulted to 'A')").inc(0)
+    registry.counter('quiz_cache_hits_total', "Lookups served from an in-memory cache")
+    registry.counter('quiz_watchdog_trips_total', "Stages that went over their watchdog budget")
+    registry.counter('quiz_duplicate_questions_total', "Captures that repeated a recent question (Next not registered)")
+    registry.counter('quiz_budget_overruns_total', "Stages that finished over their latency budget")
+    registry.counter('quiz_ui_state_timeouts_total', "UI states left by timeout instead of by what was seen")
+    registry.gauge('quiz_conversation_number', "Current Gemini conversation")
+    registry.histogram('quiz_stage_seconds', "Time spent in each question stage")
+    registry.histogram('quiz_question_seconds', "Time per question")
+    registry.histogram('quiz_ui_state_seconds', "Time spent in each UI state (UI state machine)")
+    return registry
+
+
+def metrics_response(registry, path):
+    """(content type, body) for a metrics URL path, or None if there is nothing there"""
+    if path == '/metrics':
+        return 'text/plain; version=0.0.4; charset=utf-8', registry.render_prometheus().encode('utf-8')
+    if path == '/metrics.json':
+        return 'application/json', json.dumps(registry.snapshot()).encode('utf-8')
+    return None
+
+
+def write_snapshot(registry, snapshot_file, log=print):
+    """Write the JSON snapshot atomically (readers never see a half-written file)"""
+    folder = os.path.dirname(os.path.abspath(snapshot_file))
+    fd, temp_path = tempfile.mkstemp(prefix='.metrics_', suffix='.tmp', dir=folder)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(registry.snapshot(), f, indent=1)
+        os.replace(temp_path, snapshot_file)
+    except OSError as e:
+        log(f"WARNING: Could not write metrics snapshot: {e}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+class MetricsExporter:
+    """Serves the registry over local HTTP and writes periodic JSON snapshots"""
+
+    def __init__(self, registry, port=None, snapshot_file=None, snapshot_interval=None, log=print):
+        self.registry = registry
+        self.log = log
+        self.snapshot_file = config.METRICS_SNAPSHOT_FILE if snapshot_file is None else snapshot_file
+        self.snapshot_interval = config.METRICS_SNAPSHOT_INTERVAL if snapshot_interval is None else snapshot_interval
+        self._stop = threading.Event()
+        self._server = None
+        self._threads = []
+
+        port = config.METRICS_PORT if port is None else port
+        if port is not None:
+            try:
+                self._server = ThreadingHTTPServer((METRICS_HOST, port), self._make_handler())
+                self._server.daemon_threads = True
+                self._start_thread(self._server.serve_forever, 'metrics-http')
+                self.log(f"Metrics at {self.url}")
+            except OSError as e:
+                self.log(f"WARNING: Could not start metrics endpoint on port {port}: {e}")
+                self._server = None
+
+        if self.snapshot_file and self.snapshot_interval:
+            self._start_thread(self._snapshot_loop, 'metrics-snapshot')
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _make_handler(self):
+        registry = self.registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                response = metrics_response(registry, self.path)
+                if response is None:
+                    self.send_error(404)
+                    return
+                content_type, body = response
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return MetricsHandler
+
+    def write_snapshot(self):
+        write_snapshot(self.registry, self.snapshot_file, self.log)
+
+    def _snapshot_loop(self):
+        while not self._stop.wait(self.snapshot_interval):
+            self.write_snapshot()
+
+    def close(self):
+        self._stop.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        if self.snapshot_file and self.snapshot_interval:
+            self.write_snapshot()
+
+
+class AsyncMetricsExporter:
+    """MetricsExporter for an asyncio loop: the HTTP endpoint and snapshot writes are tasks, not threads"""
+
+    def __init__(self, registry, port=None, snapshot_file=None, snapshot_interval=None, log=print):
+        self.registry = registry
+        self.log = log
+        self.port = config.METRICS_PORT if port is None else port
+        self.snapshot_file = config.METRICS_SNAPSHOT_FILE if snapshot_file is None else snapshot_file
+        self.snapshot_interval = config.METRICS_SNAPSHOT_INTERVAL if snapshot_interval is None else snapshot_interval
+        self._server = None
+        self._snapshots = None
+
+    async def start(self):
+        if self.port is not None:
+            try:
+                self._server = await asyncio.start_server(self._handle, METRICS_HOST, self.port)
+                host, port = self._server.sockets[0].getsockname()[:2]
+                self.log(f"Metrics at http://{host}:{port}/metrics")
+            except OSError as e:
+                self.log(f"WARNING: Could not start metrics endpoint on port {self.port}: {e}")
+        if self.snapshot_file and self.snapshot_interval:
+            self._snapshots = asyncio.create_task(self._snapshot_loop())
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+                pass  # Headers are not needed
+            parts = request_line.decode('latin-1').split()
+            response = metrics_response(self.registry, parts[1]) if len(parts) > 1 and parts[0] == 'GET' else None
+            if response is None:
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            else:
+                content_type, body = response
+                writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\n"
+                             f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _snapshot_loop(self):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            await asyncio.to_thread(write_snapshot, self.registry, self.snapshot_file, self.log)
+
+    async def close(self):
+        if self._snapshots:
+            self._snapshots.cancel()
+            try:
+                await self._snapshots
+            except asyncio.CancelledError:
+                pass
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        if self.snapshot_file and self.snapshot_interval:
+            write_snapshot(self.registry, self.snapshot_file, self.log)
@@ -0,0 +1,151 @@
+"""
+Async Orchestrator
+Runs the automation loop on an asyncio event loop
+
+Each question is a coroutine that awaits its blocking work on a single input
+thread (capture, clipboard, mouse and keyboard must stay in order). Everything
+else runs on the loop alongside it:
+- stop / pause / skip hotkeys, delivered from the keyboard thread with call_soon_threadsafe
+- the metrics endpoint and snapshot writes (metrics.AsyncMetricsExporter)
+- debug screenshot encoding and writes, on their own thread in order, so the
+  previous question's images are written while the next one is generating
+Stop and skip cancel the running question at its next cancellation check
+(see QuizAutomation.check_cancelled); pause takes effect between questions
+
+EASY TO MODIFY: Hotkeys are STOP/PAUSE/SKIP keys in config.py, ASYNC_ORCHESTRATOR = False
+uses the plain loop in main.py instead
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from metrics import AsyncMetricsExporter
+
+
+class Orchestrator:
+    def __init__(self, automation, process, max_questions=float('inf'), hotkeys=None, on_progress=None):
+        """
+        Args:
+            automation: QuizAutomation
+            process: Blocking call for one step of the run (process_question or process_page)
+            max_questions: Stop after this many questions
+            hotkeys: Module with add_hotkey(key, callback), e.g. keyboard (None = no hotkeys)
+            on_progress: on_progress(questions_processed) after each successful step
+        """
+        self.automation = automation
+        self.process = process
+        self.max_questions = max_questions
+        self.hotkeys = hotkeys
+        self.on_progress = on_progress
+        self.processed = 0
+        self.stopped = False
+        self.loop = None
+        self.running = None  # Future of the step in progress
+        self.resumed = None  # Cleared while paused
+        self.debug_writes = set()
+        self.input_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='quiz-input')
+        self.debug_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='debug-writes')
+
+    # Hotkey actions (run on the loop)
+    def stop(self):
+        if self.stopped:
+            return
+        self.stopped = True
+        self.automation.log("Stop requested - finishing at the next checkpoint")
+        if self.running:
+            self.automation.cancel("stopped by user", user_action='stop')
+        self.resumed.set()  # Wake a paused run so it can end
+
+    def toggle_pause(self):
+        if self.resumed.is_set():
+            self.resumed.clear()
+            self.automation.log(f"Paused - the current question finishes first "
+                                f"(press {config.PAUSE_KEY.upper()} to resume)")
+        else:
+            self.resumed.set()
+            self.automation.log("Resumed")
+
+    def skip(self):
+        if self.running:
+            self.automation.cancel("skipped by user", user_action='skip')
+
+    def _threadsafe(self, action):
+        return lambda: self.loop.call_soon_threadsafe(action)
+
+    # Debug writes
+    def submit_debug_write(self, write):
+        """QuizAutomation.debug_writer: queue a debug write (called from the input thread)"""
+        self.loop.call_soon_threadsafe(self._start_debug_write, write)
+
+    def _start_debug_write(self, write):
+        task = asyncio.ensure_future(self.loop.run_in_executor(self.debug_pool, write))
+        self.debug_writes.add(task)
+        task.add_done_callback(self._debug_write_done)
+
+    def _debug_write_done(self, task):
+        self.debug_writes.discard(task)
+        if not task.cancelled() and task.exception():
+            self.automation.log(f"WARNING: Debug write failed: {task.exception()}")
+
+    # Stages
+    async def step(self):
+        """One question (or page) on the input thread; returns process()'s result"""
+        self.running = self.loop.run_in_executor(self.input_pool, self.process)
+        try:
+            # Shielded: cancelling the run must not orphan the input thread mid-question
+            return await asyncio.shield(self.running)
+        except asyncio.CancelledError:
+            self.automation.cancel("run cancelled", user_action='stop')
+            await asyncio.wait([self.running])
+            raise
+        finally:
+            self.running = None
+
+    async def questions(self):
+        """Run steps until max_questions, a stop, or a failed step"""
+        while self.processed < self.max_questions and not self.stopped:
+            await self.resumed.wait()
+            if self.stopped:
+                break
+            count_before = self.automation.question_count
+            success = await self.step()
+            if not success:
+                return self.stopped  # A stop ends the question with False too
+            self.processed += self.automation.question_count - count_before
+            if self.on_progress and self.processed < self.max_questions:
+                self.on_progress(self.processed)
+        return True
+
+    async def run(self):
+        """
+        Run the automation until done, stopped or a step fails
+        Returns (success, questions processed)
+        """
+        self.loop = asyncio.get_running_loop()
+        self.resumed = asyncio.Event()
+        self.resumed.set()
+        self.automation.debug_writer = self.submit_debug_write
+
+        metrics = None
+        if config.METRICS_ENABLED and self.automation.metrics_exporter is None:
+            metrics = AsyncMetricsExporter(self.automation.metrics, log=self.automation.log)
+            await metrics.start()
+
+        if self.hotkeys:
+            self.hotkeys.add_hotkey(config.EMERGENCY_STOP_KEY, self._threadsafe(self.stop))
+            self.hotkeys.add_hotkey(config.PAUSE_KEY, self._threadsafe(self.toggle_pause))
+            self.hotkeys.add_hotkey(config.SKIP_KEY, self._threadsafe(self.skip))
+
+        try:
+            success = await self.questions()
+        finally:
+            # Let queued debug writes finish before the archive is closed
+            if self.debug_writes:
+                await asyncio.wait(list(self.debug_writes))
+            self.automation.debug_writer = None
+            if metrics:
+                await metrics.close()
+            self.input_pool.shutdown(wait=False)
+            self.debug_pool.shutdown(wait=True)
+        return success, self.processed
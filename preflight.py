@@ -0,0 +1,175 @@
+"""
+Startup Preflight
+Runs while main.py waits for the start key, so question 1 does not pay cold-start costs
+
+- Imports and warms numpy, PIL (PNG/BMP encoders), the answer parser and the backend
+- Loads and converts the send button reference images and state classifier
+- Takes one full-screen grab and checks that every configured region lies on screen,
+  the question area is not blank and the send button looks like a known state
+Each check is reported in milliseconds
+EASY TO MODIFY: Set PREFLIGHT_ENABLED = False in config.py to skip it
+"""
+
+import io
+import time
+
+import config
+from ui_state_classifier import UNKNOWN
+
+
+OK = 'ok'
+WARN = 'warn'
+FAIL = 'FAIL'
+
+
+def _area(area):
+    return (area['x'], area['y'], area['width'], area['height'])
+
+
+def configured_regions(automation):
+    """Every configured region and click point as (name, (x, y, width, height))"""
+    regions = [
+        ('question area', _area(config.QUIZ_QUESTION_AREA)),
+        ('response area', _area(config.GEMINI_RESPONSE_AREA)),
+        ('send button', (config.GEMINI_SEND_BUTTON['x'] - 30, config.GEMINI_SEND_BUTTON['y'] - 30, 60, 60)),
+        ('screen shift region', automation.screen_shift_region),
+    ]
+    if config.QUIZ_PAGE_AREA:
+        regions.append(('page area', _area(config.QUIZ_PAGE_AREA)))
+
+    points = [
+        ('input field', config.GEMINI_INPUT_FIELD),
+        ('new chat button', config.GEMINI_NEW_CHAT_BUTTON),
+        ('next button Q1', config.NEXT_BUTTON_Q1),
+        ('next button Q2+', config.NEXT_BUTTON_Q2),
+    ]
+    for label, options in (('Q1', config.ANSWER_OPTIONS_Q1), ('Q2+', config.ANSWER_OPTIONS_Q2)):
+        points.extend((f"option {option} {label}", point) for option, point in options.items())
+    regions.extend((name, (point['x'], point['y'], 1, 1)) for name, point in points)
+    return regions
+
+
+def _crop(screen, region):
+    x, y, width, height = region
+    return screen.crop((x, y, x + width, y + height))
+
+
+def run_preflight(automation, results=None):
+    """
+    Run every check
+    results: list to fill in as the checks run, so a caller that stops waiting can
+             report them; the check still running is listed as failed
+    Returns a list of (name, status, milliseconds, detail)
+    """
+    results = [] if results is None else results
+    state = {}
+
+    def check(name, function):
+        start_time = time.perf_counter()
+        results.append((name, FAIL, 0.0, "did not finish"))
+        try:
+            status, detail = function()
+        except Exception as e:
+            status, detail = FAIL, str(e)
+        results[-1] = (name, status, (time.perf_counter() - start_time) * 1000, detail)
+
+    def warm_imports():
+        import numpy
+        from PIL import Image
+        # Encoders used for pasting (BMP) and debug output (PNG)
+        image = Image.new('RGB', (8, 8))
+        for image_format in ('BMP', 'PNG'):
+            with io.BytesIO() as output:
+                image.save(output, image_format)
+        numpy.array(image).sum()
+        return OK, f"numpy {numpy.__version__}, PIL"
+
+    def warm_backend():
+        automation.backend.warm_up()
+        return OK, type(automation.backend).__name__
+
+    def warm_parser():
+        parser = automation.answer_parser
+        parser.parse(parser.labels[0])
+        parser.reset()
+        missing = [letter for letter in parser.letters
+                   if letter not in config.ANSWER_OPTIONS_Q1 or letter not in config.ANSWER_OPTIONS_Q2]
+        if missing:
+            return FAIL, (f"no calibrated click point for option {', '.join(missing)} - "
+                          f"recalibrate or lower ANSWER_OPTION_COUNT")
+        return OK, f"{len(parser.labels)} options"
+
+    def load_references():
+        ref_ready, ref_sent = automation.load_reference_images()
+        if ref_ready is None or ref_sent is None:
+            return WARN, "missing - send detection falls back to change detection"
+        state['references'] = (ref_ready, ref_sent)
+        return OK, f"ready {ref_ready.size}, sent {ref_sent.size}"
+
+    def grab_screen():
+        state['screen'] = automation.backend.screenshot()
+        return OK, f"{state['screen'].size[0]}x{state['screen'].size[1]}"
+
+    def check_regions():
+        width, height = state['screen'].size
+        off_screen = [name for name, (x, y, w, h) in configured_regions(automation)
+                      if x < 0 or y < 0 or x + w > width or y + h > height]
+        if off_screen:
+            return FAIL, "off screen: " + ", ".join(off_screen)
+        return OK, f"{len(configured_regions(automation))} regions on screen"
+
+    def check_question_area():
+        import numpy as np
+        crop = np.asarray(_crop(state['screen'], _area(config.QUIZ_QUESTION_AREA)).convert('L'))
+        if crop.std() < 2:
+            return WARN, "looks blank - is the quiz open?"
+        return OK, f"contrast {crop.std():.0f}"
+
+    def load_classifier():
+        classifier = automation.load_state_classifier()
+        if classifier is None:
+            return WARN, "missing - run capture_send_button_refs.py (single reference images are used)"
+        state['classifier'] = classifier
+        return OK, ", ".join(classifier.states)
+
+    def check_send_button():
+        send_button = dict(configured_regions(automation))['send button']
+        if 'classifier' in state:
+            crop = _crop(state['screen'], send_button)
+            button_state, confidence = state['classifier'].classify(crop)
+            if button_state == UNKNOWN:
+                return WARN, "matches no known state - is Gemini open?"
+            return OK, f"looks {button_state} ({confidence:.0%} confidence)"
+        if 'references' not in state:
+            return WARN, "no reference images"
+        crop = _crop(state['screen'], send_button)
+        ref_ready, ref_sent = state['references']
+        matches = {
+            'ready': automation._get_similarity(ref_ready, crop),
+            'sent': automation._get_similarity(ref_sent, crop),
+        }
+        best = max(matches, key=matches.get)
+        if matches[best] > config.SIMILARITY_THRESHOLDS[best]:
+            return OK, f"looks {best} ({matches[best]:.0%})"
+        return WARN, f"matches no known state (best: {best} {matches[best]:.0%}) - is Gemini open?"
+
+    check("imports", warm_imports)
+    check("backend", warm_backend)
+    check("answer parser", warm_parser)
+    check("reference images", load_references)
+    check("state classifier", load_classifier)
+    check("screen grab", grab_screen)
+    if 'screen' in state:
+        check("regions on screen", check_regions)
+        check("question area", check_question_area)
+        check("send button", check_send_button)
+    return results
+
+
+def report_preflight(results, log=print):
+    """Log one line per check; returns True if nothing failed"""
+    total = sum(ms for _, _, ms, _ in results)
+    log(f"Preflight ({total:.0f}ms):")
+    for name, status, ms, detail in results:
+        log(f"  [{status:4s}] {name:18s} {ms:7.1f}ms  {detail}")
+    return all(status != FAIL for _, status, _, _ in results)
@@ -0,0 +1,205 @@
+"""
+Per-Question Profiling
+Profiles individual questions so a slow one leaves more evidence than the text log
+
+Two kinds of profiling:
+- Armed profiling: the next N questions run under cProfile and/or tracemalloc
+  (set PROFILE_MODE in config.py, or press PROFILE_KEY during a run). Writes
+  profiles/q0012.pstats and profiles/q0012_alloc.txt per question
+- Sampling: a background thread samples the automation thread's stack every
+  PROFILE_SAMPLE_INTERVAL seconds. Cheap enough to leave on; writes
+  profiles/q0012_samples.txt for questions slower than PROFILE_SAMPLE_SLOWER_THAN
+
+Inspect a .pstats file with:
+    python -m pstats profiles/q0012.pstats
+EASY TO MODIFY: Adjust PROFILE_* settings in config.py
+"""
+
+import cProfile
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+import config
+
+
+PROFILE_MODES = ('off', 'cprofile', 'tracemalloc', 'both')
+
+
+class StackSampler:
+    """Samples one thread's call stack on a background thread"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.samples = Counter()
+        self._target = None
+        self._active = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def start(self, thread_id):
+        self.samples = Counter()
+        self._target = thread_id
+        self._active.set()
+
+    def stop(self):
+        """Stop sampling and return the collected stacks"""
+        self._active.clear()
+        return self.samples
+
+    def close(self):
+        self._stopped = True
+        self._active.set()
+        self._thread.join(timeout=1)
+
+    def _run(self):
+        while True:
+            self._active.wait()
+            if self._stopped:
+                return
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[';'.join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+
+class QuestionProfiler:
+    def __init__(self, log=print):
+        self.log = log
+        self.folder = config.PROFILE_DIR
+        self.top_n = config.PROFILE_TOP_N
+        self.mode = config.PROFILE_MODE
+        if self.mode not in PROFILE_MODES:
+            raise ValueError(f"PROFILE_MODE must be one of {PROFILE_MODES}, got {self.mode!r}")
+        self.remaining = config.PROFILE_QUESTIONS if self.mode != 'off' else 0
+        self._lock = threading.Lock()
+        self._depth = 0  # Nested profile() calls (a timeout retry re-enters process_question)
+
+        self.sampler = None
+        if config.PROFILE_SAMPLING:
+            self.sampler = StackSampler(config.PROFILE_SAMPLE_INTERVAL)
+
+    def arm(self, count=None, mode=None):
+        """Profile the next `count` questions (safe to call from a hotkey thread)"""
+        with self._lock:
+            self.mode = mode or (self.mode if self.mode != 'off' else 'both')
+            self.remaining = count or config.PROFILE_QUESTIONS
+        self.log(f"Profiling armed: next {self.remaining} question(s) with {self.mode}")
+
+    def _take_armed(self):
+        with self._lock:
+            if self.remaining <= 0:
+                return None
+            self.remaining -= 1
+            return self.mode
+
+    @contextmanager
+    def profile(self, question):
+        """
+        Wrap one question; does nothing unless armed or sampling
+        Re-entrant: a nested call (timeout retry of the same question) runs inside the outer profile
+        """
+        if self._depth:
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+            return
+        self._depth = 1
+        try:
+            with self._profile_question(question):
+                yield
+        finally:
+            self._depth = 0
+
+    @contextmanager
+    def _profile_question(self, question):
+        mode = self._take_armed()
+        if mode is None and self.sampler is None:
+            yield
+            return
+
+        os.makedirs(self.folder, exist_ok=True)
+        base = os.path.join(self.folder, f"q{question:04d}")
+        profiler = None
+        started_tracemalloc = False
+        before = None
+
+        if mode in ('tracemalloc', 'both'):
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(config.PROFILE_TRACEMALLOC_FRAMES)
+                started_tracemalloc = True
+            before = tracemalloc.take_snapshot()
+        if mode in ('cprofile', 'both'):
+            profiler = cProfile.Profile()
+        if self.sampler:
+            self.sampler.start(threading.get_ident())
+
+        start_time = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            elapsed = time.perf_counter() - start_time
+
+            if self.sampler:
+                samples = self.sampler.stop()
+                if elapsed >= config.PROFILE_SAMPLE_SLOWER_THAN:
+                    self._write_samples(f"{base}_samples.txt", question, elapsed, samples)
+            if profiler:
+                profiler.dump_stats(f"{base}.pstats")
+                self.log(f"Profile for question #{question} ({elapsed:.1f}s): {base}.pstats")
+            if before is not None:
+                self._write_allocations(f"{base}_alloc.txt", question, before, tracemalloc.take_snapshot())
+                if started_tracemalloc:
+                    tracemalloc.stop()
+
+    def _write_allocations(self, path, question, before, after):
+        """Top allocation growth during the question, by source line"""
+        stats = after.compare_to(before, 'lineno')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"Allocation growth during question #{question} (top {self.top_n})\n\n")
+            for stat in stats[:self.top_n]:
+                f.write(f"{stat}\n")
+        self.log(f"Allocations for question #{question}: {path}")
+
+    def _write_samples(self, path, question, elapsed, samples):
+        """
+        Sampled stacks in collapsed format ("outer;inner;leaf count"),
+        readable as-is and loadable by flame graph tools, plus a leaf summary
+        """
+        total = sum(samples.values())
+        if not total:
+            return
+        leaves = Counter()
+        for stack, count in samples.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"# Question #{question}: {elapsed:.1f}s, {total} samples "
+                    f"every {config.PROFILE_SAMPLE_INTERVAL * 1000:.0f}ms\n")
+            f.write("# Where time was spent (innermost frame):\n")
+            for leaf, count in leaves.most_common(self.top_n):
+                f.write(f"#   {count / total:6.1%}  {leaf}\n")
+            f.write("\n")
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        self.log(f"Stack samples for question #{question} ({elapsed:.1f}s): {path}")
+
+    def close(self):
+        if self.sampler:
+            self.sampler.close()
@@ -4,31 +4,112 @@ Contains all the automation functions for interacting with quiz and Gemini
 Each function is independent and easy to modify
 """
 
-import pyautogui
-import pyperclip
-import time
-import re
-from datetime import datetime
+import io
+import threading
+from collections import deque
 import os
 import config
-
-# Configure PyAutoGUI
-pyautogui.PAUSE = config.PYAUTOGUI_PAUSE
-pyautogui.FAILSAFE = config.PYAUTOGUI_FAILSAFE
+from automation_backend import PyAutoGUIBackend
+from clock import RealClock
+from clipboard_backends import combined_paste_html
+from answer_parser import StreamingAnswerParser, NONE, TENTATIVE
+from answer_providers import SYSTEM_PROMPT, create_answer_provider
+from debug_archive import DebugArchiveWriter
+from frame_sampler import ChangeQueue, FrameSampler, watch_region
+from retention import RetentionManager
+from profiling import QuestionProfiler
+from metrics import MetricsExporter, create_automation_metrics
+from stage_watchdog import StageTimeout, StageWatchdog
+from latency_budget import LatencyBudget
+from ui_state_classifier import ClassifierError, StateClassifier
+from ui_state_machine import build_question_machine
+from checkpoint import encode_image, load_checkpoint, save_checkpoint
+from batch_mode import batch_prompt, build_tile_coordinate_map, compose_batch_image, split_question_tiles
 
 
 class QuizAutomation:
-    def __init__(self):
+    def __init__(self, backend=None, serve_metrics=True, clock=None):
+        """
+        Args:
+            backend: Desktop access: screen grabs, input and clipboard (see automation_backend.py)
+            serve_metrics: Start the threaded metrics exporter (orchestrator.py serves them on its loop instead)
+            clock: Time source for sleeps, timings and log timestamps (see clock.py, default RealClock)
+        """
+        self.backend = backend or PyAutoGUIBackend()
+        self.clock = clock or RealClock()
+        
         self.question_count = 0
+        self.page_count = 0
+        
+        # Live counters and latency histograms (see metrics.py)
+        self.metrics = create_automation_metrics()
+        self.metrics_exporter = None
+        self.current_stage = None  # Stage of the question in progress, see enter_stage
+        self.stage_started = None
+        self.stage_times = {}  # Stage -> seconds for the question in progress (logged for run_report.py)
+        self.stage_thread = None
+        self.stage_lock = threading.Lock()  # Stage changes vs the watchdog's forced cancel
+        self.latency_budget = LatencyBudget()  # Target time per question split into stage budgets
+        
+        # Hang detection: recent log lines for diagnostics, cancellation set by the watchdog
+        self.recent_log = deque(maxlen=config.WATCHDOG_LOG_EVENTS)
+        self.cancel_reason = None
+        self.cancel_stage = None
+        self.timeout_retries = 0
+        self.user_action = None  # 'stop' or 'skip' from a hotkey, handled with the cancellation
+        self.debug_writer = None  # debug_writer(write) runs a debug write elsewhere (see orchestrator.py)
+        
         self.setup_logging()
         
         # Screen shift detection
         self.screen_shift_region = (22, 454, 20, 20)  # x, y, width, height
         self.initial_screen_state = None
         self.screen_has_shifted = False
+        self.page_layout = None  # Question tiles found on the last batch-mode page
+        self.last_question_image = None  # Question area as sent, to see when the page advances
+        self.recent_questions = deque(maxlen=max(config.DUPLICATE_QUESTION_HISTORY, 1))  # Fingerprints
+        self.round_trips_avoided = 0  # Repeated questions skipped instead of answered again
+        self.state_machine_checked = False
+        
+        # Conversation rotation (fresh Gemini chat keeps latency flat)
+        self.conversation_number = 1
+        self.conversation_stats = self._new_conversation_stats()
+        self.rotation_pending = False
+        self.metrics.set('quiz_conversation_number', self.conversation_number)
+        self._reference_images = None  # Loaded once, see load_reference_images
+        self._state_classifier = None  # Loaded once, see load_state_classifier
+        self.combined_paste = True  # Cleared if Gemini drops the text of a combined paste
+        self.combined_paste_checks = 0
+        
+        # Timing statistics (single-question and batch pages are comparable per question)
+        self.timing_stats = {'questions': 0, 'total_time': 0.0, 'min_time': None, 'max_time': None}
+        
+        # Answer parsing (fed response snapshots while polling)
+        self.answer_parser = StreamingAnswerParser()
+        self.parse_fallbacks = 0
+        
+        # Answer source (Gemini chat pane by default, see answer_providers.py)
+        self.answer_provider = create_answer_provider(self)
+        
+        # Per-question cProfile/tracemalloc/stack sampling (see profiling.py)
+        self.profiler = QuestionProfiler(log=self.log)
+        
+        if config.METRICS_ENABLED and serve_metrics:
+            self.metrics_exporter = MetricsExporter(self.metrics, log=self.log)
+        
+        # Per-stage time budgets with diagnostics on hangs (see stage_watchdog.py)
+        self.watchdog = StageWatchdog(self) if config.WATCHDOG_ENABLED else None
+        
+        # Background grabs of the watched regions, started with the run (see frame_sampler.py)
+        self.frame_sampler = None
+        self.frame_changes = None
+        self.changes_seen = None  # Monotonic time waits last looked at the frames
         
     def setup_logging(self):
         """Setup logging and screenshot directory with organized folders"""
+        # Every run appends to the same LOG_FILE: this line is where run_report.py splits them
+        self.log(f"Run started ({type(self.backend).__name__})")
+        
         if config.SAVE_SCREENSHOTS:
             # Create main screenshot directory
             os.makedirs(config.SCREENSHOT_DIR, exist_ok=True)
@@ -46,17 +127,164 @@ class QuizAutomation:
             # Create all subdirectories
             for folder in self.screenshot_folders.values():
                 os.makedirs(folder, exist_ok=True)
+            
+            # Debug frames go to one delta-compressed archive per session (see debug_archive.py)
+            self.debug_archive = None
+            if config.DEBUG_CAPTURE_FORMAT == 'archive':
+                self.debug_archive = DebugArchiveWriter(config.SCREENSHOT_DIR, clock=self.clock)
+                self.log(f"Debug captures archived to {self.debug_archive.path}")
+            
+            # Size caps, ring-buffer mode and dedup for debug output (see retention.py)
+            self.retention = None
+            if config.RETENTION_ENABLED:
+                # The live archive is protected before the scan of earlier files can index it
+                live_archive = [self.debug_archive.path] if self.debug_archive else []
+                self.retention = RetentionManager(config.SCREENSHOT_DIR, self.screenshot_folders, log=self.log,
+                                                  protect=live_archive)
+    
+    def close(self):
+        """Flush and close the debug archive and answer provider"""
+        if config.SAVE_SCREENSHOTS and self.debug_archive:
+            self.debug_archive.close()
+        if config.SAVE_SCREENSHOTS and self.retention:
+            self.retention.close()
+            self.log(self.retention.summary())
+        if self.watchdog:
+            self.watchdog.close()
+        if self.frame_sampler:
+            self.frame_sampler.close()
+            self.log(self.frame_sampler.summary())
+        self.answer_provider.close()
+        self.profiler.close()
+        if self.metrics_exporter:
+            self.metrics_exporter.close()
     
     def log(self, message):
         """Log message to console and file"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = self.clock.now().strftime("%Y-%m-%d %H:%M:%S")
         log_message = f"[{timestamp}] {message}"
         print(log_message)
+        self.recent_log.append(log_message)
         
         if config.DEBUG_MODE:
             with open(config.LOG_FILE, 'a', encoding='utf-8') as f:
                 f.write(log_message + '\n')
     
+    def enter_stage(self, name):
+        """
+        Mark the start of a question stage (capture, upload, send, generate, read, select, next)
+        Ends the previous stage and records its duration
+        """
+        self.check_cancelled()
+        now = self.clock.time()
+        self.end_stage(now)
+        with self.stage_lock:
+            self.current_stage = name
+            self.stage_started = now
+            self.stage_thread = threading.get_ident()
+    
+    def end_stage(self, now=None):
+        """
+        Record the duration of the stage in progress, if any
+        The stage is closed first, so the watchdog cannot raise StageTimeout for it afterwards
+        """
+        with self.stage_lock:
+            stage, self.current_stage = self.current_stage, None
+            try:
+                if self.watchdog:
+                    self.watchdog.disarm()
+            except StageTimeout:
+                pass  # Raised just before the stage closed, when the call into disarm started
+        if stage is None:
+            return
+        elapsed = (now or self.clock.time()) - self.stage_started
+        self.metrics.observe('quiz_stage_seconds', elapsed, stage=stage)
+        self.stage_times[stage] = self.stage_times.get(stage, 0.0) + elapsed
+        overrun = self.latency_budget.finish_stage(stage, elapsed)
+        if overrun:
+            self.metrics.inc('quiz_budget_overruns_total', stage=stage)
+            self.log(f"Stage '{stage}' over budget by {overrun:.1f}s")
+    
+    def stage_over_budget(self):
+        """True while the current stage has used up its latency budget"""
+        if not config.LATENCY_BUDGET_ENABLED or self.current_stage is None:
+            return False
+        return self.latency_budget.over_budget(self.current_stage, self.clock.time() - self.stage_started)
+    
+    def poll_interval(self, interval):
+        """Polling interval to use now - shorter once the stage is over budget"""
+        if self.stage_over_budget():
+            return min(interval, config.BUDGET_FAST_POLL_INTERVAL)
+        return interval
+    
+    def start_frame_sampler(self):
+        """Start grabbing FRAME_SAMPLER_REGIONS in the background (call once the layout is final)"""
+        if not config.FRAME_SAMPLER_ENABLED or self.frame_sampler:
+            return
+        # Grabs bypass a RecordingBackend; grab() records the frames it serves instead
+        self.frame_sampler = FrameSampler(self.backend.sampling_backend(), log=self.log, clock=self.clock)
+        self.frame_changes = self.frame_sampler.subscribe(ChangeQueue(self.clock))
+        self.frame_sampler.start()
+    
+    def grab(self, name, region=None):
+        """
+        Current image of a watched region ('send_button', 'question', 'response')
+        Served from the frame sampler when it has a fresh frame, otherwise grabbed now
+        """
+        if self.frame_sampler and name in self.frame_sampler.regions:
+            image = self.frame_sampler.latest_image(name, max_age=2 * self.frame_sampler.period)
+            if image is not None:
+                self.metrics.inc('quiz_cache_hits_total', cache='frame_sampler')
+                self.backend.record_frame(image, region or watch_region(name))
+                return image
+        return self.backend.screenshot(region=region or watch_region(name))
+    
+    def wait_for_change(self, timeout, *names):
+        """
+        Wait up to `timeout` seconds, returning early when the frame sampler sees
+        one of `names` change (any watched region if none given)
+        Without the sampler this is a plain sleep. Returns the seconds waited
+        """
+        if not self.frame_changes:
+            self.clock.sleep(timeout)
+            return timeout
+        started = self.clock.monotonic()
+        self.frame_changes.wait(timeout, since=self.changes_seen, names=names or None)
+        self.changes_seen = self.clock.monotonic()
+        return self.changes_seen - started
+    
+    def log_clipboard_stats(self):
+        """Log clipboard operation timings (count, average, worst, retries)"""
+        for line in self.backend.clipboard_summary():
+            self.log(line)
+    
+    def log_duplicate_stats(self):
+        """Log how many repeated questions were caught before upload"""
+        if self.round_trips_avoided:
+            self.log(f"Repeated questions caught before upload: {self.round_trips_avoided} "
+                     f"Gemini round-trip(s) avoided")
+    
+    def log_budget_report(self):
+        """Log which stages overran their latency budget and how often"""
+        for line in self.latency_budget.report():
+            self.log(line)
+    
+    def cancel(self, reason, user_action=None):
+        """
+        Ask the running question to stop (called from the watchdog thread or a hotkey)
+        user_action: 'stop' ends the run, 'skip' moves on to the next question (see recover_from_timeout)
+        """
+        if user_action or not self.user_action:
+            self.user_action = user_action  # A watchdog trip never overrides a stop or skip
+        self.cancel_stage = self.current_stage
+        self.cancel_reason = reason
+    
+    def check_cancelled(self):
+        """Raise StageTimeout if the question was cancelled; polling loops call this every tick"""
+        if self.cancel_reason:
+            reason, self.cancel_reason = self.cancel_reason, None
+            raise StageTimeout(reason)
+    
     def save_screenshot(self, name, category=None, region=None, custom_image=None):
         """
         Save screenshot for debugging with organized folders
@@ -68,7 +296,7 @@ class QuizAutomation:
             custom_image: Optional PIL Image to save instead of capturing new screenshot
         """
         if config.SAVE_SCREENSHOTS:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = self.clock.now().strftime("%Y%m%d_%H%M%S")
             
             # Determine folder
             if category and category in self.screenshot_folders:
@@ -81,19 +309,53 @@ class QuizAutomation:
             # Get screenshot
             if custom_image:
                 screenshot = custom_image
-            elif region:
-                screenshot = pyautogui.screenshot(region=region)
             else:
-                screenshot = pyautogui.screenshot()
+                screenshot = self.backend.screenshot(region)
             
+            if self.debug_writer:
+                # Encode and write off the question's thread, in order
+                question = self.question_count
+                self.debug_writer(lambda: self._write_screenshot(screenshot, name, category, filename, question))
+            else:
+                self._write_screenshot(screenshot, name, category, filename, self.question_count)
+    
+    def _write_screenshot(self, screenshot, name, category, filename, question):
+        """Archive or save one debug screenshot (see save_screenshot)"""
+        if self.debug_archive:
+            start_time = self.clock.time()
+            index, size = self.debug_archive.add_frame(screenshot, name, category)
+            if self.retention:
+                self.retention.protect(self.debug_archive.path)  # A new part if the archive rolled over
+            self.log(f"Screenshot archived: frame {index} ({category or 'uncategorized'}/{name}, "
+                     f"{size / 1024:.1f} KB, {(self.clock.time() - start_time) * 1000:.0f}ms)")
+            return
+        
+        if not self.retention:
             screenshot.save(filename)
             self.log(f"Screenshot saved: {filename}")
+            return
+        
+        # Skip frames identical to one already on disk
+        output = io.BytesIO()
+        screenshot.save(output, 'PNG')
+        data = output.getvalue()
+        existing, digest = self.retention.find_duplicate(data, filename)
+        if existing:
+            self.metrics.inc('quiz_cache_hits_total', cache='debug_dedup')
+            self.log(f"Screenshot identical to {existing}, not saved again")
+            return
+        
+        with open(filename, 'wb') as f:
+            f.write(data)
+        self.retention.add(filename, category, question, len(data), digest)
+        self.log(f"Screenshot saved: {filename}")
     
     def capture_question_screenshot(self):
         """
         Capture screenshot of question area instead of copying text
         EASY TO MODIFY: Adjust region in config.py
         """
+        self.enter_stage('capture')
         self.log("Capturing screenshot of question area...")
         
         # Capture the question area
@@ -104,7 +366,8 @@ class QuizAutomation:
             config.QUIZ_QUESTION_AREA['height']
         )
         
-        screenshot = pyautogui.screenshot(region=region)
+        screenshot = self.backend.screenshot(region=region)
+        self.last_question_image = screenshot
         
         # Save screenshot temporarily for pasting
         temp_path = f"{config.SCREENSHOT_DIR}/temp_question.png"
@@ -113,91 +376,138 @@ class QuizAutomation:
         
         self.log(f"Question screenshot saved to {temp_path}")
         
-        # Also save for debugging
-        if config.SAVE_SCREENSHOTS:
-            debug_path = f"{config.SCREENSHOT_DIR}/question_{self.question_count}.png"
-            screenshot.save(debug_path)
-            self.log(f"Debug screenshot: {debug_path}")
-        
-        # Also save to organized folder
+        # Also save to organized folder for debugging
         self.save_screenshot(f"question_{self.question_count}", category='questions', custom_image=screenshot)
         
         return temp_path
     
-    def add_system_prompt_to_input(self):
+    def add_system_prompt_to_input(self, system_prompt=SYSTEM_PROMPT):
         """
         Add system prompt before the image to remind Gemini of instructions
         This prevents Gemini from forgetting the rules
         """
         self.log("Adding system prompt to input...")
         
-        # System prompt text (repeated with each question)
-        system_prompt = (
-            "TASK: Read the question from attached image. "
-            "Answer with ONLY the letter (A, B, C, or D). "
-            "Do NOT explain. Do NOT append to previous answers. "
-            "Only answer the current question:\n\n"
-        )
-        
         # Type the system prompt
-        pyperclip.copy(system_prompt)
-        pyautogui.hotkey('ctrl', 'v')
-        time.sleep(0.3)
+        self.backend.copy_text(system_prompt)
+        self.backend.hotkey('ctrl', 'v')
+        self.clock.sleep(0.3)
 
     
-    def paste_screenshot_to_gemini(self, screenshot_path):
+    def paste_screenshot_to_gemini(self, screenshot_path, prompt=SYSTEM_PROMPT):
         """
-        Paste question screenshot into Gemini input field
+        Paste question screenshot into Gemini input field, wait for the upload and send it
         EASY TO MODIFY: Adjust coordinates in config.py
         """
+        self.paste_question_to_gemini(screenshot_path, prompt)
+        
+        # Wait for image to upload by monitoring send button
+        self.wait_for_send_button_ready()
+        self.send_to_gemini()
+    
+    def paste_question_to_gemini(self, screenshot_path, prompt=SYSTEM_PROMPT):
+        """Paste the prompt and question screenshot into the Gemini input field (starts the upload)"""
+        self.enter_stage('upload')
         self.log("Pasting screenshot to Gemini...")
         
         # Load image to clipboard using PIL
         from PIL import Image
         import io
         
-        # Open the image
-        image = Image.open(screenshot_path)
-        
-        # Convert to clipboard format (Windows)
+        # Convert the image to clipboard format (DIB)
         output = io.BytesIO()
-        image.convert('RGB').save(output, 'BMP')
+        with Image.open(screenshot_path) as image:
+            image.convert('RGB').save(output, 'BMP')
         data = output.getvalue()[14:]  # Remove BMP header
         output.close()
         
-        # Copy image to clipboard (Windows specific)
-        import win32clipboard
-        win32clipboard.OpenClipboard()
-        win32clipboard.EmptyClipboard()
-        win32clipboard.SetClipboardData(win32clipboard.CF_DIB, data)
-        win32clipboard.CloseClipboard()
-        
-        self.log("Image copied to clipboard")
-        
         # Click on Gemini input field
-        pyautogui.click(
+        self.backend.click(
             config.GEMINI_INPUT_FIELD['x'],
             config.GEMINI_INPUT_FIELD['y']
         )
-        time.sleep(config.DELAY_AFTER_CLICK)
+        self.clock.sleep(config.DELAY_AFTER_CLICK)
         
+        if config.COMBINED_PASTE and self.combined_paste:
+            self.paste_combined(screenshot_path, data, prompt)
+        else:
+            self.paste_separately(data, prompt)
+    
+    def paste_separately(self, dib_data, prompt):
+        """Paste the prompt, then the image, each with its own clipboard write"""
         # Add system prompt first (to remind Gemini)
-        self.add_system_prompt_to_input()
+        self.add_system_prompt_to_input(prompt)
         
-        # IMPORTANT: Reload image to clipboard (system prompt overwrote it)
-        win32clipboard.OpenClipboard()
-        win32clipboard.EmptyClipboard()
-        win32clipboard.SetClipboardData(win32clipboard.CF_DIB, data)
-        win32clipboard.CloseClipboard()
-        self.log("Image reloaded to clipboard")
+        # Image goes on the clipboard only after the prompt has been pasted (one image write per question)
+        self.backend.copy_image(dib_data)
+        self.log("Image copied to clipboard")
         
         # Paste the image
-        pyautogui.hotkey('ctrl', 'v')
-        time.sleep(config.DELAY_AFTER_PASTE)
+        self.backend.hotkey('ctrl', 'v')
+        self.clock.sleep(config.DELAY_AFTER_PASTE)
+    
+    def paste_combined(self, screenshot_path, dib_data, prompt):
+        """
+        Paste prompt and image with one clipboard write and one paste
+        The clipboard holds the prompt as text, the image as DIB and both as an HTML fragment.
+        The first COMBINED_PASTE_VERIFY pastes are checked; if the input dropped the prompt,
+        it is pasted separately and combined pastes are turned off for the rest of the run.
+        A clipboard that cannot hold the image next to the text (xclip writes only the HTML
+        fragment) turns them off before pasting, since the inline image may not upload
+        """
+        with open(screenshot_path, 'rb') as f:
+            html = combined_paste_html(prompt, f.read())
+        written = self.backend.copy_formats(text=prompt, dib_data=dib_data, html=html)
+        self.log(f"Prompt and image copied to clipboard ({', '.join(sorted(written))})")
+        
+        if 'image' not in written:
+            self.log("WARNING: Clipboard did not take the image with the prompt - pasting them separately from now on")
+            self.combined_paste = False
+            self.paste_separately(dib_data, prompt)
+            return
+        
+        self.backend.hotkey('ctrl', 'v')
+        self.clock.sleep(config.DELAY_AFTER_PASTE)
+        
+        if not written & {'text', 'html'}:
+            kept_prompt = False  # Backend could only put the image on the clipboard
+        elif self.combined_paste_checks < config.COMBINED_PASTE_VERIFY:
+            self.combined_paste_checks += 1
+            kept_prompt = self._input_has_prompt(prompt)
+        else:
+            return
         
-        # Wait for image to upload by monitoring send button
-        self.wait_for_send_button_ready()
+        if not kept_prompt:
+            self.log("WARNING: Combined paste dropped the prompt text - pasting it separately from now on")
+            self.combined_paste = False
+            self.add_system_prompt_to_input(prompt)
+    
+    def _input_has_prompt(self, prompt):
+        """Copy the Gemini input field's text and check the prompt made it in"""
+        self.backend.hotkey('ctrl', 'a')
+        self.backend.hotkey('ctrl', 'c')
+        self.clock.sleep(0.1)
+        text = self.backend.paste_text() or ''
+        self.backend.hotkey('end')  # Collapse the selection
+        first_line = prompt.strip().splitlines()[0]
+        return first_line[:40] in text
+    
+    def click_send_button(self):
+        """Click the send button, then move the mouse away from it to avoid the hover effect"""
+        self.backend.click(
+            config.GEMINI_SEND_BUTTON['x'],
+            config.GEMINI_SEND_BUTTON['y']
+        )
+        self.clock.sleep(0.3)
         
+        self.backend.move_to(
+            config.GEMINI_SEND_BUTTON['x'] - 100,
+            config.GEMINI_SEND_BUTTON['y']
+        )
+        self.clock.sleep(0.2)
+    
+    def send_to_gemini(self):
+        """Click send until the button shows the message was sent"""
         # Define send button region for verification
         send_region = (
             config.GEMINI_SEND_BUTTON['x'] - 30,
@@ -208,35 +518,41 @@ class QuizAutomation:
         
         # Load reference image for sent state (blue stop square)
         _, ref_sent = self.load_reference_images()
+        classifier = self.load_state_classifier()
         
+        self.enter_stage('send')
         # Keep trying to click send button until sent state is detected
         max_attempts = 100000000
         click_successful = False
         
         for attempt in range(1, max_attempts + 1):
+            self.check_cancelled()
+            if attempt > 1:
+                self.metrics.inc('quiz_send_retries_total')
             # Click the send button
             self.log(f"Clicking send button (attempt {attempt}/{max_attempts})...")
-            pyautogui.click(
-                config.GEMINI_SEND_BUTTON['x'],
-                config.GEMINI_SEND_BUTTON['y']
-            )
-            time.sleep(0.3)
-            
-            # Move mouse away from button to avoid hover effect
-            pyautogui.moveTo(
-                config.GEMINI_SEND_BUTTON['x'] - 100,
-                config.GEMINI_SEND_BUTTON['y']
-            )
-            time.sleep(0.2)
+            self.click_send_button()
             
             # Capture current button state
-            after_screenshot = pyautogui.screenshot(region=send_region)
+            after_screenshot = self.grab('send_button', send_region)
             
-            if ref_sent is not None:
+            if classifier:
+                # Nearest-centroid match against the captured state samples
+                state, confidence = classifier.classify(after_screenshot)
+                
+                if state == 'sent':
+                    self.log(f"  Attempt {attempt}: Message sent successfully! (state: sent, {confidence:.0%})")
+                    click_successful = True
+                    break
+                else:
+                    self.log(f"  Attempt {attempt}: Not sent yet (state: {state}, {confidence:.0%})")
+                    self.log("  Retrying...")
+                    self.wait_for_change(self.poll_interval(0.5), 'send_button')
+            elif ref_sent is not None:
                 # Use reference image matching for sent state
                 similarity = self._get_similarity(ref_sent, after_screenshot)
                 
-                if similarity > 0.85:  # 85% match with sent state (blue stop square)
+                if similarity > config.SIMILARITY_THRESHOLDS['sent']:  # Match with sent state (blue stop square)
                     self.log(f"  Attempt {attempt}: Message sent successfully! (match: {similarity:.2%})")
                     click_successful = True
                     break
@@ -244,22 +560,22 @@ class QuizAutomation:
                     self.log(f"  Attempt {attempt}: Not sent yet (match: {similarity:.2%})")
                     if attempt < max_attempts:
                         self.log(f"  Retrying...")
-                        time.sleep(0.5)
+                        self.wait_for_change(self.poll_interval(0.5), 'send_button')
                     else:
                         self.log(f"WARNING: Send button may not have been clicked after {max_attempts} attempts!")
             else:
                 # Fallback to change detection if no reference image
                 self.log("Using fallback detection (no reference image)")
-                before_screenshot = pyautogui.screenshot(region=send_region)
-                time.sleep(0.5)
-                after_screenshot = pyautogui.screenshot(region=send_region)
+                before_screenshot = self.backend.screenshot(region=send_region)
+                self.clock.sleep(0.5)
+                after_screenshot = self.backend.screenshot(region=send_region)
                 similarity = self._get_similarity(before_screenshot, after_screenshot)
                 
-                if similarity > 0.95:  # Screen didn't change much
+                if similarity > config.SIMILARITY_THRESHOLDS['change']:  # Screen didn't change much
                     self.log(f"  Attempt {attempt}: No change detected (similarity: {similarity:.2%})")
                     if attempt < max_attempts:
                         self.log(f"  Retrying...")
-                        time.sleep(0.5)
+                        self.clock.sleep(self.poll_interval(0.5))
                     else:
                         self.log(f"WARNING: Send button may not have been clicked after {max_attempts} attempts!")
                 else:
@@ -271,24 +587,49 @@ class QuizAutomation:
         self.save_screenshot(f"input_{self.question_count}", category='gemini_input')
     
     def load_reference_images(self):
-        """Load reference images for send button states"""
+        """
+        Load reference images for send button states
+        Loaded once and kept in memory (file handles are closed right away),
+        converted to RGB to match screen grabs
+        """
+        if self._reference_images is not None:
+            self.metrics.inc('quiz_cache_hits_total', cache='reference_images')
+            return self._reference_images
+        
         try:
             from PIL import Image
-            ref_ready = Image.open('reference_images/send_button_ready.png')
-            ref_sent = Image.open('reference_images/send_button_sent.png')
-            return ref_ready, ref_sent
+            with Image.open('reference_images/send_button_ready.png') as image:
+                ref_ready = image.convert('RGB')
+            with Image.open('reference_images/send_button_sent.png') as image:
+                ref_sent = image.convert('RGB')
+            self._reference_images = (ref_ready, ref_sent)
         except Exception as e:
             self.log(f"WARNING: Could not load reference images: {e}")
             self.log("Run capture_send_button_refs.py to create reference images")
-            return None, None
+            self._reference_images = (None, None)
+        return self._reference_images
+    
+    def load_state_classifier(self):
+        """
+        Load the send button state classifier built by capture_send_button_refs.py
+        Returns None if there is none (single reference images are used instead)
+        """
+        if self._state_classifier is None:
+            try:
+                self._state_classifier = StateClassifier.load()
+                self.log(f"Send button state classifier loaded ({', '.join(self._state_classifier.states)})")
+            except ClassifierError as e:
+                self.log(f"{e} - using single reference images")
+                self._state_classifier = False
+        return self._state_classifier or None
     
     def wait_for_send_button_ready(self):
         """
         Wait for send button to become ready after image upload
-        Uses reference image matching to detect when button is ready
+        Uses the state classifier (or the single reference image) to detect when button is ready
         """
         self.log("Waiting for image to upload (monitoring send button)...")
-        time.sleep(1.0)  # Initial delay for upload to start
+        self.clock.sleep(1.0)  # Initial delay for upload to start
         
         max_wait_time = 10  # Maximum 10 seconds
         check_interval = 0.5  # Check every 0.5 seconds
@@ -304,20 +645,39 @@ class QuizAutomation:
         
         # Load reference image for ready state
         ref_ready, _ = self.load_reference_images()
+        classifier = self.load_state_classifier()
         
-        if ref_ready is None:
+        if classifier:
+            # Nearest-centroid match against the captured state samples
+            state = None
+            while elapsed_time < max_wait_time:
+                interval = self.wait_for_change(self.poll_interval(check_interval), 'send_button')
+                elapsed_time += interval
+                self.metrics.inc('quiz_poll_ticks_total', wait='upload')
+                self.check_cancelled()
+                
+                state, confidence = classifier.classify(self.grab('send_button', button_region))
+                
+                if state == 'ready':
+                    self.log(f"Send button ready after {elapsed_time:.1f}s (confidence: {confidence:.0%})")
+                    return
+            self.log(f"Last send button state: {state}")
+        elif ref_ready is None:
             # Fallback to old stability-based method
             self.log("Using fallback detection (no reference image)")
-            prev_screenshot = pyautogui.screenshot(region=button_region)
+            prev_screenshot = self.grab('send_button', button_region)
             stable_count = 0
             
             while elapsed_time < max_wait_time:
-                time.sleep(check_interval)
-                elapsed_time += check_interval
+                interval = self.wait_for_change(self.poll_interval(check_interval), 'send_button')
+                elapsed_time += interval
+                self.metrics.inc('quiz_poll_ticks_total', wait='upload')
+                self.check_cancelled()
                 
-                curr_screenshot = pyautogui.screenshot(region=button_region)
+                curr_screenshot = self.grab('send_button', button_region)
                 
-                if self._images_similar(prev_screenshot, curr_screenshot, threshold=0.98):
+                if self._images_similar(prev_screenshot, curr_screenshot,
+                                        threshold=config.SIMILARITY_THRESHOLDS['stability']):
                     stable_count += 1
                     if stable_count >= 3:
                         self.log(f"Send button ready after {elapsed_time:.1f}s")
@@ -329,16 +689,18 @@ class QuizAutomation:
         else:
             # Use reference image matching
             while elapsed_time < max_wait_time:
-                time.sleep(check_interval)
-                elapsed_time += check_interval
+                interval = self.wait_for_change(self.poll_interval(check_interval), 'send_button')
+                elapsed_time += interval
+                self.metrics.inc('quiz_poll_ticks_total', wait='upload')
+                self.check_cancelled()
                 
                 # Capture current button state
-                curr_screenshot = pyautogui.screenshot(region=button_region)
+                curr_screenshot = self.grab('send_button', button_region)
                 
                 # Compare with reference "ready" image
                 similarity = self._get_similarity(ref_ready, curr_screenshot)
                 
-                if similarity > 0.85:  # 85% match with ready state
+                if similarity > config.SIMILARITY_THRESHOLDS['ready']:  # Match with ready state
                     self.log(f"Send button ready after {elapsed_time:.1f}s (match: {similarity:.2%})")
                     return
         
@@ -349,30 +711,57 @@ class QuizAutomation:
     def wait_for_gemini_processing(self):
         """
         Wait for Gemini to finish processing by polling for valid answer
-        Repeatedly selects text from response area until valid answer (A/B/C/D) is found
+        Each response snapshot is fed to the streaming parser, which commits once
+        the same answer has been seen in ANSWER_STABLE_SNAPSHOTS polls in a row
         """
+        self.enter_stage('generate')
         self.log("Waiting for Gemini response...")
-        time.sleep(2.0)  # Initial delay for processing to start
+        self.clock.sleep(2.0)  # Initial delay for processing to start
         
-        max_attempts = 40  # Maximum 40 attempts (20 seconds at 0.5s intervals)
+        parser = self.answer_parser
+        parser.reset()
+        
+        max_wait_time = 20.0  # Maximum 20 seconds of polling
+        check_interval = 0.5
+        elapsed_time = 0.0
         attempt = 0
         
-        while attempt < max_attempts:
+        while elapsed_time < max_wait_time:
             attempt += 1
-            time.sleep(0.5)
+            # Poll faster once an answer is seen, to confirm it sooner
+            interval = config.ANSWER_CONFIRM_INTERVAL if parser.state == TENTATIVE else check_interval
+            interval = self.poll_interval(interval)
+            self.clock.sleep(interval)
+            elapsed_time += interval
+            self.check_cancelled()
             
             # Try to get response
             response = self._try_get_response()
+            self.metrics.inc('quiz_poll_ticks_total', wait='response')
+            parser.feed(response)
+            if parser.state != NONE and self.current_stage == 'generate':
+                self.enter_stage('read')  # Answer visible, now confirming it
             
-            # Check if we got a valid answer
-            if response and self._is_valid_answer(response):
-                self.log(f"Valid response found after {attempt * 0.5:.1f}s: '{response}'")
+            if parser.committed:
+                self.log(f"Answer {parser.answer} stable after {elapsed_time:.1f}s "
+                         f"({parser.streak} snapshots): '{response}'")
                 return response
-            else:
-                if attempt % 4 == 0:  # Log every 2 seconds
-                    self.log(f"  [{attempt * 0.5:.1f}s] Waiting for valid response... (got: '{response}')")
+            
+            if parser.state == TENTATIVE and self.stage_over_budget():
+                # Early fallback: no time left to wait for the answer to settle
+                self.log(f"Read stage over budget, using tentative answer {parser.answer} "
+                         f"after {elapsed_time:.1f}s")
+                return parser.last_text
+            
+            if attempt % 4 == 0:  # Log every few polls
+                self.log(f"  [{elapsed_time:.1f}s] Waiting for valid response... "
+                         f"(state: {parser.state}, got: '{response}')")
+        
+        if parser.state == TENTATIVE:
+            self.log(f"WARNING: Answer {parser.answer} not stable after {elapsed_time:.1f}s, using it anyway")
+            return parser.last_text
         
-        self.log(f"WARNING: No valid response after {max_attempts * 0.5:.1f}s")
+        self.log(f"WARNING: No valid response after {elapsed_time:.1f}s")
         return None
     
     def _try_get_response(self):
@@ -386,35 +775,23 @@ class QuizAutomation:
             bottom_right_y = config.GEMINI_RESPONSE_AREA['y'] + config.GEMINI_RESPONSE_AREA['height'] - 5
             
             # Click at bottom-right and triple-click to select
-            pyautogui.click(bottom_right_x, bottom_right_y, clicks=3)
-            time.sleep(0.2)
+            self.backend.click(bottom_right_x, bottom_right_y, clicks=3)
+            self.clock.sleep(0.2)
             
             # Copy
-            pyautogui.hotkey('ctrl', 'c')
-            time.sleep(0.2)
+            self.backend.hotkey('ctrl', 'c')
+            self.clock.sleep(0.2)
             
             # Get from clipboard
-            response = pyperclip.paste().strip()
+            response = self.backend.paste_text().strip()
             return response
         except Exception as e:
             self.log(f"Error getting response: {e}")
             return None
     
     def _is_valid_answer(self, response):
-        """Check if response contains a valid answer letter (A, B, C, or D)"""
-        if not response:
-            return False
-        
-        response_upper = response.upper()
-        
-        # Check if it's just the letter
-        if response_upper in ['A', 'B', 'C', 'D']:
-            return True
-        
-        # Check if it contains a valid letter
-        import re
-        match = re.search(r'\b([A-D])\b', response_upper)
-        return match is not None
+        """Check if response contains a valid answer option (e.g. A, B, C, or D)"""
+        return self.answer_parser.extract(response) is not None
     
     def _get_similarity(self, img1, img2):
         """Get similarity percentage between two images"""
@@ -455,7 +832,9 @@ class QuizAutomation:
         Uses polling method - repeatedly tries to copy until valid answer found
         """
         # Wait for response and get it
+        start_time = self.clock.time()
         response = self.wait_for_gemini_processing()
+        self.record_response_latency(self.clock.time() - start_time)
         
         if response:
             self.log(f"Gemini response (length: {len(response)}): '{response}'")
@@ -472,142 +851,253 @@ class QuizAutomation:
         
         return response
     
+    def record_response_latency(self, latency):
+        """
+        Record response latency for the current conversation
+        Flags a rotation when latency drifts above the conversation's baseline
+        """
+        stats = self.conversation_stats
+        stats['count'] += 1
+        stats['total'] += latency
+        stats['min'] = latency if stats['min'] is None else min(stats['min'], latency)
+        stats['max'] = latency if stats['max'] is None else max(stats['max'], latency)
+        if stats['first'] is None:
+            stats['first'] = latency
+        stats['last'] = latency
+        
+        baseline_count = config.ROTATION_BASELINE_QUESTIONS
+        if len(stats['baseline']) < baseline_count:
+            stats['baseline'].append(latency)
+            return
+        if not config.ROTATE_ON_LATENCY_DRIFT or not baseline_count:
+            return  # No baseline to drift from
+        
+        baseline = sum(stats['baseline']) / baseline_count
+        if latency > baseline * config.ROTATE_ON_LATENCY_DRIFT:
+            self.log(f"Response latency drift: {latency:.1f}s vs baseline {baseline:.1f}s "
+                     f"(limit x{config.ROTATE_ON_LATENCY_DRIFT}) - new chat before next question")
+            self.rotation_pending = True
+    
+    def _new_conversation_stats(self):
+        """Running latency statistics for one Gemini conversation (constant size)"""
+        return {'count': 0, 'total': 0.0, 'min': None, 'max': None, 'first': None, 'last': None, 'baseline': []}
+    
+    def log_conversation_stats(self):
+        """Log latency statistics for the current Gemini conversation"""
+        stats = self.conversation_stats
+        if not stats['count']:
+            return
+        
+        average = stats['total'] / stats['count']
+        self.log(f"Conversation #{self.conversation_number} stats: {stats['count']} responses, "
+                 f"avg {average:.1f}s, min {stats['min']:.1f}s, max {stats['max']:.1f}s, "
+                 f"first {stats['first']:.1f}s -> last {stats['last']:.1f}s")
+    
+    def should_rotate_conversation(self):
+        """Check if the next question should start in a fresh Gemini conversation"""
+        answered = self.conversation_stats['count']
+        if answered == 0:
+            return False
+        if self.rotation_pending:
+            return True
+        return bool(config.ROTATE_CONVERSATION_EVERY) and answered >= config.ROTATE_CONVERSATION_EVERY
+    
+    def rotate_conversation(self):
+        """
+        Start a fresh Gemini conversation by clicking the "New chat" control
+        Long threads slow down rendering and responses, and encourage appended answers
+        EASY TO MODIFY: Adjust GEMINI_NEW_CHAT_BUTTON and rotation settings in config.py
+        """
+        self.enter_stage('rotate')
+        reason = "latency drift" if self.rotation_pending else f"{self.conversation_stats['count']} questions"
+        self.log(f"Rotating Gemini conversation ({reason})...")
+        self.log_conversation_stats()
+        
+        response_region = (
+            config.GEMINI_RESPONSE_AREA['x'],
+            config.GEMINI_RESPONSE_AREA['y'],
+            config.GEMINI_RESPONSE_AREA['width'],
+            config.GEMINI_RESPONSE_AREA['height']
+        )
+        previous_response = self.backend.screenshot(region=response_region)
+        
+        self.backend.click(
+            config.GEMINI_NEW_CHAT_BUTTON['x'],
+            config.GEMINI_NEW_CHAT_BUTTON['y']
+        )
+        self.clock.sleep(config.DELAY_AFTER_CLICK)
+        
+        self.wait_for_new_conversation_ready(response_region, previous_response)
+        
+        self.conversation_number += 1
+        self.conversation_stats = self._new_conversation_stats()
+        self.rotation_pending = False
+        self.metrics.set('quiz_conversation_number', self.conversation_number)
+        self.log(f"Started Gemini conversation #{self.conversation_number}")
+    
+    def wait_for_new_conversation_ready(self, response_region, previous_response):
+        """
+        Re-verify the chat pane after starting a new conversation
+        Ready when the old response is gone, the pane is stable and the send button is not busy
+        """
+        check_interval = 0.5
+        elapsed_time = 0.0
+        _, ref_sent = self.load_reference_images()
+        classifier = self.load_state_classifier()
+        
+        prev_screenshot = None
+        while elapsed_time < config.NEW_CHAT_READY_TIMEOUT:
+            elapsed_time += self.wait_for_change(check_interval, 'response', 'send_button')
+            self.check_cancelled()
+            
+            curr_screenshot = self.grab('response', response_region)
+            thresholds = config.SIMILARITY_THRESHOLDS
+            cleared = not self._images_similar(previous_response, curr_screenshot, threshold=thresholds['change'])
+            stable = (prev_screenshot is not None and
+                      self._images_similar(prev_screenshot, curr_screenshot, threshold=thresholds['stability']))
+            prev_screenshot = curr_screenshot
+            
+            if not (cleared and stable):
+                continue
+            
+            if classifier or ref_sent is not None:
+                send_region = (
+                    config.GEMINI_SEND_BUTTON['x'] - 30,
+                    config.GEMINI_SEND_BUTTON['y'] - 30,
+                    60,
+                    60
+                )
+                send_button = self.grab('send_button', send_region)
+                if classifier:
+                    if classifier.classify(send_button)[0] in ('sent', 'uploading'):
+                        continue
+                elif self._get_similarity(ref_sent, send_button) > config.SIMILARITY_THRESHOLDS['sent']:
+                    continue
+            
+            self.log(f"New chat pane ready after {elapsed_time:.1f}s")
+            return True
+        
+        self.log(f"WARNING: New chat pane not verified after {elapsed_time:.1f}s, proceeding anyway")
+        self.save_screenshot(f"new_chat_q{self.question_count}", category='errors')
+        return False
+    
     def parse_answer(self, response):
         """
         Extract answer option from Gemini's response
-        Selects the LAST valid letter to handle cases where Gemini appends answers
-        EASY TO MODIFY: Adjust parsing logic here
+        Selects the LAST valid option to handle cases where Gemini appends answers
+        EASY TO MODIFY: Adjust parsing logic in answer_parser.py
         """
         self.log(f"Parsing answer from: {response}")
         
-        # Clean the response
-        response = response.strip().upper()
-        
-        # Try to extract ALL letters (A, B, C, D) and take the last one
-        if config.EXPECTED_ANSWER_FORMAT == 'letter':
-            # Find all matches of A, B, C, or D
-            matches = re.findall(r'\b([A-D])\b', response)
-            if matches:
-                answer = matches[-1]  # Take the LAST match
-                self.log(f"Extracted answer: {answer} (found {len(matches)} letters, using last)")
-                return answer
-            # If response is just the letter
-            if response in ['A', 'B', 'C', 'D']:
-                self.log(f"Direct answer: {response}")
-                return response
+        answer, method = self.answer_parser.parse(response)
+        
+        if method == 'token':
+            self.log(f"Extracted answer: {answer}")
+        elif method == 'fallback':
+            self.log(f"Fallback extracted: {answer} (no standalone option, using last letter)")
+        else:
+            self.parse_fallbacks += 1
+            self.metrics.inc('quiz_parse_fallbacks_total')
+            self.log(f"WARNING: Could not parse answer! Defaulting to {answer} "
+                     f"({self.parse_fallbacks} defaults this run)")
         
-        elif config.EXPECTED_ANSWER_FORMAT == 'number':
-            # Look for 1, 2, 3, or 4 and take the last one
-            matches = re.findall(r'\b([1-4])\b', response)
-            if matches:
-                number = matches[-1]  # Take the LAST match
-                # Convert to letter
-                answer = chr(64 + int(number))  # 1->A, 2->B, etc.
-                self.log(f"Extracted answer: {number} -> {answer} (found {len(matches)} numbers, using last)")
-                return answer
-        
-        # Fallback: find all valid letters and take the last one
-        valid_letters = [char for char in response if char in ['A', 'B', 'C', 'D']]
-        if valid_letters:
-            answer = valid_letters[-1]  # Take the LAST valid letter
-            self.log(f"Fallback extracted: {answer} (found {len(valid_letters)} letters, using last)")
-            return answer
-        
-        self.log("WARNING: Could not parse answer! Defaulting to A")
-        return 'A'  # Default fallback
+        return answer
+    
+    def get_coordinate_set(self):
+        """
+        Choose Q1 or Q2+ coordinates
+        Uses screen shift status, or config.MANUAL_COORDINATE_SET if auto-detection is off
+        Returns (answer_coords, next_coords, coord_type)
+        """
+        if config.USE_SCREEN_SHIFT_DETECTION:
+            # Auto-detection mode: use screen shift status
+            if not self.screen_has_shifted:
+                return config.ANSWER_OPTIONS_Q1, config.NEXT_BUTTON_Q1, "Q1 (auto-detected)"
+            return config.ANSWER_OPTIONS_Q2, config.NEXT_BUTTON_Q2, "Q2+ (auto-detected)"
+        
+        # Manual mode: use config setting
+        if config.MANUAL_COORDINATE_SET == 'Q1':
+            return config.ANSWER_OPTIONS_Q1, config.NEXT_BUTTON_Q1, "Q1 (manual)"
+        return config.ANSWER_OPTIONS_Q2, config.NEXT_BUTTON_Q2, "Q2+ (manual)"
+    
+    def on_first_screen(self):
+        """True on the quiz's first screen: question 1, or page 1 in batch mode"""
+        if self.page_count:
+            return self.page_count == 1
+        return self.question_count == 1
+    
+    def capture_screen_shift_baseline(self):
+        """
+        On the first screen, capture the screen shift region BEFORE selecting answers
+        (only if auto-detection enabled) so answer selection is not detected as a shift
+        """
+        if config.USE_SCREEN_SHIFT_DETECTION and self.on_first_screen() and self.initial_screen_state is None:
+            self.initial_screen_state = self.backend.screenshot(region=self.screen_shift_region)
+            self.log(f"Captured initial screen state (before selecting answer) at region {self.screen_shift_region}")
     
     def select_answer(self, option):
         """
         Click on the correct answer option
         Uses Q1 coordinates if screen hasn't shifted, Q2+ if it has
         Supports manual override via config.USE_SCREEN_SHIFT_DETECTION
+        Raises ValueError if the option has no calibrated click point, failing the question
         EASY TO MODIFY: Adjust option coordinates in config.py
         """
+        self.enter_stage('select')
         self.log(f"Selecting answer: {option}")
         
-        # For question 1, capture screen state BEFORE selecting answer (only if auto-detection enabled)
-        # This prevents answer selection from being detected as screen shift
-        if config.USE_SCREEN_SHIFT_DETECTION:
-            if self.question_count == 1 and self.initial_screen_state is None:
-                self.initial_screen_state = pyautogui.screenshot(region=self.screen_shift_region)
-                self.log(f"Captured initial screen state (before selecting answer) at region {self.screen_shift_region}")
+        self.capture_screen_shift_baseline()
         
         # Choose coordinate set
-        if config.USE_SCREEN_SHIFT_DETECTION:
-            # Auto-detection mode: use screen shift status
-            if not self.screen_has_shifted:
-                answer_coords = config.ANSWER_OPTIONS_Q1
-                coord_type = "Q1 (auto-detected)"
-            else:
-                answer_coords = config.ANSWER_OPTIONS_Q2
-                coord_type = "Q2+ (auto-detected)"
-        else:
-            # Manual mode: use config setting
-            if config.MANUAL_COORDINATE_SET == 'Q1':
-                answer_coords = config.ANSWER_OPTIONS_Q1
-                coord_type = "Q1 (manual)"
-            else:
-                answer_coords = config.ANSWER_OPTIONS_Q2
-                coord_type = "Q2+ (manual)"
+        answer_coords, _, coord_type = self.get_coordinate_set()
         
         if option not in answer_coords:
-            self.log(f"ERROR: Invalid option {option}")
-            return False
+            raise ValueError(f"No {coord_type} click point for option {option} - recalibrate "
+                             f"for ANSWER_OPTION_COUNT = {config.ANSWER_OPTION_COUNT}")
         
         self.log(f"Using {coord_type} coordinates for question #{self.question_count}")
+        self.backend.mark('answer', question=self.question_count, answer=option)
         
         # Click on the answer option
-        pyautogui.click(
+        self.backend.click(
             answer_coords[option]['x'],
             answer_coords[option]['y']
         )
-        time.sleep(config.DELAY_AFTER_CLICK)
+        self.clock.sleep(config.DELAY_AFTER_CLICK)
         
         self.log(f"Answer {option} selected")
         self.save_screenshot(f"selected_{option}_q{self.question_count}", category='answers')
         
         return True
     
-    def click_next(self):
+    def click_next(self, wait=True):
         """
         Click the next button to move to next question
         Detects screen shift dynamically to use appropriate coordinates
         Supports manual override via config.USE_SCREEN_SHIFT_DETECTION
+        wait=False skips DELAY_BETWEEN_QUESTIONS (the UI state machine waits for the page instead)
         EASY TO MODIFY: Adjust button coordinates in config.py
         """
+        self.enter_stage('next')
         self.log("Clicking next button...")
         
         # Choose coordinate based on mode
-        if config.USE_SCREEN_SHIFT_DETECTION:
-            # Auto-detection mode: use screen shift status
-            if not self.screen_has_shifted:
-                next_coords = config.NEXT_BUTTON_Q1
-                coord_type = "Q1 (auto-detected)"
-            else:
-                next_coords = config.NEXT_BUTTON_Q2
-                coord_type = "Q2+ (auto-detected)"
-        else:
-            # Manual mode: use config setting
-            if config.MANUAL_COORDINATE_SET == 'Q1':
-                next_coords = config.NEXT_BUTTON_Q1
-                coord_type = "Q1 (manual)"
-            else:
-                next_coords = config.NEXT_BUTTON_Q2
-                coord_type = "Q2+ (manual)"
+        _, next_coords, coord_type = self.get_coordinate_set()
         
         self.log(f"Using {coord_type} coordinates for question #{self.question_count}")
         
-        pyautogui.click(
+        self.backend.click(
             next_coords['x'],
             next_coords['y']
         )
-        time.sleep(config.DELAY_BETWEEN_QUESTIONS)
+        if wait:
+            self.clock.sleep(config.DELAY_BETWEEN_QUESTIONS)
         
         self.log("Moved to next question")
         self.save_screenshot(f"after_next_q{self.question_count}", category='questions')
         
-        # After first question, check if screen has shifted (only if auto-detection enabled)
-        if config.USE_SCREEN_SHIFT_DETECTION and self.question_count == 1:
+        # After the first question (or page), check if screen has shifted (only if auto-detection enabled)
+        if config.USE_SCREEN_SHIFT_DETECTION and self.on_first_screen() and self.initial_screen_state is not None:
             self.check_screen_shift()
     
     def check_screen_shift(self):
@@ -618,20 +1108,23 @@ class QuizAutomation:
         Once shifted, stays shifted for all remaining questions
         """
         # Compare current state (after clicking next) with initial state (before clicking next)
-        time.sleep(0.5)  # Wait for screen to settle
-        current_state = pyautogui.screenshot(region=self.screen_shift_region)
+        self.clock.sleep(0.5)  # Wait for screen to settle
+        current_state = self.backend.screenshot(region=self.screen_shift_region)
         similarity = self._get_similarity(self.initial_screen_state, current_state)
         
         # Save both images for debugging
         self.save_screenshot("before_shift_q1", category='screen_shift', custom_image=self.initial_screen_state)
         self.save_screenshot("after_shift_q2", category='screen_shift', custom_image=current_state)
         
-        if similarity < 0.95:  # Screen has changed (shifted)
+        if similarity < config.SIMILARITY_THRESHOLDS['screen_shift']:  # Screen has changed (shifted)
             self.screen_has_shifted = True
             self.log(f"Screen shift DETECTED! (similarity: {similarity:.2%}) - Switching to Q2+ coordinates permanently")
         else:
             # Don't set to False - keep using Q1 coordinates
             self.log(f"No screen shift detected (similarity: {similarity:.2%}) - Continuing with Q1 coordinates")
+        
+        # The Q1 reference is only needed once - release it
+        self.initial_screen_state = None
     
     def process_question(self):
         """
@@ -642,32 +1135,393 @@ class QuizAutomation:
         self.log(f"\n{'='*60}")
         self.log(f"Processing Question #{self.question_count}")
         self.log(f"{'='*60}")
-        
-        try:
-            # Step 1: Capture screenshot of question
-            screenshot_path = self.capture_question_screenshot()
-            
-            # Step 2: Paste screenshot to Gemini
-            self.paste_screenshot_to_gemini(screenshot_path)
-            
-            # Step 3: Wait for and get Gemini's response
-            response = self.get_gemini_response()
-            
-            # Step 4: Parse the answer
-            answer = self.parse_answer(response)
-            
-            # Step 5: Select the answer
-            self.select_answer(answer)
+        self.backend.mark('question', question=self.question_count)
+        self.cancel_reason = None
+        self.user_action = None
+        self.latency_budget.start_question()
+        self.stage_times = {}
+        start_time = self.clock.time()
+        
+        with self.profiler.profile(self.question_count):
+            try:
+                # Step 1: Capture screenshot of question
+                screenshot_path = self.capture_question_screenshot()
+                
+                # Same question again means Next did not register - retry it before uploading
+                if self.is_repeated_question(self.last_question_image):
+                    screenshot_path = self.retry_next_for_repeated_question(screenshot_path)
+                
+                if self.use_state_machine():
+                    # Steps 2-6 driven by visual states (see ui_state_machine.py)
+                    self.run_question_machine(screenshot_path)
+                else:
+                    # Step 2-3: Send screenshot to the answer provider and get its response
+                    # (default: paste into Gemini chat pane and poll the response area)
+                    response = self.answer_provider.get_answer(screenshot_path)
+                    
+                    # Step 4: Parse the answer
+                    answer = self.parse_answer(response)
+                    
+                    # Step 5: Select the answer
+                    self.select_answer(answer)
+                    
+                    # Step 6: Click next
+                    self.click_next()
+                
+                self.log(f"Question #{self.question_count} completed successfully")
+                self.end_stage()
+                self.latency_budget.finish_question(self.clock.time() - start_time)
+                self.record_question_time(self.clock.time() - start_time)
+                self.write_checkpoint()
+                self.timeout_retries = 0
+                return True
+                
+            except StageTimeout as e:
+                try:
+                    self.end_stage()  # First: once closed, the watchdog cannot force-cancel the stage
+                except StageTimeout:
+                    pass  # Forced just before it closed
+                if self.user_action:
+                    self.log(f"Question #{self.question_count} cancelled: {e}")
+                else:
+                    self.log(f"ERROR: Question #{self.question_count} cancelled: {e}")
+                    if config.SAVE_SCREENSHOTS and self.retention:
+                        self.retention.mark_error(self.question_count)
+                    self.save_screenshot(f"timeout_q{self.question_count}", category='errors')
+                return self.recover_from_timeout()
+                
+            except Exception as e:
+                try:
+                    self.end_stage()
+                except StageTimeout:
+                    pass  # Forced just before it closed
+                self.metrics.inc('quiz_question_errors_total')
+                self.log(f"ERROR processing question: {str(e)}")
+                if config.SAVE_SCREENSHOTS and self.retention:
+                    self.retention.mark_error(self.question_count)
+                self.save_screenshot(f"error_q{self.question_count}", category='errors')
+                import traceback
+                self.log(f"Traceback: {traceback.format_exc()}")
+                return False
             
-            # Step 6: Click next
+            finally:
+                try:
+                    self.end_stage()
+                except StageTimeout:
+                    pass  # Forced just before it closed
+    
+    def question_fingerprint(self, image):
+        """Small grayscale thumbnail of the question area, compared by is_repeated_question"""
+        import numpy as np
+        return np.asarray(image.convert('L').resize((64, 32)), dtype=np.int16)
+    
+    def is_repeated_question(self, image):
+        """
+        True if `image` matches one of the last DUPLICATE_QUESTION_HISTORY questions
+        Otherwise its fingerprint is remembered for the next questions
+        EASY TO MODIFY: Adjust SIMILARITY_THRESHOLDS['duplicate'] in config.py
+        """
+        if not config.DUPLICATE_QUESTION_HISTORY or image is None:
+            return False
+        import numpy as np
+        fingerprint = self.question_fingerprint(image)
+        for age, previous in enumerate(reversed(self.recent_questions), 1):
+            # Fraction of thumbnail pixels within a few grey levels (tolerates rendering noise)
+            similarity = float(np.mean(np.abs(fingerprint - previous) <= 8))
+            if similarity >= config.SIMILARITY_THRESHOLDS['duplicate']:
+                self.log(f"Question matches the one {age} question(s) back (similarity: {similarity:.3f})")
+                return True
+        self.recent_questions.append(fingerprint)
+        return False
+    
+    def retry_next_for_repeated_question(self, screenshot_path):
+        """
+        Click Next again (same coordinates as the answered question) until a new question shows
+        Returns the screenshot path of the question to answer; after DUPLICATE_NEXT_RETRIES
+        failed clicks the repeated question is answered again
+        """
+        self.metrics.inc('quiz_duplicate_questions_total')
+        for attempt in range(1, config.DUPLICATE_NEXT_RETRIES + 1):
+            self.log(f"WARNING: Page did not advance - retrying Next ({attempt}/{config.DUPLICATE_NEXT_RETRIES})")
             self.click_next()
-            
-            self.log(f"Question #{self.question_count} completed successfully")
+            screenshot_path = self.capture_question_screenshot()
+            if not self.is_repeated_question(self.last_question_image):
+                self.round_trips_avoided += 1
+                self.log(f"Page advanced after retrying Next - {self.round_trips_avoided} "
+                         f"Gemini round-trip(s) avoided this run")
+                return screenshot_path
+        self.log("WARNING: Still on the same question - answering it again")
+        return screenshot_path
+    
+    def use_state_machine(self):
+        """
+        True if GUI questions are driven by the UI state machine
+        Needs config.UI_STATE_MACHINE, the Gemini GUI provider and the send button state classifier
+        """
+        if not config.UI_STATE_MACHINE or self.answer_provider.name != 'gui':
+            return False
+        available = self.load_state_classifier() is not None
+        if not available and not self.state_machine_checked:
+            self.log("UI state machine needs the send button state classifier - using the linear flow")
+        self.state_machine_checked = True
+        return available
+    
+    def run_question_machine(self, screenshot_path, prompt=SYSTEM_PROMPT):
+        """
+        Paste, send, read, select and advance through the UI state machine
+        Logs and records how long each visual state lasted
+        """
+        # Start a fresh Gemini conversation if this one has grown too long
+        if self.should_rotate_conversation():
+            self.rotate_conversation()
+        
+        machine, context = build_question_machine(self, screenshot_path, prompt, self.wait_for_change, self.clock.time)
+        dwell = machine.run('upload_pending', context)
+        
+        for state, seconds in dwell:
+            self.metrics.observe('quiz_ui_state_seconds', seconds, state=state)
+        self.log(f"UI states ({machine.ticks} ticks): " +
+                 ", ".join(f"{state} {seconds:.1f}s" for state, seconds in dwell))
+        return context['answer']
+    
+    def recover_from_timeout(self, page=False):
+        """
+        Apply config.WATCHDOG_ACTION after a cancelled question (or batch mode page)
+        'retry' runs the question again, 'new_chat' retries in a fresh Gemini conversation,
+        'cancel' stops the run. Stages after the answer was clicked are never retried
+        Returns the result of the retry, or False to stop
+        """
+        stage = self.cancel_stage
+        action, self.user_action = self.user_action, None
+        item = f"page #{self.page_count}" if page else f"question #{self.question_count}"
+        if action == 'stop':
+            return False
+        if action == 'skip':
+            self.log(f"Skipped {item}")
+            if stage != 'next':
+                self.click_next()
             return True
+        
+        retryable = config.WATCHDOG_ACTION in ('retry', 'new_chat') and stage not in ('select', 'next')
+        if not retryable or self.timeout_retries >= config.WATCHDOG_MAX_RETRIES:
+            self.timeout_retries = 0
+            return False
+        
+        self.timeout_retries += 1
+        self.log(f"WATCHDOG: retrying {item} "
+                 f"(attempt {self.timeout_retries}/{config.WATCHDOG_MAX_RETRIES})")
+        if config.WATCHDOG_ACTION == 'new_chat':
+            self.rotation_pending = True
+        if page:
+            self.page_count -= 1
+            return self.process_page()
+        self.question_count -= 1
+        return self.process_question()
+    
+    def record_question_time(self, elapsed, questions=1):
+        """Record time spent on completed questions and log the running throughput"""
+        per_question = elapsed / questions
+        self.metrics.inc('quiz_questions_total', questions)
+        for _ in range(questions):
+            self.metrics.observe('quiz_question_seconds', per_question)
+        stats = self.timing_stats
+        stats['questions'] += questions
+        stats['total_time'] += elapsed
+        stats['min_time'] = per_question if stats['min_time'] is None else min(stats['min_time'], per_question)
+        stats['max_time'] = per_question if stats['max_time'] is None else max(stats['max_time'], per_question)
+        
+        average = stats['total_time'] / stats['questions']
+        if self.stage_times:
+            self.log("Stage times: " + ", ".join(f"{stage} {seconds:.2f}s"
+                                                 for stage, seconds in self.stage_times.items()))
+        self.log(f"Took {elapsed:.1f}s for {questions} question(s) ({per_question:.1f}s each) - "
+                 f"run average {average:.1f}s per question, {60 / average:.1f} questions/min")
+    
+    def process_page(self):
+        """
+        Process every question on a multi-question page in one round-trip (batch mode)
+        Captures the whole quiz pane once, splits it into question tiles, sends them
+        in a single prompt and clicks all answers before clicking next
+        Returns True if successful, False if should stop
+        """
+        self.page_count += 1
+        self.log(f"\n{'='*60}")
+        self.log(f"Processing Page #{self.page_count} (batch mode)")
+        self.log(f"{'='*60}")
+        self.cancel_reason = None
+        self.user_action = None
+        self.latency_budget.start_question()
+        self.stage_times = {}
+        start_time = self.clock.time()
+        
+        with self.profiler.profile(self.question_count + 1):
+            self.answer_parser.expected_answers = 1
+            try:
+                # Step 1: Capture the whole quiz pane and split it into question tiles
+                self.enter_stage('capture')
+                page_area = config.QUIZ_PAGE_AREA or config.QUIZ_QUESTION_AREA
+                page_region = (page_area['x'], page_area['y'], page_area['width'], page_area['height'])
+                page = self.backend.screenshot(region=page_region)
+                
+                tiles = split_question_tiles(page)
+                if not tiles:
+                    self.log("ERROR: No questions found on page")
+                    self.save_screenshot(f"page_{self.page_count}", category='errors', custom_image=page)
+                    return False
+                self.log(f"Found {len(tiles)} question(s) on page: rows {tiles}")
+                self.page_layout = tiles
+                self.latency_budget.start_question(len(tiles))  # Budget the stages for every question on the page
+                
+                batch_image = compose_batch_image(page, tiles)
+                batch_path = f"{config.SCREENSHOT_DIR}/temp_batch.png"
+                os.makedirs(config.SCREENSHOT_DIR, exist_ok=True)
+                batch_image.save(batch_path)
+                self.save_screenshot(f"page_{self.page_count}", category='questions', custom_image=batch_image)
+                
+                # Step 2-3: One round-trip for all questions on the page
+                self.answer_parser.expected_answers = len(tiles)
+                response = self.answer_provider.get_answer(batch_path, batch_prompt(len(tiles)))
+                
+                # Step 4: Parse the ordered answers
+                answers = self.parse_batch_answers(response, len(tiles))
+                
+                # Step 5: Select every answer using the per-tile coordinate map
+                self.enter_stage('select')
+                self.capture_screen_shift_baseline()
+                answer_coords, _, coord_type = self.get_coordinate_set()
+                coordinate_map = build_tile_coordinate_map(
+                    page, page_region, tiles, answer_coords, config.QUIZ_QUESTION_AREA
+                )
+                self.log(f"Using {coord_type} option x-positions for {len(tiles)} tiles")
+                # Check every answer before clicking any, so a page is never half answered
+                for answer in answers:
+                    if answer not in answer_coords:
+                        raise ValueError(f"No {coord_type} click point for option {answer} - recalibrate "
+                                         f"for ANSWER_OPTION_COUNT = {config.ANSWER_OPTION_COUNT}")
+                
+                for answer, tile_coords in zip(answers, coordinate_map):
+                    self.question_count += 1
+                    self.log(f"Question #{self.question_count}: selecting {answer} at {tile_coords[answer]}")
+                    self.backend.mark('answer', question=self.question_count, answer=answer)
+                    self.backend.click(tile_coords[answer]['x'], tile_coords[answer]['y'])
+                    self.clock.sleep(config.DELAY_AFTER_CLICK)
+                self.save_screenshot(f"selected_page{self.page_count}", category='answers')
+                
+                # Step 6: Click next
+                self.click_next()
+                
+                self.log(f"Page #{self.page_count} completed successfully")
+                self.end_stage()
+                self.latency_budget.finish_question(self.clock.time() - start_time, len(tiles))
+                self.record_question_time(self.clock.time() - start_time, len(tiles))
+                self.write_checkpoint()
+                self.timeout_retries = 0
+                return True
+                
+            except StageTimeout as e:
+                try:
+                    self.end_stage()  # First: once closed, the watchdog cannot force-cancel the stage
+                except StageTimeout:
+                    pass  # Forced just before it closed
+                if self.user_action:
+                    self.log(f"Page #{self.page_count} cancelled: {e}")
+                else:
+                    self.log(f"ERROR: Page #{self.page_count} cancelled: {e}")
+                    if config.SAVE_SCREENSHOTS and self.retention:
+                        self.retention.mark_error(self.question_count)
+                    self.save_screenshot(f"timeout_page{self.page_count}", category='errors')
+                self.answer_parser.expected_answers = 1
+                return self.recover_from_timeout(page=True)
+                
+            except Exception as e:
+                try:
+                    self.end_stage()
+                except StageTimeout:
+                    pass  # Forced just before it closed
+                self.metrics.inc('quiz_question_errors_total')
+                self.log(f"ERROR processing page: {str(e)}")
+                if config.SAVE_SCREENSHOTS and self.retention:
+                    self.retention.mark_error(self.question_count)
+                self.save_screenshot(f"error_page{self.page_count}", category='errors')
+                import traceback
+                self.log(f"Traceback: {traceback.format_exc()}")
+                return False
             
-        except Exception as e:
-            self.log(f"ERROR processing question: {str(e)}")
-            self.save_screenshot(f"error_q{self.question_count}", category='errors')
-            import traceback
-            self.log(f"Traceback: {traceback.format_exc()}")
+            finally:
+                self.answer_parser.expected_answers = 1
+                try:
+                    self.end_stage()
+                except StageTimeout:
+                    pass  # Forced just before it closed
+    
+    def parse_batch_answers(self, response, count):
+        """Extract the ordered answers for a page from Gemini's response"""
+        self.log(f"Parsing {count} answers from: {response}")
+        
+        answers = []
+        for number, (answer, method) in enumerate(self.answer_parser.parse_batch(response, count), start=1):
+            if method == 'default':
+                self.parse_fallbacks += 1
+                self.metrics.inc('quiz_parse_fallbacks_total')
+                self.log(f"WARNING: No answer for question {number} on page! Defaulting to {answer}")
+            answers.append(answer)
+        
+        self.log(f"Extracted answers: {', '.join(answers)}")
+        return answers
+    
+    def get_checkpoint_state(self):
+        """Collect the run state needed to resume after a crash or stop"""
+        return {
+            'saved_at': self.clock.now().isoformat(timespec='seconds'),
+            'question_count': self.question_count,
+            'page_count': self.page_count,
+            'screen_has_shifted': self.screen_has_shifted,
+            'initial_screen_state': encode_image(self.initial_screen_state),
+            'page_layout': self.page_layout,
+            'conversation_number': self.conversation_number,
+            'conversation_stats': self.conversation_stats,
+            'timing_stats': self.timing_stats,
+            'parse_fallbacks': self.parse_fallbacks,
+        }
+    
+    def write_checkpoint(self):
+        """Save a checkpoint after a completed question (written atomically)"""
+        if not config.SAVE_CHECKPOINTS:
+            return
+        start_time = self.clock.time()
+        try:
+            save_checkpoint(config.CHECKPOINT_FILE, self.get_checkpoint_state())
+        except OSError as e:
+            self.log(f"WARNING: Could not save checkpoint: {e}")
+            return
+        self.log(f"Checkpoint saved after question #{self.question_count} "
+                 f"({(self.clock.time() - start_time) * 1000:.1f}ms)")
+    
+    def resume_from_checkpoint(self, path=None):
+        """
+        Restore run state from the last checkpoint
+        Continues from the next question without redoing Q1 shift detection
+        Returns True if a checkpoint was restored
+        """
+        path = path or config.CHECKPOINT_FILE
+        start_time = self.clock.time()
+        state = load_checkpoint(path, log=self.log)
+        if state is None:
+            self.log(f"No usable checkpoint found at {path}")
             return False
+        
+        self.question_count = state['question_count']
+        self.page_count = state['page_count']
+        self.screen_has_shifted = state['screen_has_shifted']
+        self.initial_screen_state = state['initial_screen_state']  # Decoded by load_checkpoint
+        self.page_layout = state['page_layout']
+        self.conversation_number = state['conversation_number']
+        self.metrics.set('quiz_conversation_number', self.conversation_number)
+        self.conversation_stats = state['conversation_stats']
+        self.timing_stats = state['timing_stats']
+        self.parse_fallbacks = state['parse_fallbacks']
+        
+        self.log(f"Resumed from checkpoint saved {state['saved_at']} in "
+                 f"{(self.clock.time() - start_time) * 1000:.1f}ms: {self.question_count} questions done, "
+                 f"screen shifted: {self.screen_has_shifted} - continuing with question #{self.question_count + 1}")
+        return True
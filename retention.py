@@ -0,0 +1,221 @@
+"""
+Retention Manager for debug_screenshots
+Keeps debug output within a byte budget per category, optionally keeps only
+the last N questions (ring-buffer mode) plus anything around an error, and
+skips frames identical to one already on disk
+
+Dedup and ring-buffer mode work on individual PNG files (DEBUG_CAPTURE_FORMAT
+= 'png'). In archive mode frames cannot be removed from a session archive, so
+only the 'archives' byte budget applies (whole archives from earlier runs)
+
+All bookkeeping and deleting happens on a background thread. Files from
+earlier runs are picked up by a slow incremental scan, not a startup walk
+EASY TO MODIFY: Adjust RETENTION_* settings in config.py
+"""
+
+import hashlib
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+import config
+
+
+SCAN_BATCH_SIZE = 200    # Directory entries indexed per scan step
+SCAN_PAUSE = 0.05        # Seconds between scan steps
+
+
+class RetentionManager:
+    def __init__(self, root, category_folders, log=print, protect=()):
+        """
+        Args:
+            root: Screenshot directory (session archives live here)
+            category_folders: Category name -> folder
+            log: Logging function
+            protect: Paths never pruned, protected before the background scan starts
+        """
+        self.root = root
+        self.category_folders = dict(category_folders)
+        self.log = log
+        self.budgets = {category: mb * 1024 * 1024 for category, mb in config.RETENTION_BUDGET_MB.items()}
+        self.keep_last = config.RETENTION_KEEP_LAST_QUESTIONS
+        self.error_window = config.RETENTION_ERROR_WINDOW
+
+        # category -> OrderedDict(path -> (size, question)), oldest first
+        self.files = {}
+        self.totals = {}
+        self.hashes = {}          # content hash -> path
+        self.path_hashes = {}     # path -> content hash
+        self.protected = {os.path.abspath(path) for path in protect}  # Never pruned (e.g. the live archive)
+        self.error_questions = set()
+        self.latest_question = 0
+        self.deleted_files = 0
+        self.deleted_bytes = 0
+        self.duplicates_skipped = 0
+
+        self._lock = threading.Lock()
+        self._events = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='retention', daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Called from the automation thread
+    # ------------------------------------------------------------------
+
+    def find_duplicate(self, data, path):
+        """
+        Check if identical bytes are already stored
+        If not, `path` (where the data is about to be written) is registered for them at once,
+        so an identical frame written right after is caught before add() is processed
+        Returns (existing path or None, content hash)
+        """
+        digest = hashlib.sha1(data).hexdigest()
+        with self._lock:
+            existing = self.hashes.get(digest)
+            if not existing:
+                self.hashes[digest] = os.path.abspath(path)
+        if existing:
+            self.duplicates_skipped += 1
+        return existing, digest
+
+    def add(self, path, category, question, size, digest=None):
+        """Register a file that was just written"""
+        self._events.put(('add', path, category or 'uncategorized', question, size, digest))
+
+    def protect(self, path):
+        """Never prune this file (e.g. the archive currently being written)"""
+        with self._lock:
+            self.protected.add(os.path.abspath(path))
+
+    def mark_error(self, question):
+        """Keep files around this question in ring-buffer mode"""
+        self._events.put(('error', question))
+
+    def close(self):
+        self._events.put(('stop',))
+        self._thread.join(timeout=5)
+
+    # ------------------------------------------------------------------
+    # Background thread
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        scanner = self._scan_existing()
+        scanning = True
+        while True:
+            try:
+                event = self._events.get(timeout=SCAN_PAUSE if scanning else None)
+            except queue.Empty:
+                # Idle: index the next batch of files from earlier runs
+                scanning = next(scanner, False) is not False
+                if not scanning:
+                    self._prune()
+                continue
+
+            if event[0] == 'stop':
+                return
+            if event[0] == 'add':
+                _, path, category, question, size, digest = event
+                self._index(path, category, question, size, digest)
+                if question:
+                    self.latest_question = max(self.latest_question, question)
+            elif event[0] == 'error':
+                self.error_questions.add(event[1])
+            self._prune()
+
+    def _scan_existing(self):
+        """Generator indexing files from earlier runs, one small batch per step"""
+        folders = [(category, folder) for category, folder in self.category_folders.items()]
+        folders.append(('archives', self.root))
+
+        for category, folder in folders:
+            try:
+                entries = os.scandir(folder)
+            except OSError:
+                continue
+            with entries:
+                batch = 0
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    if category == 'archives' and not entry.name.endswith('.dbgz'):
+                        continue
+                    path = os.path.abspath(entry.path)
+                    with self._lock:
+                        known = path in self.path_hashes or any(path in files for files in self.files.values())
+                    if not known:
+                        self._index(path, category, None, entry.stat().st_size, None, oldest=True)
+                    batch += 1
+                    if batch >= SCAN_BATCH_SIZE:
+                        batch = 0
+                        yield True
+        self.log(f"Retention: indexed existing debug files "
+                 f"({sum(len(files) for files in self.files.values())} files, "
+                 f"{sum(self.totals.values()) / 1024 / 1024:.1f} MB)")
+
+    def _index(self, path, category, question, size, digest, oldest=False):
+        path = os.path.abspath(path)
+        with self._lock:
+            files = self.files.setdefault(category, OrderedDict())
+            if path in files:
+                return
+            files[path] = (size, question)
+            if oldest:
+                files.move_to_end(path, last=False)
+            self.totals[category] = self.totals.get(category, 0) + size
+            if digest:
+                self.hashes[digest] = path
+                self.path_hashes[path] = digest
+
+    def _near_error(self, question):
+        return any(abs(question - error) <= self.error_window for error in self.error_questions)
+
+    def _prune(self):
+        """Apply ring-buffer mode, then per-category byte budgets"""
+        with self._lock:
+            if self.keep_last:
+                oldest_kept = self.latest_question - self.keep_last + 1
+                for category, files in self.files.items():
+                    for path, (size, question) in list(files.items()):
+                        if question and question < oldest_kept and not self._near_error(question):
+                            self._delete(category, path)
+
+            for category, files in self.files.items():
+                budget = self.budgets.get(category, self.budgets.get('default'))
+                if budget is None:
+                    continue
+                # Oldest first; files around errors only go if nothing else is left
+                for keep_errors in (True, False):
+                    for path, (size, question) in list(files.items()):
+                        if self.totals[category] <= budget:
+                            break
+                        if keep_errors and question and self._near_error(question):
+                            continue
+                        self._delete(category, path)
+
+    def _delete(self, category, path):
+        """Remove a file from disk and the index (caller holds the lock)"""
+        if path in self.protected:
+            return
+        size, _ = self.files[category].pop(path)
+        self.totals[category] -= size
+        digest = self.path_hashes.pop(path, None)
+        if digest and self.hashes.get(digest) == path:
+            del self.hashes[digest]
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.log(f"Retention: could not delete {path}: {e}")
+            return
+        self.deleted_files += 1
+        self.deleted_bytes += size
+
+    def summary(self):
+        """One-line summary for the end-of-run log"""
+        return (f"Retention: {sum(len(files) for files in self.files.values())} files kept "
+                f"({sum(self.totals.values()) / 1024 / 1024:.1f} MB), "
+                f"{self.deleted_files} pruned ({self.deleted_bytes / 1024 / 1024:.1f} MB), "
+                f"{self.duplicates_skipped} duplicates skipped")
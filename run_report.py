@@ -0,0 +1,354 @@
+"""
+Run Report
+Where the time went in one or more runs, from quiz_automation.log and
+session recordings (.qrec, see session_replay.py)
+
+Logs are read line by line and recordings record by record, so files of
+hundreds of megabytes are never loaded whole; only a few numbers per
+question are kept. A log holding several runs is split at each
+"Run started" line (logs from before that line was added are split where
+question or page #1 starts). For every run the report shows questions per
+minute, question and per-stage latency percentiles, UI state dwell times,
+retries, and timeout and fallback rates. With several runs each is a column, and
+the last one is compared with the one before it
+
+Usage:
+    python run_report.py                                   # Runs in quiz_automation.log
+    python run_report.py old.log quiz_automation.log       # Runs from several logs
+    python run_report.py --last 3 --html report.html       # Last 3 runs, also as HTML
+    python run_report.py sessions/session_20250101_120000.qrec
+EASY TO MODIFY: Log lines counted are listed in LINE_COUNTERS
+"""
+
+import argparse
+import html
+import os
+import re
+import sys
+from collections import deque
+from datetime import datetime, timedelta
+
+import config
+
+
+TIMESTAMP = re.compile(r'^\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\] (.*)$')
+TOOK = re.compile(r'Took ([\d.]+)s for (\d+) question\(s\) \(([\d.]+)s each\)')
+DURATIONS = re.compile(r'(\w+) ([\d.]+)s')
+FIRST_QUESTION = re.compile(r'Processing (?:Question|Page) #1\b')
+SEND_CLICK = re.compile(r'Clicking send button \((?:attempt|click) (\d+)')
+
+# Log line fragment -> (group, name) counted once per matching line
+LINE_COUNTERS = {
+    "Clicking send button": None,  # Handled with SEND_CLICK (only clicks after the first are retries)
+    "retrying Next": ('retries', 'next'),
+    "WATCHDOG: retrying question": ('retries', 'watchdog'),
+    "Pooled connection dropped": ('retries', 'http reconnect'),
+    "timed out after": ('timeouts', 'ui state'),
+    "Send button timeout": ('timeouts', 'upload wait'),
+    "New chat pane not verified": ('timeouts', 'new chat'),
+    "No valid response after": ('timeouts', 'response'),
+    "WATCHDOG: stage '": ('timeouts', 'watchdog'),
+    "Defaulting to": ('fallbacks', 'default answer'),
+    "Fallback extracted": ('fallbacks', 'last letter'),
+    "using tentative answer": ('fallbacks', 'tentative answer'),
+    "not stable after": ('fallbacks', 'unstable answer'),
+    "Using fallback detection": ('fallbacks', 'change detection'),
+    "Combined paste dropped": ('fallbacks', 'separate paste'),
+    "completed successfully": ('outcomes', 'completed'),
+    "ERROR processing question": ('outcomes', 'errors'),
+    "cancelled: ": ('outcomes', 'cancelled'),
+}
+
+
+class RunStats:
+    """Numbers collected for one run"""
+
+    def __init__(self, source, start=None):
+        self.source = source
+        self.start = start
+        self.end = None
+        self.questions = 0
+        self.question_times = []
+        self.stage_times = {}  # stage -> [seconds]
+        self.ui_states = {}    # state -> [seconds]
+        self.counts = {'retries': {}, 'timeouts': {}, 'fallbacks': {}, 'outcomes': {}}
+
+    @property
+    def name(self):
+        label = self.start.strftime('%m-%d %H:%M:%S') if self.start else '?'
+        return f"{os.path.basename(self.source)} {label}"
+
+    def count(self, group, name, amount=1):
+        self.counts[group][name] = self.counts[group].get(name, 0) + amount
+
+    def total(self, group):
+        return sum(self.counts[group].values())
+
+    @property
+    def minutes(self):
+        if self.start is None or self.end is None:
+            return 0.0
+        return (self.end - self.start).total_seconds() / 60
+
+    @property
+    def questions_per_minute(self):
+        return self.questions / self.minutes if self.minutes > 0 else None
+
+
+def percentile(values, q):
+    """q-th percentile (0-100) with linear interpolation, None for no values"""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def _parse_time(stamp):
+    return datetime.strptime(stamp, '%Y-%m-%d %H:%M:%S')
+
+
+def read_log(path):
+    """Yield a RunStats per run in a log file, reading it one line at a time"""
+    run = None
+    last_stamp = None
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            match = TIMESTAMP.match(line)
+            if not match:
+                continue  # Traceback or other continuation line
+            stamp, message = match.groups()
+
+            if (run is None or message.startswith("Run started")
+                    or (run.questions and FIRST_QUESTION.match(message))):
+                if run is not None:
+                    run.end = _parse_time(last_stamp)
+                    yield run
+                run = RunStats(path, _parse_time(stamp))
+            last_stamp = stamp
+
+            if message.startswith("Stage times: "):
+                for stage, seconds in DURATIONS.findall(message[len("Stage times: "):]):
+                    run.stage_times.setdefault(stage, []).append(float(seconds))
+                continue
+            if message.startswith("UI states ("):
+                for state, seconds in DURATIONS.findall(message.partition(':')[2]):
+                    run.ui_states.setdefault(state, []).append(float(seconds))
+                continue
+            if message.startswith("Took "):
+                took = TOOK.search(message)
+                if took:
+                    count, each = int(took.group(2)), float(took.group(3))
+                    run.questions += count
+                    run.question_times.extend([each] * count)
+                continue
+
+            for fragment, counter in LINE_COUNTERS.items():
+                if fragment not in message:
+                    continue
+                if counter is None:
+                    click = SEND_CLICK.search(message)
+                    if click and int(click.group(1)) > 1:
+                        run.count('retries', 'send')
+                else:
+                    run.count(*counter)
+                break
+
+    if run is not None:
+        run.end = _parse_time(last_stamp)
+        yield run
+
+
+def read_session(path):
+    """Yield one RunStats for a session recording, reading it one record at a time"""
+    from session_replay import read_session_archive
+    run = RunStats(path)
+    question_start = None
+    last_t = 0.0
+    for meta, _ in read_session_archive(path):
+        if meta.get('kind') == 'session':
+            run.start = datetime.fromisoformat(meta['started'])
+            continue
+        last_t = meta.get('t', last_t)
+        if meta.get('kind') == 'mark' and meta.get('mark') == 'question':
+            if question_start is not None:
+                run.question_times.append(last_t - question_start)
+            question_start = last_t
+        elif meta.get('kind') == 'mark' and meta.get('mark') == 'answer':
+            run.questions += 1
+        elif meta.get('kind') == 'frame':
+            run.count('outcomes', 'frames used')
+        elif meta.get('kind') == 'action':
+            run.count('outcomes', 'input actions')
+    if question_start is not None and run.questions > len(run.question_times):
+        run.question_times.append(last_t - question_start)  # Last question ends with the recording
+    if run.start:
+        run.end = run.start + timedelta(seconds=last_t)
+    yield run
+
+
+def read_runs(paths):
+    for path in paths:
+        if path.endswith('.qrec'):
+            yield from read_session(path)
+        else:
+            yield from read_log(path)
+
+
+def _seconds(value):
+    return '-' if value is None else f"{value:.2f}s"
+
+
+def _rate(count, questions):
+    return '-' if not questions else f"{count} ({count / questions:.0%})"
+
+
+def build_rows(runs):
+    """
+    Report rows as (section, label, [value per run], [number per run], lower_is_better)
+    Numbers (or None) are used for the run-over-run change
+    """
+    rows = []
+
+    def add(section, label, numbers, formatter=_seconds, lower_is_better=True):
+        rows.append((section, label, [formatter(n) if n is not None else '-' for n in numbers],
+                     numbers, lower_is_better))
+
+    add('Throughput', 'questions', [run.questions for run in runs], str, False)
+    add('Throughput', 'questions/min', [run.questions_per_minute for run in runs], lambda n: f"{n:.2f}", False)
+    add('Throughput', 'run length', [run.minutes for run in runs], lambda n: f"{n:.1f} min", False)
+    for q in (50, 95, 99):
+        add('Question time', f'p{q}', [percentile(run.question_times, q) for run in runs])
+
+    stages = list(dict.fromkeys(stage for run in runs for stage in run.stage_times))
+    for stage in stages:
+        for q in (50, 95):
+            add('Stage time', f'{stage} p{q}', [percentile(run.stage_times.get(stage), q) for run in runs])
+
+    states = list(dict.fromkeys(state for run in runs for state in run.ui_states))
+    for state in states:
+        add('UI state', f'{state} p50', [percentile(run.ui_states.get(state), 50) for run in runs])
+
+    for group in ('retries', 'timeouts', 'fallbacks'):
+        names = sorted({name for run in runs for name in run.counts[group]})
+        totals = [run.total(group) for run in runs]
+        rows.append((group.capitalize(), 'total (per question)',
+                     [_rate(total, run.questions) for total, run in zip(totals, runs)], totals, True))
+        for name in names:
+            add(group.capitalize(), name, [run.counts[group].get(name, 0) for run in runs], str)
+
+    for name in sorted({name for run in runs for name in run.counts['outcomes']}):
+        lower = name in ('errors', 'cancelled')
+        add('Outcomes', name, [run.counts['outcomes'].get(name, 0) for run in runs], str, lower)
+    return rows
+
+
+def change(numbers, lower_is_better):
+    """Last run vs the one before: (text, better/worse/None)"""
+    if len(numbers) < 2 or numbers[-1] is None or numbers[-2] is None:
+        return '', None
+    previous, current = numbers[-2], numbers[-1]
+    if previous == current:
+        return '=', None
+    text = f"{(current - previous) / previous:+.0%}" if previous else f"{current - previous:+g}"
+    return text, (current < previous) == lower_is_better
+
+
+def format_text(runs, rows):
+    headers = ['', *[run.name for run in runs]] + (['change'] if len(runs) > 1 else [])
+    table = []
+    section = None
+    for row_section, label, values, numbers, lower_is_better in rows:
+        if row_section != section:
+            section = row_section
+            table.append([f"[{section}]"] + [''] * (len(headers) - 1))
+        line = [f"  {label}", *values]
+        if len(runs) > 1:
+            text, better = change(numbers, lower_is_better)
+            line.append(f"{text} {'better' if better else 'worse' if better is False else ''}".strip())
+        table.append(line)
+    widths = [max(len(str(line[i])) for line in [headers] + table) for i in range(len(headers))]
+    lines = ['  '.join(str(cell).ljust(width) for cell, width in zip(headers, widths)).rstrip(),
+             '  '.join('-' * width for width in widths)]
+    lines += ['  '.join(str(cell).ljust(width) for cell, width in zip(line, widths)).rstrip() for line in table]
+    return '\n'.join(lines)
+
+
+def format_html(runs, rows):
+    """Self-contained HTML page (inline CSS, no scripts or external files)"""
+    escape = html.escape
+    head = ''.join(f"<th>{escape(run.name)}</th>" for run in runs) + ("<th>change</th>" if len(runs) > 1 else '')
+    body = []
+    section = None
+    for row_section, label, values, numbers, lower_is_better in rows:
+        if row_section != section:
+            section = row_section
+            body.append(f'<tr class="section"><td colspan="{len(runs) + 2}">{escape(section)}</td></tr>')
+        finite = [n for n in numbers if isinstance(n, (int, float))]
+        scale = max(finite) if finite else 0
+        cells = []
+        for value, number in zip(values, numbers):
+            bar = ''
+            if scale and isinstance(number, (int, float)) and row_section in ('Question time', 'Stage time', 'UI state'):
+                bar = f'<div class="bar" style="width:{number / scale * 100:.0f}%"></div>'
+            cells.append(f"<td>{bar}<span>{escape(value)}</span></td>")
+        if len(runs) > 1:
+            text, better = change(numbers, lower_is_better)
+            css = 'better' if better else 'worse' if better is False else ''
+            cells.append(f'<td class="{css}">{escape(text)}</td>')
+        body.append(f"<tr><th>{escape(label)}</th>{''.join(cells)}</tr>")
+    generated = datetime.now().strftime('%Y-%m-%d %H:%M')
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Quiz automation run report</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; color: #222; }}
+table {{ border-collapse: collapse; }}
+th, td {{ padding: 3px 12px; text-align: right; border-bottom: 1px solid #eee; position: relative; }}
+th {{ text-align: left; font-weight: normal; }}
+thead th {{ font-weight: bold; text-align: right; }}
+tr.section td {{ text-align: left; font-weight: bold; background: #f4f4f4; }}
+td span {{ position: relative; }}
+.bar {{ position: absolute; left: 0; top: 2px; bottom: 2px; background: #d6e4f7; }}
+.better {{ color: #1a7f37; }} .worse {{ color: #c62828; }}
+</style></head><body>
+<h1>Quiz automation run report</h1>
+<p>{len(runs)} run(s), generated {generated}</p>
+<table><thead><tr><th></th>{head}</tr></thead><tbody>
+{chr(10).join(body)}
+</tbody></table></body></html>
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report latency, retries and fallbacks per run")
+    parser.add_argument('paths', nargs='*', default=[config.LOG_FILE],
+                        help=f"log files and .qrec recordings (default: {config.LOG_FILE})")
+    parser.add_argument('--last', type=int, help="only the last N runs")
+    parser.add_argument('--html', help="also write a self-contained HTML report to this file")
+    args = parser.parse_args()
+
+    missing = [path for path in args.paths if not os.path.exists(path)]
+    if missing:
+        print(f"ERROR: Not found: {', '.join(missing)}")
+        return 1
+
+    # Runs without a finished question (e.g. started and stopped at once) are left out
+    runs = deque((run for run in read_runs(args.paths) if run.questions), maxlen=args.last)
+    runs = list(runs)
+    if not runs:
+        print("No completed questions found")
+        return 1
+
+    rows = build_rows(runs)
+    print(format_text(runs, rows))
+    if args.html:
+        with open(args.html, 'w', encoding='utf-8') as f:
+            f.write(format_html(runs, rows))
+        print(f"\nHTML report written to {args.html}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""
+Session Record and Replay
+Records every frame grab, input action and clipboard read of a run into one
+compact archive, and replays it against QuizAutomation offline
+
+Usage:
+    python main.py --record                          # Record a real run to sessions/
+    python session_replay.py info ARCHIVE            # Show what an archive contains
+    python session_replay.py replay ARCHIVE          # Re-run the session offline
+    python session_replay.py replay ARCHIVE --timed  # Serve frames by recorded timestamps
+
+Archive format: gzip stream of records, each
+    <meta length: uint32><payload length: uint32><meta JSON><payload bytes>
+Frame payloads are raw pixels (mode and size in the meta)
+"""
+
+import argparse
+import gzip
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from datetime import datetime
+
+import config
+from automation_backend import AutomationBackend
+
+
+RECORD_HEADER = struct.Struct('<II')
+
+
+class SessionArchiveWriter:
+    """Appends records to a gzip-compressed session archive"""
+
+    def __init__(self, path, compresslevel=1):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self._file = gzip.open(path, 'wb', compresslevel=compresslevel)
+        self._lock = threading.Lock()
+
+    def write(self, meta, payload=b''):
+        meta_data = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+        with self._lock:
+            self._file.write(RECORD_HEADER.pack(len(meta_data), len(payload)))
+            self._file.write(meta_data)
+            self._file.write(payload)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_session_archive(path):
+    """Yield (meta, payload) records from a session archive"""
+    with gzip.open(path, 'rb') as f:
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            meta_length, payload_length = RECORD_HEADER.unpack(header)
+            meta = json.loads(f.read(meta_length).decode('utf-8'))
+            yield meta, f.read(payload_length)
+
+
+def _region_key(region):
+    return None if region is None else list(region)
+
+
+class RecordingBackend(AutomationBackend):
+    """
+    Wraps another backend and records everything it does
+    Timestamps are monotonic seconds since recording started
+    """
+
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.writer = SessionArchiveWriter(path)
+        self.start_time = time.monotonic()
+        self.writer.write({'kind': 'session', 'started': datetime.now().isoformat(timespec='seconds')})
+
+    def _t(self):
+        return round(time.monotonic() - self.start_time, 4)
+
+    def _action(self, action, **data):
+        self.writer.write(dict(kind='action', action=action, t=self._t(), **data))
+
+    def screenshot(self, region=None):
+        image = self.inner.screenshot(region)
+        self.record_frame(image, region)
+        return image
+
+    def record_frame(self, image, region=None):
+        # Frame sampler grabs bypass the recording (see sampling_backend); only the frames
+        # the automation actually used are recorded, so replay serves them in the same order
+        self.writer.write({
+            'kind': 'frame', 't': self._t(), 'region': _region_key(region),
+            'mode': image.mode, 'size': list(image.size),
+        }, image.tobytes())
+
+    def sampling_backend(self):
+        return self.inner.sampling_backend()
+
+    def click(self, x, y, clicks=1):
+        self._action('click', x=x, y=y, clicks=clicks)
+        self.inner.click(x, y, clicks)
+
+    def move_to(self, x, y):
+        self._action('move_to', x=x, y=y)
+        self.inner.move_to(x, y)
+
+    def hotkey(self, *keys):
+        self._action('hotkey', keys=list(keys))
+        self.inner.hotkey(*keys)
+
+    def copy_text(self, text):
+        self._action('copy_text', text=text)
+        self.inner.copy_text(text)
+
+    def paste_text(self):
+        text = self.inner.paste_text()
+        self.writer.write({'kind': 'clipboard', 't': self._t(), 'text': text})
+        return text
+
+    def copy_image(self, dib_data):
+        self._action('copy_image', bytes=len(dib_data))
+        self.inner.copy_image(dib_data)
+
+    def copy_formats(self, text=None, dib_data=None, html=None):
+        written = self.inner.copy_formats(text, dib_data, html)
+        self._action('copy_formats', text=text, bytes=len(dib_data or b''), written=sorted(written))
+        return written
+
+    def mark(self, kind, **data):
+        self.writer.write(dict(kind='mark', mark=kind, t=self._t(), **data))
+
+    def warm_up(self):
+        self.inner.warm_up()
+
+    def get_screen_size(self):
+        return self.inner.get_screen_size()
+
+    def clipboard_summary(self):
+        return self.inner.clipboard_summary()
+
+    def close(self):
+        self.writer.close()
+        self.inner.close()
+
+
+class ReplayBackend(AutomationBackend):
+    """
+    Feeds a recorded session back to QuizAutomation
+    sequential (default): each grab of a region returns that region's next recorded frame,
+                          and each clipboard read the next recorded read - deterministic
+    timed: returns the latest frame recorded at or before the current replay time
+    Input actions are not performed, only collected for comparison
+    """
+
+    def __init__(self, path, timed=False):
+        self.timed = timed
+        self.frames = {}        # region key -> [(t, mode, size, pixels)]
+        self.clipboard = []     # [(t, text)]
+        self.recorded_actions = []
+        self.recorded_marks = []
+        self.actions = []
+        self.marks = []
+        self.misses = 0
+        self._frame_index = {}
+        self._clipboard_index = 0
+
+        for meta, payload in read_session_archive(path):
+            kind = meta['kind']
+            if kind == 'frame':
+                key = json.dumps(meta['region'])
+                self.frames.setdefault(key, []).append((meta['t'], meta['mode'], tuple(meta['size']), payload))
+            elif kind == 'clipboard':
+                self.clipboard.append((meta['t'], meta['text']))
+            elif kind == 'action':
+                self.recorded_actions.append(meta)
+            elif kind == 'mark':
+                self.recorded_marks.append(meta)
+
+        self.start_time = time.monotonic()
+
+    def _elapsed(self):
+        return time.monotonic() - self.start_time
+
+    def _pick(self, entries, index_key, index_table):
+        """Pick the next (sequential) or latest-by-time (timed) entry"""
+        if self.timed:
+            elapsed = self._elapsed()
+            chosen = entries[0]
+            for entry in entries:
+                if entry[0] > elapsed:
+                    break
+                chosen = entry
+            return chosen
+        index = index_table.get(index_key, 0)
+        index_table[index_key] = index + 1
+        return entries[min(index, len(entries) - 1)]
+
+    def screenshot(self, region=None):
+        from PIL import Image
+
+        key = json.dumps(_region_key(region))
+        entries = self.frames.get(key)
+        if not entries:
+            # Region never captured in the recording (code under test changed)
+            self.misses += 1
+            size = (region[2], region[3]) if region else max(
+                (entry[2] for frames in self.frames.values() for entry in frames), default=(1, 1))
+            return Image.new('RGB', size)
+
+        _, mode, size, pixels = self._pick(entries, key, self._frame_index)
+        return Image.frombytes(mode, size, pixels)
+
+    def paste_text(self):
+        if not self.clipboard:
+            return ''
+        if self.timed:
+            return self._pick(self.clipboard, None, None)[1]
+        index = min(self._clipboard_index, len(self.clipboard) - 1)
+        self._clipboard_index += 1
+        return self.clipboard[index][1]
+
+    def _action(self, action, **data):
+        self.actions.append(dict(action=action, t=round(self._elapsed(), 4), **data))
+
+    def click(self, x, y, clicks=1):
+        self._action('click', x=x, y=y, clicks=clicks)
+
+    def move_to(self, x, y):
+        self._action('move_to', x=x, y=y)
+
+    def hotkey(self, *keys):
+        self._action('hotkey', keys=list(keys))
+
+    def copy_text(self, text):
+        self._action('copy_text', text=text)
+
+    def copy_image(self, dib_data):
+        self._action('copy_image', bytes=len(dib_data))
+
+    def copy_formats(self, text=None, dib_data=None, html=None):
+        self._action('copy_formats', text=text, bytes=len(dib_data or b''))
+        formats = {'text': text, 'image': dib_data, 'html': html}
+        return {name for name, value in formats.items() if value is not None}
+
+    def mark(self, kind, **data):
+        self.marks.append(dict(mark=kind, t=round(self._elapsed(), 4), **data))
+
+
+def _answers(marks):
+    return [(mark['question'], mark['answer']) for mark in marks if mark['mark'] == 'answer']
+
+
+def show_info(path):
+    """Print a summary of a session archive"""
+    replay = ReplayBackend(path)
+    frame_count = sum(len(frames) for frames in replay.frames.values())
+    duration = max([m['t'] for m in replay.recorded_actions + replay.recorded_marks] or [0])
+    print(f"Archive: {path} ({os.path.getsize(path) / 1024:.0f} KB)")
+    print(f"Duration: {duration:.1f}s")
+    print(f"Frames: {frame_count} across {len(replay.frames)} regions")
+    for key, frames in replay.frames.items():
+        print(f"  {key}: {len(frames)} frames")
+    print(f"Clipboard reads: {len(replay.clipboard)}")
+    print(f"Input actions: {len(replay.recorded_actions)}")
+    print(f"Answers: {_answers(replay.recorded_marks)}")
+
+
+def replay_session(path, timed=False):
+    """Re-run a recorded session offline and compare wall time and decisions"""
+    from quiz_automation import QuizAutomation
+
+    backend = ReplayBackend(path, timed=timed)
+    recorded_questions = [m for m in backend.recorded_marks if m['mark'] == 'question']
+    recorded_duration = max([m['t'] for m in backend.recorded_actions + backend.recorded_marks] or [0])
+
+    # The recording only contains the chat-pane path
+    config.ANSWER_PROVIDER = 'gui'
+    config.SAVE_CHECKPOINTS = False
+    automation = QuizAutomation(backend=backend)  # No frame sampler: every grab reads the next recorded frame
+
+    start_time = time.monotonic()
+    for _ in recorded_questions:
+        if not automation.process_question():
+            break
+    replay_duration = time.monotonic() - start_time
+
+    recorded_answers = _answers(backend.recorded_marks)
+    replayed_answers = _answers(backend.marks)
+    differences = [(r, p) for r, p in zip(recorded_answers, replayed_answers) if r != p]
+
+    print("\n" + "=" * 60)
+    print("Replay Summary")
+    print("=" * 60)
+    print(f"Questions:     {len(recorded_questions)}")
+    print(f"Wall time:     recorded {recorded_duration:.1f}s, replayed {replay_duration:.1f}s "
+          f"({replay_duration - recorded_duration:+.1f}s)")
+    print(f"Input actions: recorded {len(backend.recorded_actions)}, replayed {len(backend.actions)}")
+    print(f"Answers:       {len(replayed_answers)} replayed, {len(differences)} different")
+    for recorded, replayed in differences:
+        print(f"  Q{recorded[0]}: recorded {recorded[1]}, replayed {replayed[1]}")
+    if backend.misses:
+        print(f"WARNING: {backend.misses} grabs of regions that were never recorded")
+    print("=" * 60)
+    return not differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or replay a recorded session")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    info_parser = subparsers.add_parser('info', help="summarize an archive")
+    info_parser.add_argument('archive')
+    replay_parser = subparsers.add_parser('replay', help="re-run a session offline")
+    replay_parser.add_argument('archive')
+    replay_parser.add_argument('--timed', action='store_true',
+                               help="serve frames by recorded timestamps instead of in order")
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        show_info(args.archive)
+        return 0
+    return 0 if replay_session(args.archive, timed=args.timed) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Simulated Desktop Backend
+A scripted stand-in for the quiz and Gemini windows, used by the soak test
+and other offline runs. No screen, mouse or clipboard is touched
+
+The simulation reacts to the same actions QuizAutomation performs:
+pasting an image starts an "upload", clicking send starts "generation",
+copying the response area returns the answer once generation is done,
+copying in the input field returns the text pasted into it,
+and clicking next advances to the next question
+Upload and generation last a fixed time on the clock, however often the
+screen is grabbed (the frame sampler grabs in the background)
+"""
+
+import random
+
+import config
+from answer_parser import option_labels
+from automation_backend import AutomationBackend
+from clock import RealClock
+
+
+# Send button colours per state
+SEND_BUTTON_COLORS = {
+    'idle': (200, 200, 200),
+    'uploading': (150, 150, 150),
+    'ready': (30, 30, 30),
+    'sent': (26, 115, 232),
+}
+
+
+def _region(area):
+    return (area['x'], area['y'], area['width'], area['height'])
+
+
+class SimulatedDesktopBackend(AutomationBackend):
+    def __init__(self, upload_seconds=1.0, generate_seconds=2.5, screen_size=(1920, 1080), seed=0,
+                 drops_pasted_text=False, clock=None):
+        """
+        Args:
+            upload_seconds: Time from pasting an image until the upload finishes
+            generate_seconds: Time from clicking send until the answer appears
+            screen_size: Size of full-screen grabs
+            seed: Seed for the simulated answers (drawn from the configured option labels)
+            drops_pasted_text: Keep only the image of a paste holding text and image
+                (like a chat input that ignores the text of a combined clipboard payload)
+            clock: Time source; pass the QuizAutomation clock (see clock.py, default RealClock)
+        """
+        self.upload_seconds = upload_seconds
+        self.generate_seconds = generate_seconds
+        self.clock = clock or RealClock()
+        self.screen_size = screen_size
+        self.random = random.Random(seed)
+        self.options = option_labels(config.EXPECTED_ANSWER_FORMAT, config.ANSWER_OPTION_COUNT)
+
+        self.question = 1
+        self.conversation = 1
+        self.send_state = 'idle'
+        self.upload_done = None    # Time the upload in progress finishes
+        self.answer_ready = None   # Time the generation in progress finishes
+        self.response = ''
+        self.clipboard_text = ''
+        self.clipboard_has_image = False
+        self.drops_pasted_text = drops_pasted_text
+        self.input_text = ''
+        self.focus = None  # 'input' after clicking the Gemini input field
+        self.answers_selected = 0
+
+    # Regions are read from config on each call, so profiles/overrides apply
+    def _send_region(self):
+        return (config.GEMINI_SEND_BUTTON['x'] - 30, config.GEMINI_SEND_BUTTON['y'] - 30, 60, 60)
+
+    def _image(self, size, color):
+        from PIL import Image
+        return Image.new('RGB', size, color)
+
+    def reference_images(self):
+        """Send button references matching the simulated ready and sent states"""
+        return (self._image((60, 60), SEND_BUTTON_COLORS['ready']),
+                self._image((60, 60), SEND_BUTTON_COLORS['sent']))
+
+    def state_samples(self, count=3):
+        """Send button samples per classifier state, with slight colour jitter like real grabs"""
+        states = {'ready': 'ready', 'uploading': 'uploading', 'sent': 'sent', 'disabled': 'idle'}
+        samples = {}
+        for state, simulated in states.items():
+            r, g, b = SEND_BUTTON_COLORS[simulated]
+            samples[state] = [self._image((60, 60), (r + offset, g + offset, b + offset))
+                              for offset in range(-count // 2 + 1, count // 2 + 1)]
+        return samples
+
+    def screenshot(self, region=None):
+        if region is None:
+            return self._image(self.screen_size, (255, 255, 255))
+
+        region = tuple(region)
+        self._advance()
+        if region == self._send_region():
+            return self._image(region[2:], SEND_BUTTON_COLORS[self.send_state])
+
+        if region == _region(config.QUIZ_QUESTION_AREA):
+            # Each question looks different
+            shade = (self.question * 37) % 200
+            return self._image(region[2:], (255, 255 - shade, 255 - (shade // 2)))
+
+        if region == _region(config.GEMINI_RESPONSE_AREA):
+            shade = (self.conversation * 53) % 200 + (20 if self.response else 0)
+            return self._image(region[2:], (shade, shade, shade))
+
+        return self._image(region[2:], (240, 240, 240))
+
+    def click(self, x, y, clicks=1):
+        self._advance()
+        self.focus = 'input' if (x, y) == (config.GEMINI_INPUT_FIELD['x'], config.GEMINI_INPUT_FIELD['y']) else None
+        if (x, y) == (config.GEMINI_SEND_BUTTON['x'], config.GEMINI_SEND_BUTTON['y']):
+            if self.send_state == 'ready':
+                self.send_state = 'sent'
+                self.answer_ready = self.clock.time() + self.generate_seconds
+                self.response = ''
+                self.input_text = ''
+        elif (x, y) == (config.GEMINI_NEW_CHAT_BUTTON['x'], config.GEMINI_NEW_CHAT_BUTTON['y']):
+            self.conversation += 1
+            self.response = ''
+            self.send_state = 'idle'
+        elif any((x, y) == (c['x'], c['y']) for c in (config.NEXT_BUTTON_Q1, config.NEXT_BUTTON_Q2)):
+            self.question += 1
+        elif any((x, y) == (c['x'], c['y'])
+                 for options in (config.ANSWER_OPTIONS_Q1, config.ANSWER_OPTIONS_Q2)
+                 for c in options.values()):
+            self.answers_selected += 1
+
+    def _advance(self):
+        """Move the upload and generation on to where the clock says they are"""
+        now = self.clock.time()
+        if self.send_state == 'uploading' and now >= self.upload_done:
+            self.send_state = 'ready'
+        elif self.send_state == 'sent' and now >= self.answer_ready:
+            self.response = self.random.choice(self.options)
+            self.send_state = 'idle'
+
+    def move_to(self, x, y):
+        pass
+
+    def hotkey(self, *keys):
+        self._advance()
+        if keys == ('ctrl', 'v'):
+            if self.clipboard_text and not (self.clipboard_has_image and self.drops_pasted_text):
+                self.input_text += self.clipboard_text
+            if self.clipboard_has_image:
+                self.send_state = 'uploading'
+                self.upload_done = self.clock.time() + self.upload_seconds
+        elif keys == ('ctrl', 'c') and self.focus == 'input':
+            self.clipboard_text = self.input_text
+            self.clipboard_has_image = False
+        elif keys == ('ctrl', 'c'):
+            # Copying the response area: empty until generation is done
+            self.clipboard_text = self.response
+            self.clipboard_has_image = False
+
+    def copy_text(self, text):
+        self.clipboard_text = text
+        self.clipboard_has_image = False
+
+    def paste_text(self):
+        return self.clipboard_text
+
+    def copy_image(self, dib_data):
+        self.clipboard_text = ''
+        self.clipboard_has_image = True
+
+    def copy_formats(self, text=None, dib_data=None, html=None):
+        self.clipboard_text = text or ''
+        self.clipboard_has_image = dib_data is not None
+        return {name for name, value in (('text', text), ('image', dib_data), ('html', html)) if value is not None}
@@ -0,0 +1,234 @@
+"""
+Soak Test Harness
+Drives QuizAutomation against the simulated desktop for many questions and
+records RSS, open file handles, Python object counts and traced memory per question
+
+Usage:
+    python soak_test.py                          # 1000 questions
+    python soak_test.py --questions 200 --csv soak_results.csv
+
+Exits with status 1 if anything keeps growing after warm-up, a UI state times out
+or a stage overruns its latency budget, so it can run in CI
+"""
+
+import argparse
+import asyncio
+import contextlib
+import csv
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import config
+
+
+def get_rss_bytes():
+    """Resident set size of this process"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def get_open_handles():
+    """Open file descriptors (handles on Windows)"""
+    try:
+        import psutil
+        process = psutil.Process()
+        return process.num_handles() if os.name == 'nt' else process.num_fds()
+    except ImportError:
+        return len(os.listdir('/proc/self/fd'))
+
+
+def take_sample(question):
+    gc.collect()
+    traced, _ = tracemalloc.get_traced_memory()
+    return {
+        'question': question,
+        'rss_mb': get_rss_bytes() / 1024 / 1024,
+        'open_handles': get_open_handles(),
+        'objects': len(gc.get_objects()),
+        'traced_mb': traced / 1024 / 1024,
+    }
+
+
+def _window_mean(samples, key, start, end):
+    values = [sample[key] for sample in samples[start:end]]
+    return sum(values) / len(values)
+
+
+def check_growth(samples, warmup, limits):
+    """
+    Compare the window right after warm-up with the final window
+    Returns a list of failure messages
+    """
+    window = max(1, (len(samples) - warmup) // 10)
+    failures = []
+    for key, limit in limits.items():
+        start = _window_mean(samples, key, warmup, warmup + window)
+        end = _window_mean(samples, key, len(samples) - window, len(samples))
+        growth = end - start
+        status = "FAIL" if growth > limit else "ok"
+        print(f"  {key:14s} {start:10.1f} -> {end:10.1f}  growth {growth:+8.1f} (limit {limit})  {status}")
+        if growth > limit:
+            failures.append(f"{key} grew by {growth:.1f} (limit {limit})")
+    return failures
+
+
+# Counters that stay at 0 when every simulated question runs as planned
+TIMING_COUNTERS = {
+    'quiz_ui_state_timeouts_total': "UI state timeouts",
+    'quiz_budget_overruns_total': "stage budget overruns",
+}
+
+
+def check_timing(metrics):
+    """
+    The simulated desktop always answers in time, so any timeout or overrun is a bug
+    Returns a list of failure messages
+    """
+    failures = []
+    for name, label in TIMING_COUNTERS.items():
+        count = metrics.total(name)
+        print(f"  {label:22s} {count:5d}  {'FAIL' if count else 'ok'}")
+        if count:
+            failures.append(f"{count} {label}")
+    return failures
+
+
+def install_references(backend):
+    """
+    Save the simulated send button references where capture_send_button_refs.py would,
+    so QuizAutomation loads them the usual way (paths are relative to the working folder)
+    """
+    from ui_state_classifier import StateClassifier
+
+    os.makedirs('reference_images', exist_ok=True)
+    ref_ready, ref_sent = backend.reference_images()
+    ref_ready.save('reference_images/send_button_ready.png')
+    ref_sent.save('reference_images/send_button_sent.png')
+    StateClassifier.build(backend.state_samples()).save()
+
+
+def run_soak(questions, warmup, provider, csv_path, limits):
+    from clock import VirtualClock
+    from orchestrator import Orchestrator
+    from quiz_automation import QuizAutomation
+    from simulated_desktop import SimulatedDesktopBackend
+
+    work_dir = tempfile.mkdtemp(prefix='quiz_soak_')
+    config.SCREENSHOT_DIR = os.path.join(work_dir, 'debug_screenshots')
+    config.CHECKPOINT_FILE = os.path.join(work_dir, 'checkpoint.json')
+    config.LOG_FILE = os.path.join(work_dir, 'soak.log')
+    config.DEBUG_MODE = False
+    config.METRICS_ENABLED = False
+    config.ANSWER_PROVIDER = provider
+    config.STUB_ANSWER_DELAY = 0
+
+    tracemalloc.start()
+    samples = []
+    snapshots = {}
+    start_time = time.time()
+    automation = None
+    clock = VirtualClock()  # Simulated desktop: sleeps move simulated time, no real waiting
+    simulated_start = clock.time()
+
+    def on_question(question):
+        samples.append(take_sample(question))
+        if question == warmup:
+            snapshots['warm'] = tracemalloc.take_snapshot()
+        if question % 100 == 0:
+            sys.__stdout__.write(f"  {question}/{questions} questions ({time.time() - start_time:.0f}s, "
+                                 f"{(clock.time() - simulated_start) / 3600:.1f}h simulated)\n")
+
+    previous_dir = os.getcwd()
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            # Set up like main.py: references on disk, frame sampler on, the configured loop
+            os.chdir(work_dir)
+            backend = SimulatedDesktopBackend(clock=clock)
+            install_references(backend)
+            automation = QuizAutomation(backend=backend, serve_metrics=not config.ASYNC_ORCHESTRATOR, clock=clock)
+            automation.start_frame_sampler()
+
+            if config.ASYNC_ORCHESTRATOR:
+                orchestrator = Orchestrator(automation, automation.process_question, questions,
+                                            on_progress=on_question)
+                success, processed = asyncio.run(orchestrator.run())
+                if not success:
+                    raise RuntimeError(f"Question {processed + 1} failed, see {config.LOG_FILE}")
+                on_question(processed)  # on_progress is not called after the last question
+            else:
+                for question in range(1, questions + 1):
+                    if not automation.process_question():
+                        raise RuntimeError(f"Question {question} failed, see {config.LOG_FILE}")
+                    on_question(question)
+
+            final_snapshot = tracemalloc.take_snapshot()
+    finally:
+        if automation:
+            automation.close()
+        os.chdir(previous_dir)
+        tracemalloc.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if csv_path:
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(samples[0]))
+            writer.writeheader()
+            writer.writerows(samples)
+        print(f"Per-question samples written to {csv_path}")
+
+    simulated = clock.time() - simulated_start
+    print(f"\nGrowth after {warmup}-question warm-up ({questions} questions, {time.time() - start_time:.0f}s, "
+          f"{simulated / 3600:.1f}h simulated, {simulated / questions:.1f}s per question):")
+    failures = check_growth(samples, warmup, limits)
+    print("\nTimeouts and overruns:")
+    failures += check_timing(automation.metrics)
+
+    if failures and 'warm' in snapshots:
+        print("\nTop allocation growth since warm-up:")
+        for stat in final_snapshot.compare_to(snapshots['warm'], 'lineno')[:10]:
+            print(f"  {stat}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-run memory and handle soak test")
+    parser.add_argument('--questions', type=int, default=1000)
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--provider', default='gui', choices=['gui', 'stub'])
+    parser.add_argument('--csv', help="write per-question samples to this CSV file")
+    parser.add_argument('--max-rss-growth-mb', type=float, default=20.0)
+    parser.add_argument('--max-traced-growth-mb', type=float, default=2.0)
+    parser.add_argument('--max-handle-growth', type=float, default=3)
+    parser.add_argument('--max-object-growth', type=float, default=2000)
+    args = parser.parse_args()
+
+    if args.questions <= args.warmup:
+        parser.error("--questions must be larger than --warmup")
+
+    limits = {
+        'rss_mb': args.max_rss_growth_mb,
+        'traced_mb': args.max_traced_growth_mb,
+        'open_handles': args.max_handle_growth,
+        'objects': args.max_object_growth,
+    }
+    print(f"Soak test: {args.questions} questions on the simulated desktop ({args.provider} provider)")
+    failures = run_soak(args.questions, args.warmup, args.provider, args.csv, limits)
+
+    if failures:
+        print("\nSOAK TEST FAILED: " + "; ".join(failures))
+        return 1
+    print("\nSOAK TEST PASSED: memory and handles stay flat, no timeouts or overruns")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Stage Watchdog
+Turns hung stages into bounded-latency failures with evidence attached
+
+A background thread checks how long the current question stage has been running
+(see QuizAutomation.enter_stage). When a stage goes over its budget in
+WATCHDOG_STAGE_BUDGETS it writes a diagnostic bundle to WATCHDOG_DIR:
+    stacks.txt     Stack of every thread
+    log_tail.txt   Last WATCHDOG_LOG_EVENTS log lines
+    frame.png      Current frame of the region the stage is watching
+    info.json      Question, stage, elapsed time and budget
+and then cancels the question. Polling loops notice the cancellation at their
+next check; a thread stuck inside a call gets StageTimeout raised in it after
+WATCHDOG_FORCE_AFTER more seconds. What happens next is WATCHDOG_ACTION
+EASY TO MODIFY: Adjust WATCHDOG_* settings in config.py
+"""
+
+import ctypes
+import json
+import os
+import sys
+import threading
+import traceback
+
+import config
+
+
+# Which screen region is most telling for each stage
+STAGE_REGIONS = {
+    'capture': 'question',
+    'select': 'question',
+    'next': 'question',
+    'upload': 'send_button',
+    'send': 'send_button',
+    'generate': 'response',
+    'read': 'response',
+    'rotate': 'response',
+}
+
+
+class StageTimeout(Exception):
+    """Raised in the automation thread when the watchdog cancels a stage"""
+
+
+class _Disarmed(Exception):
+    """Takes the place of a StageTimeout that has not gone off when its stage ends"""
+
+
+def stage_region(stage):
+    """Screen region (x, y, width, height) to capture for a stage"""
+    name = STAGE_REGIONS.get(stage, 'question')
+    if name == 'send_button':
+        return (config.GEMINI_SEND_BUTTON['x'] - 30, config.GEMINI_SEND_BUTTON['y'] - 30, 60, 60)
+    area = config.GEMINI_RESPONSE_AREA if name == 'response' else config.QUIZ_QUESTION_AREA
+    return (area['x'], area['y'], area['width'], area['height'])
+
+
+def format_thread_stacks():
+    """Stack of every running thread, innermost call last"""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    parts = []
+    for thread_id, frame in sys._current_frames().items():
+        parts.append(f"Thread {names.get(thread_id, '?')} ({thread_id}):\n")
+        parts.extend(traceback.format_stack(frame))
+        parts.append("\n")
+    return ''.join(parts)
+
+
+class StageWatchdog:
+    def __init__(self, automation, budgets=None, check_interval=None):
+        self.automation = automation
+        self.budgets = budgets or config.WATCHDOG_STAGE_BUDGETS
+        self.check_interval = check_interval or config.WATCHDOG_CHECK_INTERVAL
+        self.trips = 0
+        self._tripped = None  # (stage, started) the watchdog already fired for
+        self._forced = None   # (stage, started) StageTimeout was already raised in
+        self._injected = None  # Thread a StageTimeout was raised in, until its stage ends (see disarm)
+        # A thread with the real clock, simulated-time events with a VirtualClock (see clock.py)
+        self._timer = automation.clock.repeat(self.check_interval, self.check, name='stage-watchdog')
+
+    def check(self):
+        """Trip or force-cancel the current stage if it is over budget"""
+        automation = self.automation
+        stage, started = automation.current_stage, automation.stage_started
+        if stage is None or started is None:
+            return
+        budget = self.budgets.get(stage)
+        if budget is None:
+            return
+        elapsed = automation.clock.time() - started
+        key = (stage, started)
+
+        if key != self._tripped:
+            if elapsed > budget:
+                self._tripped = key
+                self._trip(stage, elapsed, budget)
+        elif (key != self._forced and config.WATCHDOG_ACTION != 'log'
+              and elapsed > budget + config.WATCHDOG_FORCE_AFTER):
+            # Still stuck after the cancel: the thread is blocked, not polling
+            self._forced = key
+            self._force_cancel(key)
+
+    def _trip(self, stage, elapsed, budget):
+        automation = self.automation
+        self.trips += 1
+        automation.metrics.inc('quiz_watchdog_trips_total', stage=stage)
+        automation.log(f"WATCHDOG: stage '{stage}' running {elapsed:.1f}s (budget {budget}s) "
+                       f"on question #{automation.question_count}")
+        try:
+            folder = self.write_bundle(stage, elapsed, budget)
+            automation.log(f"WATCHDOG: diagnostics written to {folder}")
+        except Exception as e:
+            automation.log(f"WATCHDOG: could not write diagnostics: {e}")
+
+        if config.WATCHDOG_ACTION != 'log':
+            automation.cancel(f"stage '{stage}' over budget ({elapsed:.1f}s > {budget}s)")
+
+    def write_bundle(self, stage, elapsed, budget):
+        """Write stacks, log tail, current frame and a summary; returns the bundle folder"""
+        automation = self.automation
+        folder = os.path.join(config.WATCHDOG_DIR,
+                              f"q{automation.question_count:04d}_{stage}_{automation.clock.now():%Y%m%d_%H%M%S}")
+        os.makedirs(folder, exist_ok=True)
+
+        with open(os.path.join(folder, 'stacks.txt'), 'w', encoding='utf-8') as f:
+            f.write(format_thread_stacks())
+        with open(os.path.join(folder, 'log_tail.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(list(automation.recent_log)) + '\n')
+
+        region = stage_region(stage)
+        frame_error = None
+        try:
+            automation.backend.screenshot(region=region).save(os.path.join(folder, 'frame.png'))
+        except Exception as e:
+            frame_error = str(e)
+
+        with open(os.path.join(folder, 'info.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'question': automation.question_count,
+                'stage': stage,
+                'elapsed': elapsed,
+                'budget': budget,
+                'region': region,
+                'frame_error': frame_error,
+                'conversation': automation.conversation_number,
+                'action': config.WATCHDOG_ACTION,
+                'time': automation.clock.now().isoformat(timespec='seconds'),
+            }, f, indent=2)
+        return folder
+
+    def _force_cancel(self, key):
+        """Raise StageTimeout inside the stuck automation thread (CPython only)"""
+        automation = self.automation
+        with automation.stage_lock:
+            # Only into the stage that timed out: if it ended since the check, StageTimeout
+            # would go off at some unrelated point (checkpoint writing, finally blocks)
+            thread_id = automation.stage_thread
+            if (automation.current_stage, automation.stage_started) != key or thread_id is None:
+                return
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(thread_id), ctypes.py_object(StageTimeout))
+            self._injected = thread_id
+        automation.log(f"WATCHDOG: stage '{key[0]}' did not stop, raised StageTimeout in its thread")
+
+    def disarm(self):
+        """
+        Cancel a StageTimeout raised for the ending stage that has not gone off yet
+        Called by QuizAutomation.end_stage holding stage_lock, before it does anything else
+        """
+        if self._injected is None:
+            return
+        thread_id, self._injected = self._injected, None
+        if thread_id != threading.get_ident():
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(thread_id), None)
+            return
+        # Replace it with _Disarmed, which goes off as the call returns and is caught here.
+        # Clearing with NULL instead leaves the eval breaker set on Python 3.11, and the
+        # thread then spins forever once a profiler or debugger is active
+        try:
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(thread_id), ctypes.py_object(_Disarmed))
+        except _Disarmed:
+            pass
+
+    def close(self):
+        self._timer.close()
@@ -0,0 +1,227 @@
+"""
+Similarity Threshold Calibration Tool
+Measures the similarity scores each check sees on this machine and picks
+thresholds that separate them, instead of relying on the defaults in config.py
+
+During the session you put the screen in known states and a few frames of each
+are recorded. For every check, scores of frames that should pass (positives)
+and frames that should fail (negatives) are compared:
+- ready / sent:  send button vs its reference image, in that state vs any other state
+- change:        two frames of the send button in different states vs the same state
+- stability:     consecutive frames of the same state vs frames of different states
+- screen_shift:  shift region on question 1 vs question 2, and question 1 vs itself
+The threshold is put midway between the two groups; the margin is half the gap.
+Overlapping groups mean the check cannot tell the states apart and are reported
+
+Usage:
+    python threshold_calibration.py --profile laptop_quizsite   # Store in layouts/laptop_quizsite.json
+    python threshold_calibration.py --dry-run                   # Only print the results
+EASY TO MODIFY: Adjust CALIBRATION_FRAMES in config.py
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import config
+from layout_profiles import LayoutError, layout_path, save_thresholds, use_layout
+
+
+# Send button states recorded, in order
+BUTTON_STATES = {
+    'ready': "Paste an image into Gemini and wait for the upload to finish (button enabled)",
+    'uploading': "Paste an image and press SPACE while it is still uploading",
+    'sent': "Click send and press SPACE while the blue STOP square shows",
+    'disabled': "Clear the input box (button disabled / idle)",
+}
+
+
+def fit_threshold(positives, negatives, positive_above=True):
+    """
+    Threshold separating two groups of similarity scores
+
+    Args:
+        positives: Scores that should pass the check
+        negatives: Scores that should fail it
+        positive_above: True if passing means score > threshold, False if score < threshold
+
+    Returns:
+        (threshold, margin, errors) - margin is half the gap between the groups
+        (negative when they overlap); errors counts scores on the wrong side
+    """
+    if not positive_above:
+        positives = [-score for score in positives]
+        negatives = [-score for score in negatives]
+
+    lowest_positive = min(positives)
+    highest_negative = max(negatives)
+    if lowest_positive > highest_negative:
+        threshold = (lowest_positive + highest_negative) / 2
+    else:
+        # Overlap: take the cut with the fewest scores on the wrong side
+        candidates = sorted(set(positives) | set(negatives))
+        cuts = [(a + b) / 2 for a, b in zip(candidates, candidates[1:])] or candidates
+        threshold = min(cuts, key=lambda cut: (sum(1 for score in positives if score <= cut) +
+                                               sum(1 for score in negatives if score >= cut)))
+    errors = (sum(1 for score in positives if score <= threshold) +
+              sum(1 for score in negatives if score >= threshold))
+    margin = (lowest_positive - highest_negative) / 2
+
+    if not positive_above:
+        threshold = -threshold
+    return threshold, margin, errors
+
+
+def similarity(image1, image2):
+    """Fraction of identical pixel values (same measure as QuizAutomation._get_similarity)"""
+    import numpy as np
+    array1 = np.asarray(image1.convert('RGB'))
+    array2 = np.asarray(image2.convert('RGB'))
+    if array1.shape != array2.shape:
+        return 0.0
+    return float(np.mean(array1 == array2))
+
+
+def check_scores(button_frames, references, shift_frames):
+    """
+    Positive and negative scores per check
+
+    Args:
+        button_frames: {state: [send button frames]}
+        references: (ready, sent) reference images, or (None, None)
+        shift_frames: {'q1': [...], 'q2': [...]} frames of the screen shift region
+
+    Returns:
+        {check: (positives, negatives, positive_above)}
+    """
+    checks = {}
+    for check, reference in zip(('ready', 'sent'), references):
+        if reference is None or check not in button_frames:
+            continue
+        positives = [similarity(reference, frame) for frame in button_frames[check]]
+        negatives = [similarity(reference, frame)
+                     for state, frames in button_frames.items() if state != check for frame in frames]
+        checks[check] = (positives, negatives, True)
+
+    # Pairs within one state (nothing changed) vs across states (changed)
+    same = [similarity(a, b) for frames in button_frames.values() for a, b in zip(frames, frames[1:])]
+    states = list(button_frames)
+    different = [similarity(button_frames[a][i], button_frames[b][i])
+                 for n, a in enumerate(states) for b in states[n + 1:]
+                 for i in range(min(len(button_frames[a]), len(button_frames[b])))]
+    if same and different:
+        checks['stability'] = (same, different, True)
+        checks['change'] = (different, same, False)
+
+    if shift_frames.get('q1') and shift_frames.get('q2'):
+        q1, q2 = shift_frames['q1'], shift_frames['q2']
+        shifted = [similarity(a, b) for a in q1 for b in q2]
+        unchanged = [similarity(a, b) for a, b in zip(q1, q1[1:])]
+        checks['screen_shift'] = (shifted, unchanged, False)
+    return checks
+
+
+def calibrate(checks, log=print):
+    """Fit every check; logs one line each and returns {check: threshold}"""
+    thresholds = {}
+    for check, (positives, negatives, positive_above) in checks.items():
+        if not positives or not negatives:
+            continue
+        threshold, margin, errors = fit_threshold(positives, negatives, positive_above)
+        passes = "above" if positive_above else "below"
+        log(f"  {check:12s} pass {passes} {threshold:.4f}  margin {margin:+.4f}  "
+            f"(positives {min(positives):.3f}-{max(positives):.3f}, "
+            f"negatives {min(negatives):.3f}-{max(negatives):.3f}, "
+            f"default {config.SIMILARITY_THRESHOLDS[check]})")
+        if errors:
+            log(f"  WARNING: '{check}' scores overlap - {errors} of {len(positives) + len(negatives)} frames "
+                f"land on the wrong side of any threshold. Re-check the region or references.")
+        elif margin < 0.01:
+            log(f"  WARNING: '{check}' separates by a margin of only {margin:.4f}")
+        thresholds[check] = round(threshold, 4)
+    return thresholds
+
+
+def record_frames(region, count, instructions):
+    """Wait for SPACE, then grab `count` frames of a region 0.1s apart"""
+    import keyboard
+    import pyautogui
+    print(f"\n{instructions}")
+    print("Press SPACEBAR to record...")
+    keyboard.wait('space')
+    frames = []
+    for _ in range(count):
+        frames.append(pyautogui.screenshot(region=region))
+        time.sleep(0.1)
+    print(f"✓ Recorded {count} frames")
+    return frames
+
+
+def load_references():
+    from PIL import Image
+    references = []
+    for state in ('ready', 'sent'):
+        try:
+            with Image.open(f"reference_images/send_button_{state}.png") as image:
+                references.append(image.convert('RGB'))
+        except OSError:
+            references.append(None)
+    return tuple(references)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate similarity thresholds")
+    parser.add_argument('--profile', help=f"layout profile to store them in (default: {config.LAYOUT_PROFILE})")
+    parser.add_argument('--frames', type=int, default=config.CALIBRATION_FRAMES, help="frames per state")
+    parser.add_argument('--dry-run', action='store_true', help="print the thresholds without saving")
+    args = parser.parse_args()
+
+    import pyautogui
+    screen_size = tuple(pyautogui.size())
+    profile_name = args.profile or config.LAYOUT_PROFILE
+    if args.profile or os.path.exists(layout_path(profile_name)):
+        try:
+            use_layout(profile_name, screen_size)
+        except LayoutError as e:
+            print(f"ERROR: {e}")
+            return 1
+
+    references = load_references()
+    if None in references:
+        print("NOTE: Reference images missing - run capture_send_button_refs.py to calibrate 'ready'/'sent'")
+
+    send_region = (config.GEMINI_SEND_BUTTON['x'] - 30, config.GEMINI_SEND_BUTTON['y'] - 30, 60, 60)
+    button_frames = {}
+    for step, (state, instructions) in enumerate(BUTTON_STATES.items(), 1):
+        print(f"\n{'='*60}\nSTEP {step}: SEND BUTTON {state.upper()}\n{'='*60}")
+        button_frames[state] = record_frames(send_region, args.frames, instructions)
+
+    shift_frames = {}
+    if config.USE_SCREEN_SHIFT_DETECTION:
+        print(f"\n{'='*60}\nSCREEN SHIFT REGION\n{'='*60}")
+        # Region used by QuizAutomation.check_screen_shift
+        shift_region = (22, 454, 20, 20)
+        shift_frames['q1'] = record_frames(shift_region, args.frames, "Open the quiz on QUESTION 1")
+        shift_frames['q2'] = record_frames(shift_region, args.frames,
+                                           "Answer and move to QUESTION 2 (the shifted layout)")
+
+    print(f"\n{'='*60}\nRESULTS\n{'='*60}")
+    thresholds = calibrate(check_scores(button_frames, references, shift_frames))
+
+    if args.dry_run:
+        return 0
+    try:
+        path = save_thresholds(profile_name, thresholds, screen_size)
+    except LayoutError as e:
+        print(f"ERROR: {e}")
+        return 1
+    print(f"\nThresholds saved to {path} (used with --profile {profile_name})")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n\nCalibration cancelled by user.")
@@ -0,0 +1,181 @@
+"""
+UI State Classifier
+Recognises the send button state from several reference samples per state
+
+Each sample is shrunk to a tiny colour thumbnail (FEATURE_SIZE) and the samples
+of a state are averaged into a centroid. A grab is classified as the nearest
+centroid, or 'unknown' if it is farther from it than any of that state's samples
+were (times STATE_CLASSIFIER_MARGIN). Classifying a 60x60 grab takes well under 1ms
+
+Built by capture_send_button_refs.py and stored as a small JSON file
+EASY TO MODIFY: Adjust STATE_* settings in config.py
+"""
+
+import json
+import os
+import time
+
+import config
+
+
+CLASSIFIER_VERSION = 1
+FEATURE_SIZE = (8, 8)  # Thumbnail size; 8x8 RGB = 192 numbers per grab
+UNKNOWN = 'unknown'
+
+# Send button states, in capture order
+SEND_BUTTON_STATES = ('ready', 'uploading', 'sent', 'disabled')
+
+
+class ClassifierError(Exception):
+    """The classifier file is missing, unreadable or has no states"""
+
+
+def features(image):
+    """Feature vector of an image: RGB thumbnail scaled to 0-1"""
+    import numpy as np
+    from PIL import Image
+    thumbnail = image.convert('RGB').resize(FEATURE_SIZE, Image.BOX)
+    return np.asarray(thumbnail, dtype=np.float32).ravel() / 255.0
+
+
+def _distances(centroids, vector):
+    """RMS distance from a feature vector to each centroid row"""
+    import numpy as np
+    return np.sqrt(((centroids - vector) ** 2).mean(axis=1))
+
+
+class StateClassifier:
+    def __init__(self, states, centroids, radii):
+        """
+        Args:
+            states: State names
+            centroids: Mean feature vector per state (same order)
+            radii: Largest accepted distance from each centroid
+        """
+        import numpy as np
+        self.states = list(states)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.radii = np.asarray(radii, dtype=np.float32)
+
+    @classmethod
+    def build(cls, samples, margin=None, min_radius=None):
+        """
+        Build from {state: [PIL images]}
+        A state's radius is its farthest sample's distance times `margin`
+        """
+        import numpy as np
+        margin = config.STATE_CLASSIFIER_MARGIN if margin is None else margin
+        min_radius = config.STATE_CLASSIFIER_MIN_RADIUS if min_radius is None else min_radius
+        states, centroids, radii = [], [], []
+        for state, images in samples.items():
+            if not images:
+                continue
+            vectors = np.stack([features(image) for image in images])
+            centroid = vectors.mean(axis=0)
+            spread = float(_distances(vectors, centroid).max())
+            states.append(state)
+            centroids.append(centroid)
+            radii.append(max(min_radius, spread * margin))
+        if not states:
+            raise ClassifierError("No samples to build a classifier from")
+        return cls(states, centroids, radii)
+
+    def classify(self, image):
+        """
+        Most likely state of an image and a confidence from 0 to 1
+        Confidence compares the nearest and second-nearest states (1.0 = unambiguous);
+        returns (UNKNOWN, 0.0) if the image is not close to any state
+        """
+        distances = _distances(self.centroids, features(image))
+        nearest = int(distances.argmin())
+        if distances[nearest] > self.radii[nearest]:
+            return UNKNOWN, 0.0
+        if len(self.states) == 1:
+            return self.states[0], float(1 - distances[0] / self.radii[0])
+        second = float(sorted(distances)[1])
+        confidence = 1 - float(distances[nearest]) / second if second else 0.0
+        return self.states[nearest], confidence
+
+    def check(self, samples):
+        """
+        Classify every sample; returns (lines, misclassified, average microseconds per grab)
+        Used after capture to show how well the states separate
+        """
+        lines = []
+        misclassified = 0
+        start_time = time.perf_counter()
+        count = 0
+        for state, images in samples.items():
+            results = [self.classify(image) for image in images]
+            count += len(results)
+            wrong = sum(1 for result, _ in results if result != state)
+            misclassified += wrong
+            lowest = min((confidence for _, confidence in results), default=0.0)
+            lines.append(f"{state:10s} {len(images)} samples, {wrong} misclassified, "
+                         f"lowest confidence {lowest:.0%}")
+        elapsed = (time.perf_counter() - start_time) * 1e6 / max(count, 1)
+        return lines, misclassified, elapsed
+
+    def to_dict(self):
+        return {
+            'version': CLASSIFIER_VERSION,
+            'feature_size': list(FEATURE_SIZE),
+            'states': {
+                state: {
+                    'radius': round(float(radius), 5),
+                    'centroid': [round(float(value), 4) for value in centroid],
+                }
+                for state, centroid, radius in zip(self.states, self.centroids, self.radii)
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != CLASSIFIER_VERSION or data.get('feature_size') != list(FEATURE_SIZE):
+            raise ClassifierError("Classifier file is from a different version, re-run capture_send_button_refs.py")
+        states = data['states']
+        if not states:
+            raise ClassifierError("Classifier file has no states")
+        return cls(states, [entry['centroid'] for entry in states.values()],
+                   [entry['radius'] for entry in states.values()])
+
+    def save(self, path=None):
+        path = path or config.STATE_CLASSIFIER_FILE
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+        return path
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or config.STATE_CLASSIFIER_FILE
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return cls.from_dict(json.load(f))
+        except FileNotFoundError:
+            raise ClassifierError(f"No state classifier at {path}")
+        except (ValueError, KeyError) as e:
+            raise ClassifierError(f"State classifier {path} is not valid: {e}")
+
+
+def sample_path(state, index):
+    return os.path.join(config.STATE_SAMPLE_DIR, f"{state}_{index:02d}.png")
+
+
+def load_samples():
+    """Saved samples from STATE_SAMPLE_DIR as {state: [images]}"""
+    from PIL import Image
+    samples = {}
+    try:
+        names = sorted(os.listdir(config.STATE_SAMPLE_DIR))
+    except FileNotFoundError:
+        return samples
+    for name in names:
+        state, _, rest = name.rpartition('_')
+        if not state or not rest.endswith('.png'):
+            continue
+        with Image.open(os.path.join(config.STATE_SAMPLE_DIR, name)) as image:
+            samples.setdefault(state, []).append(image.convert('RGB'))
+    return samples
@@ -0,0 +1,257 @@
+"""
+UI State Machine
+Drives a question through the Gemini chat pane as visual states instead of
+a fixed sequence of waits and sleeps
+
+Each state has a predicate over the current frame, an action run when it is
+entered, an optional action run on every tick it persists, and a timeout with
+a fallback state. A single polling loop grabs one frame per tick (each screen
+region at most once, shared by every predicate), moves to the first reachable
+state whose predicate holds, and records how long each state lasted
+
+Question states:
+    upload_pending -> ready -> generating -> answered -> selected -> page_advanced
+EASY TO MODIFY: States are declared in build_question_machine, timeouts in config.py
+"""
+
+import config
+from answer_parser import STABLE
+from ui_state_classifier import UNKNOWN
+
+
+class Frame:
+    """Screen regions for one tick; each region is grabbed at most once"""
+
+    def __init__(self, grab, regions):
+        """grab(name, region) returns the current image of a region (QuizAutomation.grab)"""
+        self.grab = grab
+        self.regions = regions
+        self.images = {}
+        self.derived = {}  # Values computed from the images (e.g. a classified region), shared by predicates
+
+    def __getitem__(self, name):
+        if name not in self.images:
+            self.images[name] = self.grab(name, self.regions[name])
+        return self.images[name]
+
+
+class UIState:
+    def __init__(self, name, predicate=None, on_enter=None, on_tick=None, next_states=(),
+                 timeout=None, on_timeout=None, stage=None):
+        """
+        Args:
+            name: State name (used in logs and dwell times)
+            predicate: predicate(frame, context) -> True when the UI is in this state
+            on_enter: on_enter(frame, context), run on entering the state
+            on_tick: on_tick(frame, context), run on every tick the state persists
+            next_states: Names of the states reachable from this one (empty = final state)
+            timeout: Seconds before giving up on this state
+            on_timeout: State to move to on timeout
+            stage: Question stage entered with the state (see QuizAutomation.enter_stage)
+        """
+        self.name = name
+        self.predicate = predicate
+        self.on_enter = on_enter
+        self.on_tick = on_tick
+        self.next_states = tuple(next_states)
+        self.timeout = timeout
+        self.on_timeout = on_timeout
+        self.stage = stage
+
+
+class UIStateMachine:
+    def __init__(self, automation, states, regions, interval, sleep, clock):
+        """
+        Args:
+            automation: QuizAutomation (backend, stages, cancellation, budget-aware polling)
+            states: UIState list
+            regions: Region name -> (x, y, width, height) for predicates
+            interval: Seconds between ticks
+            sleep, clock: Time functions (sleep returns early on screen changes, see
+                QuizAutomation.wait_for_change; clock is QuizAutomation.clock.time)
+        """
+        self.automation = automation
+        self.states = {state.name: state for state in states}
+        self.regions = regions
+        self.interval = interval
+        self.sleep = sleep
+        self.clock = clock
+        self.ticks = 0
+
+    def _enter(self, state, frame, context):
+        if state.stage:
+            self.automation.enter_stage(state.stage)
+        if state.on_enter:
+            state.on_enter(frame, context)
+
+    def run(self, start, context):
+        """
+        Run from `start` until a final state is reached
+        Returns [(state, seconds)] in the order the states were visited
+        """
+        dwell = []
+        state = self.states[start]
+        self._enter(state, None, context)
+        entered = self.clock()
+
+        while state.next_states:
+            self.sleep(self.automation.poll_interval(self.interval))
+            self.automation.check_cancelled()
+            self.ticks += 1
+            frame = Frame(self.automation.grab, self.regions)
+
+            target = None
+            for name in state.next_states:
+                candidate = self.states[name]
+                if candidate.predicate is None or candidate.predicate(frame, context):
+                    target = candidate
+                    break
+
+            now = self.clock()
+            if target is None and state.timeout is not None and now - entered > state.timeout:
+                self.automation.log(f"UI state '{state.name}' timed out after {now - entered:.1f}s, "
+                                    f"continuing as '{state.on_timeout}'")
+                self.automation.metrics.inc('quiz_ui_state_timeouts_total', state=state.name)
+                target = self.states[state.on_timeout]
+
+            if target is None:
+                if state.on_tick:
+                    state.on_tick(frame, context)
+                continue
+
+            dwell.append((state.name, now - entered))
+            state = target
+            self._enter(state, frame, context)
+            entered = self.clock()
+
+        return dwell
+
+
+def build_question_machine(automation, screenshot_path, prompt, sleep, clock):
+    """
+    States for one question in the Gemini chat pane
+    Needs the send button state classifier (ui_state_classifier.py)
+    Returns (machine, context); run it with machine.run('upload_pending', context)
+    """
+    classifier = automation.load_state_classifier()
+    send_button = (config.GEMINI_SEND_BUTTON['x'] - 30, config.GEMINI_SEND_BUTTON['y'] - 30, 60, 60)
+    question_area = (config.QUIZ_QUESTION_AREA['x'], config.QUIZ_QUESTION_AREA['y'],
+                     config.QUIZ_QUESTION_AREA['width'], config.QUIZ_QUESTION_AREA['height'])
+    response_area = (config.GEMINI_RESPONSE_AREA['x'], config.GEMINI_RESPONSE_AREA['y'],
+                     config.GEMINI_RESPONSE_AREA['width'], config.GEMINI_RESPONSE_AREA['height'])
+    parser = automation.answer_parser
+    timeouts = config.UI_STATE_TIMEOUTS
+    context = {'response': None, 'answer': None, 'send_clicks': 0, 'generation_seen': False}
+
+    def button(frame):
+        # Classified once per frame, however many predicates ask
+        if 'button' not in frame.derived:
+            frame.derived['button'] = classifier.classify(frame['send_button'])[0]
+        return frame.derived['button']
+
+    # Predicates
+    def is_ready(frame, context):
+        return button(frame) == 'ready'
+
+    def is_generating(frame, context):
+        return button(frame) == 'sent'
+
+    def is_finished(frame, context):
+        if not context['generation_seen']:
+            return finished_unseen(frame, context)
+        if 'disabled' not in classifier.states:
+            # No samples of the cleared input to match: the stop square going away is all there is
+            return button(frame) != 'sent'
+        # Stop square gone and input cleared: the response is complete
+        return button(frame) not in ('sent', 'uploading', 'ready', UNKNOWN)
+
+    def finished_unseen(frame, context):
+        # From 'ready': the response started and finished between two ticks, so the stop square
+        # was never seen - the button is past 'sent' and the response area changed since the click
+        state = button(frame)
+        if state in ('ready', 'sent', 'uploading'):
+            return False
+        if state == 'disabled':
+            return True
+        similarity = automation._get_similarity(context['response_before'], frame['response'])
+        return similarity < config.SIMILARITY_THRESHOLDS['change']
+
+    def has_answer(frame, context):
+        # Committed answers only: a tentative one may still change (see answer_parser.py)
+        return parser.state == STABLE
+
+    def page_changed(frame, context):
+        similarity = automation._get_similarity(context['question'], frame['question'])
+        return similarity < config.SIMILARITY_THRESHOLDS['change']
+
+    # Actions
+    def paste(frame, context):
+        context['start_time'] = clock()
+        automation.paste_question_to_gemini(screenshot_path, prompt)
+        context['question'] = automation.last_question_image
+        automation.log("Waiting for image to upload (UI state machine)...")
+
+    def send(frame, context):
+        if context['send_clicks']:
+            automation.metrics.inc('quiz_send_retries_total')
+        context['send_clicks'] += 1
+        if 'response_before' not in context:
+            context['response_before'] = frame['response'] if frame else automation.grab('response', response_area)
+        automation.log(f"Clicking send button (click {context['send_clicks']})...")
+        automation.click_send_button()
+        context['sent_time'] = clock()
+
+    def send_again(frame, context):
+        # Like send_to_gemini: wait before clicking again, and check a fresh grab rather than
+        # the tick's frame (a sampler frame can predate the last click) - a click once
+        # generation has started would hit the stop button and cancel the answer
+        if clock() - context['sent_time'] < config.UI_SEND_RETRY_DELAY:
+            return
+        if classifier.classify(automation.backend.screenshot(region=send_button))[0] == 'ready':
+            send(frame, context)
+
+    def sent(frame, context):
+        context['generation_seen'] = True
+        automation.log("Message sent, waiting for Gemini response...")
+        automation.save_screenshot(f"input_{automation.question_count}", category='gemini_input')
+
+    def read_response(frame, context):
+        parser.reset()
+        read_again(frame, context)
+
+    def read_again(frame, context):
+        context['response'] = automation._try_get_response()
+        automation.metrics.inc('quiz_poll_ticks_total', wait='response')
+        parser.feed(context['response'])
+
+    def select(frame, context):
+        response = context['response']
+        sent_time = context.get('sent_time', context['start_time'])
+        automation.answer_provider.record_timings(sent_time - context['start_time'], clock() - sent_time)
+        automation.record_response_latency(clock() - sent_time)
+        if response:
+            automation.log(f"Gemini response (length: {len(response)}): '{response}'")
+        else:
+            automation.log("WARNING: Empty or invalid response from Gemini!")
+        context['answer'] = automation.parse_answer(response)
+        automation.select_answer(context['answer'])
+        automation.click_next(wait=False)
+
+    states = [
+        UIState('upload_pending', on_enter=paste, next_states=('ready',),
+                timeout=timeouts['upload_pending'], on_timeout='ready'),
+        # Clicks send again (at most every UI_SEND_RETRY_DELAY) until the stop square shows,
+        # or goes straight to 'answered' if the whole response came and went between two ticks
+        UIState('ready', is_ready, on_enter=send, on_tick=send_again, stage='send',
+                next_states=('generating', 'answered'), timeout=timeouts['ready'], on_timeout='generating'),
+        UIState('generating', is_generating, on_enter=sent, stage='generate', next_states=('answered',),
+                timeout=timeouts['generating'], on_timeout='answered'),
+        UIState('answered', is_finished, on_enter=read_response, on_tick=read_again, stage='read',
+                next_states=('selected',), timeout=timeouts['answered'], on_timeout='selected'),
+        UIState('selected', has_answer, on_enter=select, next_states=('page_advanced',),
+                timeout=timeouts['page_advanced'], on_timeout='page_advanced'),
+        UIState('page_advanced', page_changed),
+    ]
+    regions = {'send_button': send_button, 'question': question_area, 'response': response_area}
+    machine = UIStateMachine(automation, states, regions, config.UI_STATE_POLL_INTERVAL, sleep, clock)
+    return machine, context